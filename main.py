@@ -1,7 +1,8 @@
 
 """
 Main entry point for the Nova Gaming Discord bot system.
-This file starts both the Finder bot and the Ticket system.
+This file starts both the Finder bot and the Ticket system on a single
+Discord client, each as an extension (see modules/utils/client.py).
 This is my first time using discord.py and im not sure what the best way of doing this is. i will re do it later.
 eventually ill update to command handlers instead of having eveerything in serparate files
 and classes.
@@ -12,8 +13,6 @@ Copyright (c) 2023 Bandit
 import os
 import sys
 import logging
-import threading
-import importlib
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -32,47 +31,69 @@ logger = logging.getLogger("main")
 # Load environment variables
 load_dotenv()
 
-def start_finder():
-    """Start the Finder bot in a separate thread"""
-    try:
-        from modules.finder.bot import run
-        logger.info("Starting Finder bot...")
-        run()
-    except Exception as e:
-        logger.error(f"Error starting Finder bot: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+def start_shard_group(shard_ids, shard_count):
+    """Entry point of one shard process, runs the shard ids it was given"""
+    group = f"shards {shard_ids[0]}-{shard_ids[-1]}"
+    # Every process writes to the same log files, tag lines with the group they came from
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(
+            f'[%(asctime)s] [%(levelname)-8s] [{group}] %(name)s: %(message)s'
+        ))
+
+    from modules.utils.client import run_bot, EXTENSIONS
+    logger.info(f"Starting {group} of {shard_count}")
+    run_bot(EXTENSIONS, shard_ids=shard_ids, shard_count=shard_count)
+
+def run_shard_processes():
+    """Split the shards over SHARD_PROCESSES processes and wait for them"""
+    import asyncio
+    import multiprocessing
+    from modules.utils.client import SHARD_CONFIG, fetch_recommended_shard_count, split_shards
+
+    shard_count = SHARD_CONFIG['count'] or asyncio.run(fetch_recommended_shard_count(os.getenv('DISCORD_TOKEN')))
+    groups = split_shards(shard_count, SHARD_CONFIG['processes'])
+    logger.info(f"Running {shard_count} shard(s) in {len(groups)} process(es)")
+
+    processes = []
+    for shard_ids in groups:
+        process = multiprocessing.Process(
+            target=start_shard_group,
+            args=(shard_ids, shard_count),
+            name=f"shards-{shard_ids[0]}-{shard_ids[-1]}"
+        )
+        process.start()
+        processes.append(process)
 
-def start_tickets():
-    """Start the Ticket system in a separate thread"""
     try:
-        from modules.tickets.bot import run
-        logger.info("Starting Ticket system...")
-        run()
-    except Exception as e:
-        logger.error(f"Error starting Ticket system: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        for process in processes:
+            process.join()
+            if process.exitcode:
+                logger.error(f"{process.name} exited with code {process.exitcode}")
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        raise
 
 def main():
     """Main entry point to start all bots"""
     logger.info("Starting Nova Gaming Discord bot system...")
     
-    finder_thread = threading.Thread(target=start_finder, name="FinderBot")
-    tickets_thread = threading.Thread(target=start_tickets, name="TicketSystem")
-    
-    finder_thread.daemon = True
-    tickets_thread.daemon = True
-    
-    finder_thread.start()
-    tickets_thread.start()
-    
     try:
-        finder_thread.join()
-        tickets_thread.join()
+        from modules.utils.client import run_bot, EXTENSIONS, SHARD_CONFIG
+        if SHARD_CONFIG['mode'] == 'processes':
+            run_shard_processes()
+        else:
+            logger.info(f"Loading {', '.join(EXTENSIONS)} on one client ({SHARD_CONFIG['mode']} mode)...")
+            run_bot(EXTENSIONS)
     except KeyboardInterrupt:
         logger.info("Received shutdown signal, closing bots...")
         sys.exit(0)
+    except Exception as e:
+        logger.error(f"Error running bot system: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
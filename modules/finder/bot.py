@@ -8,9 +8,22 @@ from dotenv import load_dotenv
 import sys
 import logging
 from pathlib import Path
+import asyncio
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from modules.utils.db import get_mysql_connection, get_player_from_discord, get_characters
+from modules.utils.db import (
+    DATA_DIR, mysql_connection, get_player_profile, get_db_stats, invalidate_player, player_cache,
+    VEHICLE_INVENTORY_QUERY, CHARACTER_BY_CITIZENID_QUERY, run_in_db_thread
+)
+from modules.utils.invalidations import publish_invalidation
+from modules.utils.advisor import log_startup_check
+from modules.utils.client import run_bot, SHARD_CONFIG
+from modules.utils.command_sync import sync_command_tree
+from modules.finder.role_queue import RoleQueue
+from modules.finder.reconcile import reconcile_reaction_roles, reconcile_config
+from modules.finder.reaction_roles import (
+    ReactionRoleIndex, add_mapping, remove_mappings, list_mappings, store as reaction_role_store
+)
 
 log_dir = Path(__file__).parent.parent.parent / "logs"
 log_dir.mkdir(exist_ok=True)
@@ -32,337 +45,49 @@ async def _request(self, *args, **kwargs):
     return await original_request(self, *args, **kwargs)
 aiohttp.ClientSession._request = _request
 
-intents = discord.Intents.default()
-intents.message_content = True
-intents.reactions = True
-intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
-
 REACTION_ROLE_CONFIG = {
     'message_id': int(os.getenv('REACTION_MESSAGE_ID')),
     'emoji': '✅',
     'role_id': int(os.getenv('REACTION_ROLE_ID'))
 }
 
-STAFF_ROLE_ID = int(os.getenv('STAFF_ROLE_ID'))
+# Where the reaction role message was last found, so startup doesn't search every channel
+REACTION_LOCATION_FILE = DATA_DIR / "reaction_role.json"
+# Channels searched at once when the stored location is missing or stale
+REACTION_SEARCH_CONCURRENCY = int(os.getenv('REACTION_SEARCH_CONCURRENCY', '4'))
 
-@bot.event
-async def on_ready():
-    logger.info(f'Finder Bot is online as {bot.user}')
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f'Synced {len(synced)} command(s)')
-        
-        try:
-            message_id = REACTION_ROLE_CONFIG['message_id']
-            for guild in bot.guilds:
-                for channel in guild.text_channels:
-                    try:
-                        message = await channel.fetch_message(message_id)
-                        await message.add_reaction(REACTION_ROLE_CONFIG['emoji'])
-                        logger.info(f"Added reaction to message {message_id}")
-                        break
-                    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                        continue
-        except Exception as e:
-            logger.error(f"Error setting up reaction: {e}")
-            
-    except Exception as e:
-        logger.error(f'Error syncing commands: {e}')
-
-@bot.event
-async def on_raw_reaction_add(payload):
-    if (payload.message_id == REACTION_ROLE_CONFIG['message_id'] and 
-        str(payload.emoji) == REACTION_ROLE_CONFIG['emoji']):
-            
-        if payload.user_id == bot.user.id:
-            return
-            
-        try:
-            guild = bot.get_guild(payload.guild_id)
-            if not guild:
-                return
-                
-            role = guild.get_role(REACTION_ROLE_CONFIG['role_id'])
-            if not role:
-                logger.error(f"Role {REACTION_ROLE_CONFIG['role_id']} not found")
-                return
-                
-            member = guild.get_member(payload.user_id)
-            if not member:
-                logger.error(f"Member {payload.user_id} not found")
-                return
-                
-            await member.add_roles(role, reason="Reaction role")
-            logger.info(f"Added role {role.name} to {member.display_name}")
-            
-        except Exception as e:
-            logger.error(f"Error adding role: {e}")
+# Seconds between checks for reaction role changes made outside this process
+REACTION_ROLE_RELOAD_INTERVAL = float(os.getenv('REACTION_ROLE_RELOAD_INTERVAL', '10'))
 
-@bot.event
-async def on_raw_reaction_remove(payload):
-    if (payload.message_id == REACTION_ROLE_CONFIG['message_id'] and 
-        str(payload.emoji) == REACTION_ROLE_CONFIG['emoji']):
-        
-        try:
-            guild = bot.get_guild(payload.guild_id)
-            if not guild:
-                return
-                
-            role = guild.get_role(REACTION_ROLE_CONFIG['role_id'])
-            if not role:
-                return
-                
-            member = guild.get_member(payload.user_id)
-            if not member:
-                return
-                
-            await member.remove_roles(role, reason="Reaction role removed")
-            logger.info(f"Removed role {role.name} from {member.display_name}")
-            
-        except Exception as e:
-            logger.error(f"Error removing role: {e}")
-
-@bot.command()
-async def sync(ctx):
-    if ctx.author.id != ctx.guild.owner_id:
-        await ctx.send("You do not have permission to sync commands.")
-        return
-    synced = await bot.tree.sync()
-    await ctx.send(f"Synced {len(synced)} commands globally.")
-
-
-@bot.tree.command(name="vehicleinfo", description="Lookup vehicle inventory by plate")
-@app_commands.describe(plate="Plate number to search for")
-async def vehicleinfo(interaction: discord.Interaction, plate: str):
-    logger.info(f"Vehicle info command received for plate: {plate}")
-
-    await interaction.response.defer()
-    has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
-
-    if not has_role:
-        await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
-        return
-
-    conn = None
-    cursor = None
-
-    try:
-        logger.info("Connecting to database...")
-        conn = get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        query = "SELECT trunk, glovebox FROM player_vehicles WHERE plate = %s"
-        cursor.execute(query, (plate.upper(),))
-        result = cursor.fetchone()
-
-        if result:
-            trunk_data = json.loads(result.get('trunk') or "[]")
-            glovebox_data = json.loads(result.get('glovebox') or "[]")
-
-            def format_inventory(items):
-                if not items:
-                    return "Empty"
-                lines = []
-                for item in items:
-                    name = item.get("name", "Unknown")
-                    count = item.get("count", 1)
-                    lines.append(f"{name} {count}")
-                return "\n".join(lines)
-
-            trunk_formatted = format_inventory(trunk_data)
-            glovebox_formatted = format_inventory(glovebox_data)
-
-            embed = discord.Embed(title=f"Inventory for Plate: {plate.upper()}", color=discord.Color.blue())
-            embed.add_field(name="🧳 Trunk", value=f"```{trunk_formatted}```", inline=False)
-            embed.add_field(name="🧤 Glovebox", value=f"```{glovebox_formatted}```", inline=False)
-
-            await interaction.followup.send(embed=embed)
-        else:
-            await interaction.followup.send(f"No vehicle found with plate `{plate.upper()}`.")
-
-    except Exception as e:
-        logger.error(f"Error in vehicleinfo command: {e}")
-        await interaction.followup.send(f"An error occurred: {e}")
-
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-
-@bot.tree.command(name="info", description="Look up characters associated with a Discord user")
-@app_commands.describe(user="Mention the Discord user to search for")
-async def info(interaction: discord.Interaction, user: discord.User):
-    await interaction.response.defer()
-    has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
-
-    if not has_role:
-        await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
-        return
+STAFF_ROLE_ID = int(os.getenv('STAFF_ROLE_ID'))
+INDEX_CHECK_ON_STARTUP = os.getenv('DB_INDEX_CHECK_ON_STARTUP', 'true').lower() == 'true'
 
+def load_reaction_location():
+    """Stored {'message_id', 'channel_id', 'guild_id'} for the current REACTION_MESSAGE_ID, or None"""
     try:
-        discord_id = str(user.id)
-        
-        user_result = get_player_from_discord(discord_id)
-
-        if not user_result:
-            await interaction.followup.send(f"No player found for Discord user <@{discord_id}>.")
-            return
-            
-        user_id = user_result['userId']
-        license = user_result['license']
-        license2 = user_result.get('license2', '')
-        
-        embed = discord.Embed(title="User Information", color=discord.Color.blue())
-        
-        user_info = f"Username: {user_result.get('username', 'N/A')}\n"
-        user_info += f"Account ID: {user_result.get('userId', 'N/A')}\n"
-        user_info += f"{user_result.get('license2', 'N/A')}\n"
-        user_info += f"Discord: {user_result.get('discord', 'N/A')}\n"
-        user_info += f"FiveM: {user_result.get('fivem', 'N/A')}"
-        
-        embed.add_field(name="User Info", value=f"```{user_info}```", inline=False)
-        
-        character_results = get_characters(license, license2, user_id)
-        
-        if character_results:
-            characters_overview = ""
-            for char in character_results:
-                try:
-                    charinfo = json.loads(char.get('charinfo', '{}'))
-                    first_name = charinfo.get('firstname', 'Unknown')
-                    last_name = charinfo.get('lastname', 'Unknown')
-                    characters_overview += f"ID: {char.get('citizenid')} | {first_name} {last_name}\n"
-                except json.JSONDecodeError:
-                    characters_overview += f"ID: {char.get('citizenid')} | Name: {char.get('name', 'Unknown')}\n"
-            
-            embed.add_field(
-                name="All Characters", 
-                value=f"```{characters_overview}```", 
-                inline=False
-            )
-        else:
-            embed.add_field(name="Characters", value="```No characters found for this user.```", inline=False)
-        
-        embed.add_field(
-            name="Detailed Info",
-            value="Use `/character @user` or `/character [citizenid]` to view detailed character information.",
-            inline=False
-        )
-        
-        await interaction.followup.send(embed=embed)
-
-    except Exception as e:
-        logger.error(f"Error in info command: {e}")
-        await interaction.followup.send(f"An error occurred: {e}")
-
-
-@bot.tree.command(name="character", description="Look up detailed information about a character")
-@app_commands.describe(
-    user="Mention the Discord user to search for (optional)",
-    citizenid="Citizen ID to look up (optional)"
-)
-async def character(
-    interaction: discord.Interaction, 
-    user: discord.User = None, 
-    citizenid: str = None
-):
-    await interaction.response.defer()
-    has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
-
-    if not has_role:
-        await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
-        return
-    
-    if not user and not citizenid:
-        await interaction.followup.send("You must provide either a user mention or a citizen ID.")
-        return
-        
-    conn = None
-    cursor = None
-    
-    try:
-        conn = get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        if citizenid:
-            char_query = "SELECT * FROM players WHERE citizenid = %s"
-            cursor.execute(char_query, (citizenid,))
-            character = cursor.fetchone()
-            
-            if not character:
-                await interaction.followup.send(f"No character found with citizen ID: {citizenid}")
-                return
-                
-            embed = create_character_embed(character)
-            await interaction.followup.send(embed=embed)
-                
-        elif user:
-            discord_id = str(user.id)
-            user_result = get_player_from_discord(discord_id)
-            
-            if not user_result:
-                await interaction.followup.send(f"No player found for Discord user <@{discord_id}>.")
-                return
-                
-            user_id = user_result['userId']
-            license = user_result['license']
-            license2 = user_result.get('license2', '')
-            
-            characters = get_characters(license, license2, user_id)
-            
-            if not characters:
-                await interaction.followup.send(f"No characters found for user <@{discord_id}>.")
-                return
-                
-            embed = discord.Embed(title=f"Characters for {user.display_name}", color=discord.Color.blue())
-            
-            for character in characters:
-                try:
-                    charinfo = json.loads(character.get('charinfo', '{}'))
-                    first_name = charinfo.get('firstname', 'Unknown')
-                    last_name = charinfo.get('lastname', 'Unknown')
-                    
-                    char_title = f"{first_name} {last_name} (ID: {character.get('citizenid', 'XXX')})"
-                    
-                    char_details = f"Character ID: {character.get('citizenid', 'N/A')}\n"
-                    char_details += f"CID: {character.get('cid', 'N/A')}\n"
-                    char_details += f"Database ID: {character.get('id', 'N/A')}\n"
-                    char_details += f"Name: {character.get('name', 'N/A')}\n"
-                    char_details += f"First Name: {first_name}\n"
-                    char_details += f"Last Name: {last_name}\n"
-                    
-                    if 'birthdate' in charinfo:
-                        char_details += f"Birthdate: {charinfo.get('birthdate', 'N/A')}\n"
-                    
-                    if 'gender' in charinfo:
-                        char_details += f"Gender: {charinfo.get('gender', 'N/A')}\n"
-                    
-                    if 'nationality' in charinfo:
-                        char_details += f"Nationality: {charinfo.get('nationality', 'N/A')}"
-                    
-                    embed.add_field(name=f"{char_title}", value=f"```{char_details}```", inline=False)
-                    
-                except (json.JSONDecodeError, Exception) as e:
-                    logger.error(f"Error parsing character info: {e}")
-                    char_info = f"Character ID: {character.get('citizenid', 'N/A')}\n"
-                    char_info += f"Error parsing character data: {str(e)}"
-                    embed.add_field(name=f"Character {character.get('citizenid', 'Unknown')}", value=f"```{char_info}```", inline=False)
-            
-            await interaction.followup.send(embed=embed)
-            
-    except Exception as e:
-        logger.error(f"Error in character command: {e}")
-        await interaction.followup.send(f"An error occurred: {e}")
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
+        with open(REACTION_LOCATION_FILE) as f:
+            location = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable {REACTION_LOCATION_FILE.name}: {e}")
+        return None
+
+    # A different message was configured since, the stored channel says nothing about it
+    if location.get('message_id') != REACTION_ROLE_CONFIG['message_id']:
+        return None
+    return location
+
+def save_reaction_location(message):
+    location = {
+        'message_id': message.id,
+        'channel_id': message.channel.id,
+        'guild_id': message.guild.id
+    }
+    tmp = REACTION_LOCATION_FILE.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(location, f, indent=2)
+    os.replace(tmp, REACTION_LOCATION_FILE)
 
 def create_character_embed(character):
     try:
@@ -401,154 +126,714 @@ def create_character_embed(character):
         return embed
 
 
-@bot.tree.command(name="vehicles", description="Look up vehicles owned by a Discord user")
-@app_commands.describe(user="Mention the Discord user to search for")
-async def vehicles(interaction: discord.Interaction, user: discord.User):
-    await interaction.response.defer()
-    has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+class Finder(commands.Cog):
+    """Player lookups, reaction roles and database admin commands"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.reaction_message = None
+        self.reaction_message_outcome = None  # 'found', 'other shard' or 'missing' once this process looked for it
+        self.reaction_roles = ReactionRoleIndex(static_mappings=[(
+            REACTION_ROLE_CONFIG['message_id'], REACTION_ROLE_CONFIG['emoji'], REACTION_ROLE_CONFIG['role_id']
+        )])
+        self.reaction_reload_task = None
+        self.role_queue = RoleQueue(bot)
+        self.reconcile_lock = asyncio.Lock()
+        self.index_checked = False
+
+    async def cog_load(self):
+        await run_in_db_thread(reaction_role_store.migrate)
+        await run_in_db_thread(self.reaction_roles.reload_if_changed)
+        self.reaction_reload_task = asyncio.create_task(self.watch_reaction_roles())
+        self.role_queue.start()
+
+    async def cog_unload(self):
+        if self.reaction_reload_task:
+            self.reaction_reload_task.cancel()
+        self.role_queue.stop()
+        await run_in_db_thread(reaction_role_store.close)
+
+    async def watch_reaction_roles(self):
+        """Pick up reaction role changes made by staff in other shard processes"""
+        while True:
+            await asyncio.sleep(REACTION_ROLE_RELOAD_INTERVAL)
+            try:
+                await run_in_db_thread(self.reaction_roles.reload_if_changed)
+            except Exception as e:
+                logger.error(f"Error reloading reaction roles: {e}")
+
+    async def fetch_stored_reaction_message(self, location):
+        """The reaction message at its stored location, None if it moved"""
+        channel = self.bot.get_channel(location['channel_id'])
+        if channel is None:
+            return None
+        try:
+            return await channel.fetch_message(location['message_id'])
+        except (discord.NotFound, discord.Forbidden):
+            logger.warning(f"Reaction message is no longer in #{channel.name}, searching again")
+            return None
+
+    async def search_reaction_message(self):
+        """Look for the reaction message in every readable text channel, a few channels at a time"""
+        message_id = REACTION_ROLE_CONFIG['message_id']
+        channels = [
+            channel
+            for guild in self.bot.guilds
+            for channel in guild.text_channels
+            if channel.permissions_for(guild.me).read_message_history
+        ]
+        logger.info(f"Searching {len(channels)} channel(s) for reaction message {message_id}")
+
+        semaphore = asyncio.Semaphore(max(REACTION_SEARCH_CONCURRENCY, 1))
+        found = asyncio.Event()
+
+        async def search(channel):
+            async with semaphore:
+                if found.is_set():
+                    return None
+                try:
+                    message = await channel.fetch_message(message_id)
+                except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+                    return None
+                found.set()
+                return message
+
+        for message in await asyncio.gather(*(search(channel) for channel in channels)):
+            if message is not None:
+                return message
+        return None
+
+    async def resolve_reaction_message(self):
+        """
+        Find the configured reaction message
 
-    if not has_role:
-        await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
-        return
+        Returns:
+            tuple: (message or None, 'found', 'other shard' or 'missing')
+        """
+        location = load_reaction_location()
+        if location and getattr(self.bot, 'shard_ids', None) is not None and not self.bot.get_guild(location['guild_id']):
+            # The guild is served by another shard process, that one sets the message up
+            return None, 'other shard'
+
+        message = await self.fetch_stored_reaction_message(location) if location else None
+        if message is None:
+            message = await self.search_reaction_message()
+            if message is None:
+                logger.error(f"Reaction message {REACTION_ROLE_CONFIG['message_id']} not found in any channel")
+                return None, 'missing'
+            await run_in_db_thread(save_reaction_location, message)
+            logger.info(f"Found reaction message in #{message.channel.name}, location saved")
+        return message, 'found'
+
+    async def reconcile_reaction_roles(self, remove=None):
+        """Run one reconciliation, returns its report or None if one is already running"""
+        if self.reconcile_lock.locked():
+            return None
+        async with self.reconcile_lock:
+            channels = dict(self.reaction_roles.channels)
+            if self.reaction_message is not None:
+                channels[self.reaction_message.id] = self.reaction_message.channel.id
+            try:
+                return await reconcile_reaction_roles(self.bot, self.reaction_roles, self.role_queue, channels, remove=remove)
+            except Exception as e:
+                logger.error(f"Error reconciling reaction roles: {e}")
+                return None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        logger.info(f'Finder is online as {self.bot.user}')
+
+        # on_ready fires again after every reconnect, the message is only looked for once per process,
+        # whether it was found, belongs to another shard process or is missing (restart after fixing the config)
+        if self.reaction_message_outcome is None:
+            try:
+                self.reaction_message, self.reaction_message_outcome = await self.resolve_reaction_message()
+                message = self.reaction_message
+                emoji = REACTION_ROLE_CONFIG['emoji']
+                if message and not any(reaction.me and str(reaction.emoji) == emoji for reaction in message.reactions):
+                    await message.add_reaction(emoji)
+                    logger.info(f"Added reaction to message {message.id}")
+            except Exception as e:
+                logger.error(f"Error setting up reaction: {e}")
+
+            if reconcile_config['on_startup']:
+                # Catch up on reactions made while offline without holding up the rest of startup
+                asyncio.create_task(self.reconcile_reaction_roles())
+
+        # Once per process, not again on every reconnect
+        if INDEX_CHECK_ON_STARTUP and not self.index_checked:
+            self.index_checked = True
+            try:
+                await run_in_db_thread(log_startup_check)
+            except Exception as e:
+                logger.error(f"Error running index check: {e}")
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        role_ids = self.reaction_roles.lookup(payload.message_id, payload.emoji)
+        if not role_ids or payload.user_id == self.bot.user.id or payload.guild_id is None:
+            return
+        self.role_queue.submit(payload.guild_id, payload.user_id, role_ids, add=True, member=payload.member)
 
-    conn = None
-    cursor = None
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        role_ids = self.reaction_roles.lookup(payload.message_id, payload.emoji)
+        if not role_ids or payload.guild_id is None:
+            return
+        self.role_queue.submit(payload.guild_id, payload.user_id, role_ids, add=False)
 
-    try:
-        discord_id = str(user.id)
-        user_result = get_player_from_discord(discord_id)
-        
-        if not user_result:
-            await interaction.followup.send(f"No player found for Discord user <@{discord_id}>.")
+    @commands.command()
+    async def sync(self, ctx):
+        if ctx.author.id != ctx.guild.owner_id:
+            await ctx.send("You do not have permission to sync commands.")
             return
+        # Forced, for when Discord lost the commands even though the stored hash matches
+        result = await sync_command_tree(self.bot, force=True)
+        await ctx.send(f"Synced {result['global']} commands globally and to {len(result['guilds'])} guild(s).")
 
-        conn = get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = user_result['userId']
-        license = user_result['license']
-        license2 = user_result.get('license2', '')
-        
-        char_query = "SELECT citizenid FROM players WHERE license = %s OR license = %s OR userId = %s"
-        cursor.execute(char_query, (license, license2, user_id))
-        characters = cursor.fetchall()
-        
-        if not characters:
-            await interaction.followup.send(f"No characters found for user <@{discord_id}>.")
+    @app_commands.command(name="vehicleinfo", description="Lookup vehicle inventory by plate")
+    @app_commands.describe(plate="Plate number to search for")
+    async def vehicleinfo(self, interaction: discord.Interaction, plate: str):
+        logger.info(f"Vehicle info command received for plate: {plate}")
+
+        await interaction.response.defer()
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
             return
-            
-        citizenids = [char['citizenid'] for char in characters]
-        
-        placeholders = ', '.join(['%s'] * len(citizenids))
-        vehicle_query = f"""
-        SELECT plate, vehicle, hash, garage, state, depotprice, drivingdistance, status, fuel, engine, body
-        FROM player_vehicles 
-        WHERE citizenid IN ({placeholders})
-        """
-        
-        cursor.execute(vehicle_query, citizenids)
-        vehicles = cursor.fetchall()
-        
-        if not vehicles:
-            await interaction.followup.send(f"No vehicles found for user <@{discord_id}>.")
+
+        try:
+            async with mysql_connection() as db:
+                result = await db.fetchone(VEHICLE_INVENTORY_QUERY, (plate.upper(),))
+
+            if result:
+                trunk_data = json.loads(result.get('trunk') or "[]")
+                glovebox_data = json.loads(result.get('glovebox') or "[]")
+
+                def format_inventory(items):
+                    if not items:
+                        return "Empty"
+                    lines = []
+                    for item in items:
+                        name = item.get("name", "Unknown")
+                        count = item.get("count", 1)
+                        lines.append(f"{name} {count}")
+                    return "\n".join(lines)
+
+                trunk_formatted = format_inventory(trunk_data)
+                glovebox_formatted = format_inventory(glovebox_data)
+
+                embed = discord.Embed(title=f"Inventory for Plate: {plate.upper()}", color=discord.Color.blue())
+                embed.add_field(name="🧳 Trunk", value=f"```{trunk_formatted}```", inline=False)
+                embed.add_field(name="🧤 Glovebox", value=f"```{glovebox_formatted}```", inline=False)
+
+                await interaction.followup.send(embed=embed)
+            else:
+                await interaction.followup.send(f"No vehicle found with plate `{plate.upper()}`.")
+
+        except Exception as e:
+            logger.error(f"Error in vehicleinfo command: {e}")
+            await interaction.followup.send(f"An error occurred: {e}")
+
+    @app_commands.command(name="info", description="Look up characters associated with a Discord user")
+    @app_commands.describe(user="Mention the Discord user to search for")
+    async def info(self, interaction: discord.Interaction, user: discord.User):
+        await interaction.response.defer()
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
             return
-            
-        embed = discord.Embed(
-            title=f"Vehicles owned by {user.display_name}",
-            color=discord.Color.blue(),
-            description=f"Found {len(vehicles)} vehicles across {len(citizenids)} characters."
-        )
-        
-        by_garage = {}
-        for vehicle in vehicles:
-            location = vehicle.get('garage', 'Unknown')
-            if vehicle.get('state') == 0:
-                location = "Impound"
-                
-            if location not in by_garage:
-                by_garage[location] = []
-                
-            by_garage[location].append(vehicle)
-        
-        for location, loc_vehicles in by_garage.items():
-            vehicle_list = ""
-            for v in loc_vehicles:
-                status_emoji = "🟢" if v.get('state', 0) == 1 else "🔴"
-                vehicle_list += f"{status_emoji} {v.get('vehicle', 'Unknown')} ({v.get('plate', 'No Plate')})\n"
-                
+
+        try:
+            discord_id = str(user.id)
+
+            profile = await get_player_profile(discord_id, include=('characters',))
+
+            if not profile:
+                await interaction.followup.send(f"No player found for Discord user <@{discord_id}>.")
+                return
+
+            embed = discord.Embed(title="User Information", color=discord.Color.blue())
+
+            user_info = f"Username: {profile.username}\n"
+            user_info += f"Account ID: {profile.user_id}\n"
+            user_info += f"{profile.license2}\n"
+            user_info += f"Discord: {profile.discord}\n"
+            user_info += f"FiveM: {profile.fivem}"
+
+            embed.add_field(name="User Info", value=f"```{user_info}```", inline=False)
+
+            if profile.characters:
+                characters_overview = ""
+                for char in profile.characters:
+                    try:
+                        charinfo = json.loads(char.charinfo or '{}')
+                        first_name = charinfo.get('firstname', 'Unknown')
+                        last_name = charinfo.get('lastname', 'Unknown')
+                        characters_overview += f"ID: {char.citizenid} | {first_name} {last_name}\n"
+                    except json.JSONDecodeError:
+                        characters_overview += f"ID: {char.citizenid} | Name: {char.name or 'Unknown'}\n"
+
+                embed.add_field(
+                    name="All Characters", 
+                    value=f"```{characters_overview}```", 
+                    inline=False
+                )
+            else:
+                embed.add_field(name="Characters", value="```No characters found for this user.```", inline=False)
+
             embed.add_field(
-                name=f"Location: {location} ({len(loc_vehicles)})",
-                value=f"```{vehicle_list}```",
+                name="Detailed Info",
+                value="Use `/character @user` or `/character [citizenid]` to view detailed character information.",
                 inline=False
             )
-            
-        embed.set_footer(text="Use /vehicleinfo [plate] to view a vehicle's inventory")
-            
-        await interaction.followup.send(embed=embed)
-            
-    except Exception as e:
-        logger.error(f"Error in vehicles command: {e}")
-        await interaction.followup.send(f"An error occurred: {e}")
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-
-@bot.tree.command(name="help", description="Display information about available commands")
-async def help_command(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="Bot Commands",
-        description="Here are the available commands for this bot:",
-        color=discord.Color.blue()
-    )
-    
-    embed.add_field(
-        name="`/info @user`",
-        value="Look up characters associated with a Discord user.",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="`/character @user` or `/character [citizenid]`",
-        value="Look up detailed information about a character.",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="`/vehicles @user`",
-        value="Look up vehicles owned by a Discord user.",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="`/vehicleinfo [plate]`",
-        value="Look up a vehicle's inventory by plate number.",
-        inline=False
+
+            await interaction.followup.send(embed=embed)
+
+        except Exception as e:
+            logger.error(f"Error in info command: {e}")
+            await interaction.followup.send(f"An error occurred: {e}")
+
+    @app_commands.command(name="character", description="Look up detailed information about a character")
+    @app_commands.describe(
+        user="Mention the Discord user to search for (optional)",
+        citizenid="Citizen ID to look up (optional)"
     )
-    
-    embed.add_field(
-        name="`/help`",
-        value="Shows this help message.",
-        inline=False
+    async def character(
+        self,
+        interaction: discord.Interaction, 
+        user: discord.User = None, 
+        citizenid: str = None
+    ):
+        await interaction.response.defer()
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        if not user and not citizenid:
+            await interaction.followup.send("You must provide either a user mention or a citizen ID.")
+            return
+
+        try:
+            if citizenid:
+                async with mysql_connection() as db:
+                    character = await db.fetchone(CHARACTER_BY_CITIZENID_QUERY, (citizenid,))
+
+                if not character:
+                    await interaction.followup.send(f"No character found with citizen ID: {citizenid}")
+                    return
+
+                embed = create_character_embed(character)
+                await interaction.followup.send(embed=embed)
+
+            elif user:
+                discord_id = str(user.id)
+                profile = await get_player_profile(discord_id, include=('characters',))
+
+                if not profile:
+                    await interaction.followup.send(f"No player found for Discord user <@{discord_id}>.")
+                    return
+
+                characters = profile.characters
+
+                if not characters:
+                    await interaction.followup.send(f"No characters found for user <@{discord_id}>.")
+                    return
+
+                embed = discord.Embed(title=f"Characters for {user.display_name}", color=discord.Color.blue())
+
+                for character in characters:
+                    try:
+                        charinfo = json.loads(character.charinfo or '{}')
+                        first_name = charinfo.get('firstname', 'Unknown')
+                        last_name = charinfo.get('lastname', 'Unknown')
+
+                        char_title = f"{first_name} {last_name} (ID: {character.citizenid})"
+
+                        char_details = f"Character ID: {character.citizenid}\n"
+                        char_details += f"CID: {character.cid}\n"
+                        char_details += f"Database ID: {character.id}\n"
+                        char_details += f"Name: {character.name}\n"
+                        char_details += f"First Name: {first_name}\n"
+                        char_details += f"Last Name: {last_name}\n"
+
+                        if 'birthdate' in charinfo:
+                            char_details += f"Birthdate: {charinfo.get('birthdate', 'N/A')}\n"
+
+                        if 'gender' in charinfo:
+                            char_details += f"Gender: {charinfo.get('gender', 'N/A')}\n"
+
+                        if 'nationality' in charinfo:
+                            char_details += f"Nationality: {charinfo.get('nationality', 'N/A')}"
+
+                        embed.add_field(name=f"{char_title}", value=f"```{char_details}```", inline=False)
+
+                    except (json.JSONDecodeError, Exception) as e:
+                        logger.error(f"Error parsing character info: {e}")
+                        char_info = f"Character ID: {character.citizenid}\n"
+                        char_info += f"Error parsing character data: {str(e)}"
+                        embed.add_field(name=f"Character {character.citizenid}", value=f"```{char_info}```", inline=False)
+
+                await interaction.followup.send(embed=embed)
+
+        except Exception as e:
+            logger.error(f"Error in character command: {e}")
+            await interaction.followup.send(f"An error occurred: {e}")
+
+
+
+    @app_commands.command(name="vehicles", description="Look up vehicles owned by a Discord user")
+    @app_commands.describe(user="Mention the Discord user to search for")
+    async def vehicles(self, interaction: discord.Interaction, user: discord.User):
+        await interaction.response.defer()
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        try:
+            discord_id = str(user.id)
+            profile = await get_player_profile(discord_id, include=('characters', 'vehicles'))
+
+            if not profile:
+                await interaction.followup.send(f"No player found for Discord user <@{discord_id}>.")
+                return
+
+            if not profile.characters:
+                await interaction.followup.send(f"No characters found for user <@{discord_id}>.")
+                return
+
+            citizenids = [char.citizenid for char in profile.characters]
+            vehicles = profile.vehicles
+
+            if not vehicles:
+                await interaction.followup.send(f"No vehicles found for user <@{discord_id}>.")
+                return
+
+            embed = discord.Embed(
+                title=f"Vehicles owned by {user.display_name}",
+                color=discord.Color.blue(),
+                description=f"Found {len(vehicles)} vehicles across {len(citizenids)} characters."
+            )
+
+            by_garage = {}
+            for vehicle in vehicles:
+                location = vehicle.garage
+                if vehicle.state == 0:
+                    location = "Impound"
+
+                if location not in by_garage:
+                    by_garage[location] = []
+
+                by_garage[location].append(vehicle)
+
+            for location, loc_vehicles in by_garage.items():
+                vehicle_list = ""
+                for v in loc_vehicles:
+                    status_emoji = "🟢" if v.state == 1 else "🔴"
+                    vehicle_list += f"{status_emoji} {v.vehicle or 'Unknown'} ({v.plate})\n"
+
+                embed.add_field(
+                    name=f"Location: {location} ({len(loc_vehicles)})",
+                    value=f"```{vehicle_list}```",
+                    inline=False
+                )
+
+            embed.set_footer(text="Use /vehicleinfo [plate] to view a vehicle's inventory")
+
+            await interaction.followup.send(embed=embed)
+
+        except Exception as e:
+            logger.error(f"Error in vehicles command: {e}")
+            await interaction.followup.send(f"An error occurred: {e}")
+
+    @app_commands.command(name="dbstats", description="Show database queue and connection pool statistics")
+    async def dbstats(self, interaction: discord.Interaction):
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        stats = get_db_stats()
+        executor = stats['executor']
+        pool = stats['pool']
+
+        embed = discord.Embed(title="Database Statistics", color=discord.Color.blue())
+
+        executor_info = f"Workers: {executor['running']}/{executor['workers']} busy\n"
+        executor_info += f"Queued: {executor['queued']}\n"
+        executor_info += f"Avg wait: {executor['avg_wait'] * 1000:.1f}ms (max {executor['max_wait'] * 1000:.1f}ms)\n"
+        executor_info += f"Avg query: {executor['avg_run'] * 1000:.1f}ms\n"
+        executor_info += f"Completed: {executor['completed']} | Failed: {executor['failed']}\n"
+        executor_info += f"Timeouts: {executor['timeouts']} | Cancelled: {executor['cancelled']}"
+        embed.add_field(name="Query Queue", value=f"```{executor_info}```", inline=False)
+
+        pool_info = f"Open: {pool['open']}/{pool['max']} ({pool['idle']} idle) | Waiting: {pool['waiting']}\n"
+        pool_info += f"Created: {pool['created']} | Reused: {pool['reused']}\n"
+        pool_info += f"Discarded: {pool['discarded']} | Reaped: {pool['reaped']}\n"
+        pool_info += f"Checkout timeouts: {pool['timeouts']}"
+        embed.add_field(name="MySQL Pool", value=f"```{pool_info}```", inline=False)
+
+        flights = stats['singleflight']
+        flight_info = f"Lookups run: {flights['leaders']}\n"
+        flight_info += f"Collapsed into an in-flight lookup: {flights['collapsed']}\n"
+        flight_info += f"In flight now: {flights['in_flight']}"
+        embed.add_field(name="Lookup Deduplication", value=f"```{flight_info}```", inline=False)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="shardinfo", description="Show which shard serves this server and shard health")
+    async def shardinfo(self, interaction: discord.Interaction):
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        shard_info = f"Mode: {SHARD_CONFIG['mode']}\n"
+        shard_info += f"This server: shard {interaction.guild.shard_id} of {self.bot.shard_count or 1}\n\n"
+        for shard_id, (latency, guild_count) in sorted(self.bot.shard_summary().items()):
+            shard_info += f"Shard {shard_id}: {guild_count} guild(s), {latency * 1000:.0f}ms\n"
+
+        embed = discord.Embed(title="Shards", description=f"```{shard_info}```", color=discord.Color.blue())
+        embed.set_footer(text="Only shards running in this process are listed")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    cache_group = app_commands.Group(name="cache", description="Manage the player lookup cache")
+
+    @cache_group.command(name="invalidate", description="Forget cached lookups for a Discord user")
+    @app_commands.describe(user="Mention the Discord user whose cached data should be refreshed")
+    async def cache_invalidate(self, interaction: discord.Interaction, user: discord.User):
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        removed = invalidate_player(str(user.id))
+        if SHARD_CONFIG['mode'] == 'processes':
+            await run_in_db_thread(publish_invalidation, str(user.id))
+        logger.info(f"{interaction.user} invalidated {removed} cache entries for {user.id}")
+        await interaction.response.send_message(
+            f"Cleared {removed} cached entries for {user.mention}. The next lookup will read fresh data.",
+            ephemeral=True
+        )
+
+    @cache_group.command(name="stats", description="Show player profile cache hit rates")
+    async def cache_stats(self, interaction: discord.Interaction):
+        has_role = discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID)
+
+        if not has_role:
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        stats = player_cache.stats()
+        counts = stats['kinds'].get('profile', {'hits': 0, 'misses': 0})
+        total = counts['hits'] + counts['misses']
+        hit_rate = counts['hits'] / total * 100 if total else 0
+        cache_info = f"Cached profiles: {stats['size']}/{stats['max_size']} | Evictions: {stats['evictions']}\n"
+        cache_info += f"Profile lookups: {counts['hits']} hits / {counts['misses']} misses ({hit_rate:.0f}%)\n"
+
+        embed = discord.Embed(title="Player Cache", description=f"```{cache_info}```", color=discord.Color.blue())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+    reactionrole_group = app_commands.Group(name="reactionrole", description="Manage reaction roles")
+
+    def is_staff(self, interaction):
+        return discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID) is not None
+
+    @reactionrole_group.command(name="add", description="Give a role when users react to a message with an emoji")
+    @app_commands.describe(
+        message_id="ID of the message to react to",
+        emoji="Emoji users react with",
+        role="Role to give",
+        channel="Channel the message is in, defaults to this one"
     )
-    
-    embed.add_field(
-        name="Requirements",
-        value="Most commands require specific Discord permissions to use.",
-        inline=False
+    async def reactionrole_add(self, interaction: discord.Interaction, message_id: str, emoji: str,
+                               role: discord.Role, channel: discord.TextChannel = None):
+        if not self.is_staff(interaction):
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        channel = channel or interaction.channel
+        await interaction.response.defer(ephemeral=True)
+        try:
+            message = await channel.fetch_message(int(message_id))
+        except (ValueError, discord.NotFound):
+            await interaction.followup.send(f"No message with ID {message_id} in {channel.mention}.", ephemeral=True)
+            return
+
+        try:
+            await message.add_reaction(discord.PartialEmoji.from_str(emoji.strip()))
+        except discord.HTTPException:
+            await interaction.followup.send(f"Could not react with {emoji}, is it an emoji from this server?", ephemeral=True)
+            return
+
+        added = await run_in_db_thread(add_mapping, interaction.guild.id, channel.id, message.id, emoji, role.id)
+        await run_in_db_thread(self.reaction_roles.reload)
+        logger.info(f"{interaction.user} mapped {emoji} on message {message.id} to role {role.name}")
+        if added:
+            await interaction.followup.send(f"Reacting with {emoji} on {message.jump_url} now gives {role.mention}.", ephemeral=True)
+        else:
+            await interaction.followup.send(f"{emoji} on that message already gives {role.mention}.", ephemeral=True)
+
+    @reactionrole_group.command(name="remove", description="Stop giving roles for reactions on a message")
+    @app_commands.describe(
+        message_id="ID of the message",
+        emoji="Only this emoji, defaults to every emoji on the message",
+        role="Only this role, defaults to every role"
     )
-    
-    embed.set_footer(text="For more help, contact your server administrator.")
-    
-    await interaction.response.send_message(embed=embed)
+    async def reactionrole_remove(self, interaction: discord.Interaction, message_id: str,
+                                  emoji: str = None, role: discord.Role = None):
+        if not self.is_staff(interaction):
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        try:
+            message_id = int(message_id)
+        except ValueError:
+            await interaction.response.send_message(f"{message_id} is not a message ID.", ephemeral=True)
+            return
+
+        removed = await run_in_db_thread(remove_mappings, message_id, emoji, role.id if role else None)
+        await run_in_db_thread(self.reaction_roles.reload)
+        logger.info(f"{interaction.user} removed {removed} reaction role mapping(s) from message {message_id}")
+
+        reply = f"Removed {removed} reaction role mapping(s)."
+        if message_id == REACTION_ROLE_CONFIG['message_id']:
+            reply += "\nThe mapping from REACTION_MESSAGE_ID in .env stays until it is changed there."
+        await interaction.response.send_message(reply, ephemeral=True)
+
+    @reactionrole_group.command(name="list", description="List the reaction roles on this server")
+    async def reactionrole_list(self, interaction: discord.Interaction):
+        if not self.is_staff(interaction):
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        rows = await run_in_db_thread(list_mappings, interaction.guild.id)
+        lines = [f"{REACTION_ROLE_CONFIG['emoji']} on {REACTION_ROLE_CONFIG['message_id']} → <@&{REACTION_ROLE_CONFIG['role_id']}> (.env)"]
+        for channel_id, message_id, emoji, role_id in rows:
+            shown = f"<:emoji:{emoji}>" if emoji.isdigit() else emoji
+            lines.append(f"{shown} on https://discord.com/channels/{interaction.guild.id}/{channel_id}/{message_id} → <@&{role_id}>")
+
+        embed = discord.Embed(title="Reaction Roles", description="\n".join(lines)[:4000], color=discord.Color.blue())
+        embed.set_footer(text=f"{len(self.reaction_roles.mappings())} mapping(s) loaded, reloaded {self.reaction_roles.reloads} time(s)")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @reactionrole_group.command(name="queue", description="Show the reaction role queue depth and throughput")
+    async def reactionrole_queue(self, interaction: discord.Interaction):
+        if not self.is_staff(interaction):
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        stats = self.role_queue.stats()
+        queue_info = f"Queued members: {stats['depth']} ({stats['backing_off']} backing off)\n"
+        queue_info += f"Applied last minute: {stats['per_minute']}\n"
+        queue_info += f"Applied total: {stats['applied']}\n"
+        queue_info += f"Already up to date: {stats['noop']}\n"
+        queue_info += f"Toggles collapsed: {stats['coalesced']}\n"
+        queue_info += f"Retried: {stats['retried']}\n"
+        queue_info += f"Failed: {stats['failed']}"
+
+        embed = discord.Embed(title="Reaction Role Queue", description=f"```{queue_info}```", color=discord.Color.blue())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @reactionrole_group.command(name="reconcile", description="Fix roles for reactions made while the bot was offline")
+    @app_commands.describe(remove="Also take the role from members who no longer have a reaction")
+    async def reactionrole_reconcile(self, interaction: discord.Interaction, remove: bool = False):
+        if not self.is_staff(interaction):
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        report = await self.reconcile_reaction_roles(remove=remove)
+        if report is None:
+            await interaction.followup.send("A reconciliation is already running or failed, check the logs.", ephemeral=True)
+            return
+
+        summary = f"Messages scanned: {report['messages']}\n"
+        summary += f"Roles to add: {report['added']}\n"
+        summary += f"Roles to remove: {report['removed']}\n"
+        summary += f"Time: {report['elapsed']:.1f}s"
+        if report['incomplete']:
+            summary += f"\nNot fully read in time: {', '.join(map(str, report['incomplete']))}"
+        if report['missing']:
+            summary += f"\nMessages not found: {', '.join(map(str, report['missing']))}"
+
+        embed = discord.Embed(title="Reaction Role Reconciliation", description=f"```{summary}```", color=discord.Color.blue())
+        embed.set_footer(text="Changes are applied through the reaction role queue, see /reactionrole queue")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="help", description="Display information about available commands")
+    async def help_command(self, interaction: discord.Interaction):
+        embed = discord.Embed(
+            title="Bot Commands",
+            description="Here are the available commands for this bot:",
+            color=discord.Color.blue()
+        )
+
+        embed.add_field(
+            name="`/info @user`",
+            value="Look up characters associated with a Discord user.",
+            inline=False
+        )
+
+        embed.add_field(
+            name="`/character @user` or `/character [citizenid]`",
+            value="Look up detailed information about a character.",
+            inline=False
+        )
+
+        embed.add_field(
+            name="`/vehicles @user`",
+            value="Look up vehicles owned by a Discord user.",
+            inline=False
+        )
+
+        embed.add_field(
+            name="`/vehicleinfo [plate]`",
+            value="Look up a vehicle's inventory by plate number.",
+            inline=False
+        )
+
+        embed.add_field(
+            name="`/cache invalidate @user`",
+            value="Refresh cached lookup data for a Discord user.",
+            inline=False
+        )
+
+        embed.add_field(
+            name="`/help`",
+            value="Shows this help message.",
+            inline=False
+        )
+
+        embed.add_field(
+            name="Requirements",
+            value="Most commands require specific Discord permissions to use.",
+            inline=False
+        )
+
+        embed.set_footer(text="For more help, contact your server administrator.")
+
+        await interaction.response.send_message(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Finder(bot))
 
 
 def run():
+    """Run the Finder on its own, without the ticket system"""
     logger.info("Starting Finder Bot...")
-    bot.run(os.getenv('DISCORD_TOKEN'))
+    run_bot(['modules.finder.bot'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""
+Reaction roles: any number of messages, each emoji granting a set of roles.
+
+Mappings live in the reaction_roles table of data/finder.db, plus the
+single mapping configured in .env (REACTION_MESSAGE_ID/REACTION_ROLE_ID).
+ReactionRoleIndex keeps them in a dict keyed by (message id, emoji) so every
+raw reaction event is resolved with one lookup, and reloads it whenever the
+table changes, including changes made by another shard process: every
+change bumps the row in reaction_roles_version, which is what gets polled.
+"""
+
+import threading
+import logging
+import discord
+
+from modules.utils.db import DATA_DIR
+from modules.utils.store import SQLiteStore
+
+logger = logging.getLogger("finder")
+
+MIGRATIONS = [
+    # 1: reaction role mappings
+    '''
+    CREATE TABLE IF NOT EXISTS reaction_roles (
+        guild_id INTEGER,
+        channel_id INTEGER,
+        message_id INTEGER,
+        emoji TEXT,
+        role_id INTEGER,
+        PRIMARY KEY (message_id, emoji, role_id)
+    );
+    ''',
+    # 2: bumped by every reaction role change, polled by the other shard processes
+    '''
+    CREATE TABLE IF NOT EXISTS reaction_roles_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER
+    );
+    INSERT OR IGNORE INTO reaction_roles_version (id, version) VALUES (1, 0);
+    '''
+]
+
+# The finder's own database, migrated by the Finder cog
+store = SQLiteStore(DATA_DIR / 'finder.db', MIGRATIONS, 'finder')
+
+
+def emoji_key(emoji):
+    """
+    Normalise an emoji to the form stored in the table
+
+    Custom emojis are keyed by id since they can be renamed, unicode emojis by
+    the character itself. Accepts a PartialEmoji/Emoji or the text a user typed.
+    """
+    if isinstance(emoji, str):
+        emoji = discord.PartialEmoji.from_str(emoji.strip())
+    return str(emoji.id) if emoji.id else emoji.name
+
+
+class ReactionRoleIndex:
+    """
+    In-memory (message id, emoji key) -> frozenset of role ids
+
+    lookup() is called from the event loop on every reaction and only reads
+    the dict, reload() swaps in a freshly built one from the DB thread.
+    """
+
+    def __init__(self, static_mappings=()):
+        # (message_id, emoji, role_id) that always apply, from .env
+        self.static_mappings = list(static_mappings)
+        self._index = {}
+        self.message_ids = frozenset()
+        self.channels = {}  # message id -> channel id, for the mappings stored in the table
+        self._version = None  # reaction_roles_version the index was built from
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def lookup(self, message_id, emoji):
+        """Role ids the reaction grants, empty if the message or emoji isn't mapped"""
+        if message_id not in self.message_ids:
+            return frozenset()
+        return self._index.get((message_id, emoji_key(emoji)), frozenset())
+
+    def mappings(self):
+        """{(message id, emoji key): role ids} snapshot"""
+        return dict(self._index)
+
+    def reload(self):
+        """Rebuild the index from the table, runs on the DB thread"""
+        with store.connection() as conn:
+            version = current_version(conn)
+            rows = conn.execute("SELECT message_id, emoji, role_id, channel_id FROM reaction_roles").fetchall()
+
+        index = {}
+        for message_id, emoji, role_id in self.static_mappings + [row[:3] for row in rows]:
+            key = (int(message_id), emoji_key(emoji))
+            index[key] = index.get(key, frozenset()) | {int(role_id)}
+
+        self._index = index
+        self.channels = {int(message_id): int(channel_id) for message_id, emoji, role_id, channel_id in rows if channel_id}
+        self.message_ids = frozenset(message_id for message_id, emoji in index)
+        with self._lock:
+            self._version = version
+        self.reloads += 1
+        logger.debug(f"Loaded {len(index)} reaction role mapping(s) on {len(self.message_ids)} message(s)")
+
+    def reload_if_changed(self):
+        """
+        Reload when the mappings changed since the index was built, in this process or another
+
+        Returns:
+            bool: True if the index was reloaded
+        """
+        with store.connection() as conn:
+            version = current_version(conn)
+        with self._lock:
+            if version == self._version:
+                return False
+
+        self.reload()
+        return True
+
+
+def current_version(conn):
+    return conn.execute("SELECT version FROM reaction_roles_version WHERE id = 1").fetchone()[0]
+
+
+def bump_version(conn):
+    conn.execute("UPDATE reaction_roles_version SET version = version + 1 WHERE id = 1")
+
+
+def add_mapping(guild_id, channel_id, message_id, emoji, role_id):
+    """Store one mapping. Returns False if it already existed"""
+    with store.connection() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO reaction_roles (guild_id, channel_id, message_id, emoji, role_id) VALUES (?, ?, ?, ?, ?)",
+            (guild_id, channel_id, message_id, emoji_key(emoji), role_id)
+        )
+        if cursor.rowcount:
+            bump_version(conn)
+        return cursor.rowcount > 0
+
+
+def remove_mappings(message_id, emoji=None, role_id=None):
+    """Delete the mappings of a message, optionally only one emoji and/or role. Returns how many were removed"""
+    query = "DELETE FROM reaction_roles WHERE message_id = ?"
+    params = [message_id]
+    if emoji is not None:
+        query += " AND emoji = ?"
+        params.append(emoji_key(emoji))
+    if role_id is not None:
+        query += " AND role_id = ?"
+        params.append(role_id)
+
+    with store.connection() as conn:
+        removed = conn.execute(query, params).rowcount
+        if removed:
+            bump_version(conn)
+        return removed
+
+
+def list_mappings(guild_id):
+    """Rows (channel_id, message_id, emoji, role_id) stored for a guild"""
+    with store.connection() as conn:
+        return conn.execute(
+            "SELECT channel_id, message_id, emoji, role_id FROM reaction_roles WHERE guild_id = ? ORDER BY message_id, emoji",
+            (guild_id,)
+        ).fetchall()
@@ -0,0 +1,143 @@
+"""
+Reaction role reconciliation.
+
+Roles only change in the raw reaction handlers, so reactions added or
+removed while the bot was offline are missed. reconcile_reaction_roles()
+pages through the users of every mapped reaction, compares them with the
+members holding each role and hands only the differences to the RoleQueue,
+which applies them rate limited. Runs at startup and from
+/reactionrole reconcile.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import collections
+import discord
+
+logger = logging.getLogger("finder")
+
+reconcile_config = {
+    'on_startup': os.getenv('REACTION_RECONCILE_ON_STARTUP', 'true').lower() == 'true',
+    # Removing roles from members without a reaction also strips roles staff handed out by hand
+    'remove': os.getenv('REACTION_RECONCILE_REMOVE', 'false').lower() == 'true',
+    'time_budget': float(os.getenv('REACTION_RECONCILE_TIME_BUDGET', '300'))
+}
+
+
+async def collect_reactors(message, index, deadline):
+    """
+    Page through the users of every mapped reaction on a message
+
+    Returns:
+        tuple: ({role id: set of user ids}, complete). complete is False if
+               the deadline passed before every page was read.
+    """
+    wanted = collections.defaultdict(set)
+    for reaction in message.reactions:
+        role_ids = index.lookup(message.id, reaction.emoji)
+        if not role_ids:
+            continue
+
+        # users() fetches 100 per request, discord.py waits out 429s between pages
+        async for user in reaction.users(limit=None):
+            if time.monotonic() > deadline:
+                return wanted, False
+            if user.bot:
+                continue
+            for role_id in role_ids:
+                wanted[role_id].add(user.id)
+    return wanted, True
+
+
+async def reconcile_reaction_roles(bot, index, role_queue, channels, remove=None, time_budget=None):
+    """
+    Bring the reaction roles in line with the reactions on their messages
+
+    Args:
+        bot: The client
+        index: ReactionRoleIndex with the mappings
+        role_queue: RoleQueue the differences are submitted to
+        channels: {message id: channel id} of every mapped message this process can reach
+        remove: Also take roles from members who no longer react, defaults to REACTION_RECONCILE_REMOVE
+        time_budget: Seconds to spend reading reactions, defaults to REACTION_RECONCILE_TIME_BUDGET
+
+    Returns:
+        dict: 'messages' scanned, 'added' and 'removed' changes queued,
+              'incomplete' message ids not fully read, 'missing' message ids not found, 'elapsed' seconds
+    """
+    remove = reconcile_config['remove'] if remove is None else remove
+    started = time.monotonic()
+    deadline = started + (time_budget or reconcile_config['time_budget'])
+    report = {'messages': 0, 'added': 0, 'removed': 0, 'incomplete': [], 'missing': [], 'elapsed': 0}
+
+    # Per guild: who should hold each role, and whether every message granting it was fully read
+    wanted = collections.defaultdict(lambda: collections.defaultdict(set))
+    complete = collections.defaultdict(lambda: collections.defaultdict(lambda: True))
+    # Roles also granted by a message that couldn't be read, nobody is known to lack them
+    unread_roles = set()
+
+    mappings = index.mappings()
+    for message_id in sorted(index.message_ids):
+        message_roles = set().union(*(role_ids for (mapped, emoji), role_ids in mappings.items() if mapped == message_id))
+
+        channel = bot.get_channel(channels.get(message_id, 0))
+        if channel is None:
+            # Unknown location or another shard process's guild
+            if message_id in channels:
+                report['missing'].append(message_id)
+            unread_roles |= message_roles
+            continue
+
+        try:
+            message = await channel.fetch_message(message_id)
+        except (discord.NotFound, discord.Forbidden):
+            report['missing'].append(message_id)
+            unread_roles |= message_roles
+            continue
+
+        reactors, fully_read = await collect_reactors(message, index, deadline)
+        report['messages'] += 1
+        if not fully_read:
+            report['incomplete'].append(message_id)
+
+        guild_id = channel.guild.id
+        for role_id in message_roles:
+            wanted[guild_id][role_id] |= reactors.get(role_id, set())
+            complete[guild_id][role_id] &= fully_read
+
+    for guild_id, roles in wanted.items():
+        guild = bot.get_guild(guild_id)
+        if not guild.chunked and remove and time.monotonic() < deadline:
+            # role.members only covers cached members, without the full list removals would be missed
+            try:
+                await asyncio.wait_for(guild.chunk(), timeout=max(deadline - time.monotonic(), 1))
+            except asyncio.TimeoutError:
+                logger.warning(f"Member list of {guild.name} not loaded in time, only cached members are checked")
+
+        for role_id, user_ids in roles.items():
+            role = guild.get_role(role_id)
+            if role is None:
+                logger.error(f"Reaction role {role_id} not found in {guild.name}")
+                continue
+            holders = {member.id for member in role.members}
+
+            # Members not in the cache show up as missing holders, the queue fetches them and skips no-ops
+            for user_id in user_ids - holders:
+                role_queue.submit(guild_id, user_id, {role_id}, add=True)
+                report['added'] += 1
+
+            # Removing on a partial read would strip roles from everyone on the unread pages
+            if remove and complete[guild_id][role_id] and role_id not in unread_roles:
+                for user_id in holders - user_ids:
+                    role_queue.submit(guild_id, user_id, {role_id}, add=False)
+                    report['removed'] += 1
+
+    report['elapsed'] = time.monotonic() - started
+    logger.info(
+        f"Reaction role reconciliation: {report['messages']} message(s), {report['added']} to add, "
+        f"{report['removed']} to remove in {report['elapsed']:.1f}s"
+        + (f", {len(report['incomplete'])} not fully read in time" if report['incomplete'] else "")
+    )
+    return report
@@ -0,0 +1,220 @@
+"""
+Queue for reaction role changes.
+
+RoleQueue keeps the latest wanted state per member rather than applying
+every reaction event: reacting and un-reacting before the change is applied
+cancels out, several roles for the same member are applied together, and
+roles the member already has (or lacks) cost no request at all. Members
+missing from the cache are fetched over the gateway in batches of up to
+100, failed changes are retried with exponential backoff.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import collections
+import discord
+
+logger = logging.getLogger("finder")
+
+role_queue_config = {
+    'concurrency': int(os.getenv('ROLE_QUEUE_CONCURRENCY', '3')),
+    'max_attempts': int(os.getenv('ROLE_QUEUE_MAX_ATTEMPTS', '5')),
+    'max_backoff': float(os.getenv('ROLE_QUEUE_MAX_BACKOFF', '60'))
+}
+
+# query_members accepts at most this many user ids per request
+MEMBER_BATCH_SIZE = 100
+
+# Seconds a change we applied overrides the cached member roles, until the member update event arrives
+RECENT_CHANGE_WINDOW = 10
+
+
+class RoleQueue:
+    """
+    Pending role changes keyed by (guild id, user id)
+
+    Each entry holds {role id: True to add / False to remove}, a later
+    submit for the same member and role overrides the earlier one.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.config = role_queue_config
+        self._pending = collections.OrderedDict()  # (guild_id, user_id) -> entry dict
+        self._wake = asyncio.Event()
+        self._task = None
+        self._applied_at = collections.deque()  # monotonic times of applied changes, last 60s
+        self._recent = {}  # (guild_id, user_id) -> ({role id: added}, applied at)
+        self._stats = {'submitted': 0, 'coalesced': 0, 'applied': 0, 'noop': 0, 'retried': 0, 'failed': 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def submit(self, guild_id, user_id, role_ids, add, member=None):
+        """Queue adding (add=True) or removing the roles for a member"""
+        key = (guild_id, user_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = {'changes': {}, 'member': None, 'attempts': 0, 'not_before': 0}
+            self._pending[key] = entry
+
+        for role_id in role_ids:
+            if role_id in entry['changes']:
+                self._stats['coalesced'] += 1
+            entry['changes'][role_id] = add
+        if member is not None:
+            entry['member'] = member
+
+        self._stats['submitted'] += len(role_ids)
+        self._wake.set()
+
+    def stats(self):
+        now = time.monotonic()
+        while self._applied_at and self._applied_at[0] < now - 60:
+            self._applied_at.popleft()
+        return dict(
+            self._stats,
+            depth=len(self._pending),
+            per_minute=len(self._applied_at),
+            backing_off=sum(1 for entry in self._pending.values() if entry['not_before'] > now)
+        )
+
+    def _take_ready(self):
+        """Pop every entry whose backoff has passed, grouped by guild"""
+        now = time.monotonic()
+        for key in [key for key, (changes, applied_at) in self._recent.items() if applied_at < now - RECENT_CHANGE_WINDOW]:
+            del self._recent[key]
+
+        ready = collections.defaultdict(dict)
+        for key in [key for key, entry in self._pending.items() if entry['not_before'] <= now]:
+            guild_id, user_id = key
+            ready[guild_id][user_id] = self._pending.pop(key)
+        return ready
+
+    def _retry(self, guild_id, user_id, entry, reason):
+        """Put a failed entry back with backoff, unless a newer submit already replaced it"""
+        entry['attempts'] += 1
+        if entry['attempts'] >= self.config['max_attempts']:
+            self._stats['failed'] += 1
+            logger.error(f"Giving up on role change for {user_id} in {guild_id} after {entry['attempts']} attempts: {reason}")
+            return
+
+        self._stats['retried'] += 1
+        key = (guild_id, user_id)
+        newer = self._pending.get(key)
+        if newer is not None:
+            # Newer wishes win, only carry over the roles they don't mention
+            for role_id, add in entry['changes'].items():
+                newer['changes'].setdefault(role_id, add)
+            return
+
+        entry['not_before'] = time.monotonic() + min(2 ** entry['attempts'], self.config['max_backoff'])
+        self._pending[key] = entry
+        logger.warning(f"Retrying role change for {user_id} in {guild_id} (attempt {entry['attempts']}): {reason}")
+
+    async def _run(self):
+        while True:
+            ready = self._take_ready()
+            if not ready:
+                waits = [entry['not_before'] - time.monotonic() for entry in self._pending.values()]
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(min(waits), 0.1) if waits else None)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+
+            started = time.monotonic()
+            applied_before = self._stats['applied']
+            for guild_id, entries in ready.items():
+                try:
+                    await self._apply_guild(guild_id, entries)
+                except Exception as e:
+                    logger.error(f"Error applying role changes in {guild_id}: {e}")
+                    for user_id, entry in entries.items():
+                        self._retry(guild_id, user_id, entry, str(e))
+
+            applied = self._stats['applied'] - applied_before
+            if applied > 10:
+                logger.info(f"Applied {applied} role change(s) in {time.monotonic() - started:.1f}s, {len(self._pending)} still queued")
+
+    async def _resolve_members(self, guild, entries):
+        """{user id: Member}, fetching the ones not in the cache in batches"""
+        members = {}
+        missing = []
+        for user_id, entry in entries.items():
+            member = guild.get_member(user_id) or entry['member']
+            if member is not None:
+                members[user_id] = member
+            else:
+                missing.append(user_id)
+
+        for index in range(0, len(missing), MEMBER_BATCH_SIZE):
+            batch = missing[index:index + MEMBER_BATCH_SIZE]
+            fetched = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+            members.update((member.id, member) for member in fetched)
+        return members
+
+    async def _apply_guild(self, guild_id, entries):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+
+        members = await self._resolve_members(guild, entries)
+        semaphore = asyncio.Semaphore(max(self.config['concurrency'], 1))
+
+        async def apply(user_id, entry):
+            member = members.get(user_id)
+            if member is None:
+                # Left the guild before the change was applied, nothing to do
+                logger.info(f"Member {user_id} not found in {guild.name}, dropping role change")
+                return
+
+            current = {role.id for role in member.roles}
+            recent = self._recent.get((guild_id, user_id))
+            if recent:
+                # The cache may not have seen our last change yet, trust what we sent
+                for role_id, added in recent[0].items():
+                    (current.add if added else current.discard)(role_id)
+            to_add = [guild.get_role(role_id) for role_id, add in entry['changes'].items() if add and role_id not in current]
+            to_remove = [guild.get_role(role_id) for role_id, add in entry['changes'].items() if not add and role_id in current]
+            to_add = [role for role in to_add if role]
+            to_remove = [role for role in to_remove if role]
+            if not to_add and not to_remove:
+                self._stats['noop'] += 1
+                return
+
+            async with semaphore:
+                try:
+                    if to_add:
+                        await member.add_roles(*to_add, reason="Reaction role")
+                    if to_remove:
+                        await member.remove_roles(*to_remove, reason="Reaction role removed")
+                except discord.Forbidden as e:
+                    self._stats['failed'] += 1
+                    logger.error(f"Missing permissions to change roles of {member.display_name}: {e}")
+                    return
+                except (discord.HTTPException, asyncio.TimeoutError) as e:
+                    self._retry(guild_id, user_id, entry, str(e))
+                    return
+
+            self._stats['applied'] += 1
+            self._applied_at.append(time.monotonic())
+            sent = dict(recent[0]) if recent else {}
+            sent.update((role.id, True) for role in to_add)
+            sent.update((role.id, False) for role in to_remove)
+            self._recent[(guild_id, user_id)] = (sent, time.monotonic())
+            if to_add:
+                logger.info(f"Added role(s) {', '.join(role.name for role in to_add)} to {member.display_name}")
+            if to_remove:
+                logger.info(f"Removed role(s) {', '.join(role.name for role in to_remove)} from {member.display_name}")
+
+        await asyncio.gather(*(apply(user_id, entry) for user_id, entry in entries.items()))
@@ -0,0 +1,135 @@
+"""
+Local archive of closed ticket transcripts.
+
+Each transcript is encoded and gzipped once, stored as
+data/transcripts/<sha256>.html.gz (identical transcripts share a file) and
+indexed in the transcripts table by ticket, user, category and close time,
+so staff can pull up an old transcript without searching the logs channel.
+"""
+
+import os
+import gzip
+import time
+import hashlib
+from dataclasses import dataclass
+
+from modules.utils.db import DATA_DIR
+from modules.tickets.repository import repository
+
+ARCHIVE_DIR = DATA_DIR / "transcripts"
+ARCHIVE_DIR.mkdir(exist_ok=True)
+
+
+@dataclass(slots=True)
+class ArchivedTranscript:
+    ticket_id: str
+    user_id: int
+    category: str
+    channel_name: str
+    closed_at: float
+    closed_by: int
+    sha256: str
+    size: int
+    compressed_size: int
+    data: bytes = None  # The encoded HTML, only set when it was just archived or loaded
+
+    @property
+    def filename(self):
+        return f"transcript-{self.ticket_id}.html"
+
+
+def transcript_path(sha256):
+    return ARCHIVE_DIR / f"{sha256}.html.gz"
+
+
+def archive_transcript(ticket_id, user_id, category, channel_name, closed_by, html):
+    """
+    Compress and store a transcript, runs on the DB thread
+
+    Returns:
+        ArchivedTranscript: with data set to the encoded HTML, to be reused for every delivery
+    """
+    data = html.encode() if isinstance(html, str) else html
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = transcript_path(sha256)
+
+    if path.exists():
+        compressed_size = path.stat().st_size
+    else:
+        compressed = gzip.compress(data, compresslevel=6)
+        compressed_size = len(compressed)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp, path)
+
+    transcript = ArchivedTranscript(
+        ticket_id=ticket_id,
+        user_id=user_id,
+        category=category,
+        channel_name=channel_name,
+        closed_at=time.time(),
+        closed_by=closed_by,
+        sha256=sha256,
+        size=len(data),
+        compressed_size=compressed_size,
+        data=data
+    )
+
+    with repository.connection() as conn:
+        conn.execute('''
+        INSERT INTO transcripts (ticket_id, user_id, category, channel_name, closed_at, closed_by, sha256, size, compressed_size)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (ticket_id, user_id, category, channel_name, transcript.closed_at, closed_by, sha256, len(data), compressed_size))
+    return transcript
+
+
+TRANSCRIPT_COLUMNS = "ticket_id, user_id, category, channel_name, closed_at, closed_by, sha256, size, compressed_size"
+
+def load_transcript(ticket_id):
+    """The latest archived transcript of a ticket with its HTML, or None"""
+    with repository.connection() as conn:
+        row = conn.execute(
+            f"SELECT {TRANSCRIPT_COLUMNS} FROM transcripts WHERE ticket_id = ? ORDER BY closed_at DESC LIMIT 1",
+            (ticket_id,)
+        ).fetchone()
+    if not row:
+        return None
+
+    transcript = ArchivedTranscript(*row)
+    try:
+        transcript.data = read_archive(transcript.sha256)
+    except FileNotFoundError:
+        return None
+    return transcript
+
+
+def has_transcript(ticket_id):
+    with repository.connection() as conn:
+        return conn.execute("SELECT 1 FROM transcripts WHERE ticket_id = ? LIMIT 1", (ticket_id,)).fetchone() is not None
+
+
+def read_archive(sha256):
+    """The encoded HTML stored under a content hash, raises FileNotFoundError if it's gone"""
+    with gzip.open(transcript_path(sha256), 'rb') as f:
+        return f.read()
+
+
+def search_transcripts(user_id=None, category=None, limit=10):
+    """Most recently closed transcripts, optionally for one user and/or category, without their HTML"""
+    query = f"SELECT {TRANSCRIPT_COLUMNS} FROM transcripts"
+    conditions = []
+    params = []
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if category is not None:
+        conditions.append("category = ?")
+        params.append(category)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY closed_at DESC LIMIT ?"
+    params.append(limit)
+
+    with repository.connection() as conn:
+        return [ArchivedTranscript(*row) for row in conn.execute(query, params).fetchall()]
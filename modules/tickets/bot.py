@@ -6,16 +6,27 @@ import asyncio
 import datetime
 import random
 import string
+import time
 import json
 import io
-import chat_exporter
 import sys
 import logging
+import functools
 from pathlib import Path
 from dotenv import load_dotenv
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from modules.utils.db import setup_tickets_database, get_sqlite_connection, get_mysql_connection
+from modules.utils.db import run_in_db_thread, get_player_profile
+from modules.utils.client import run_bot
+from modules.tickets.policy import is_allowed, build_overwrites, apply_overwrites, STAFF_ROLE_ID
+from modules.tickets.repository import repository
+from modules.tickets.capture import start_capture, message_row, record_message, record_edit, record_deletes, delete_messages
+from modules.tickets.transcript import build_transcript
+from modules.tickets.archive import archive_transcript, load_transcript, search_transcripts
+from modules.tickets.delivery import enqueue_deliveries, DeliveryQueue
+from modules.tickets.capacity import allocator, CapacityError
+from modules.tickets.retention import RetentionScheduler
+from modules.tickets.inactivity import InactivityScheduler, format_hours
 
 log_dir = Path(__file__).parent.parent.parent / "logs"
 log_dir.mkdir(exist_ok=True)
@@ -30,22 +41,14 @@ logging.basicConfig(
 logger = logging.getLogger("tickets")
 
 load_dotenv()
-TOKEN = os.getenv('DISCORD_TOKEN')
-
-STAFF_ROLE_ID = int(os.getenv('STAFF_ROLE_ID'))
-STAFF_REPORT_ROLE_ID_1 = int(os.getenv('STAFF_REPORT_ROLE_ID_1'))
-STAFF_REPORT_ROLE_ID_2 = int(os.getenv('STAFF_REPORT_ROLE_ID_2'))
-GANG_REPORT_ROLE_ID = int(os.getenv('GANG_REPORT_ROLE_ID'))
-BAN_APPEAL_ROLE_ID = int(os.getenv('BAN_APPEAL_ROLE_ID'))
-
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
 
 TICKET_CONFIG = {
     'channel_id': int(os.getenv('TICKET_CHANNEL_ID')),
     'logs_channel_id': int(os.getenv('TICKET_LOGS_CHANNEL_ID')),
+    # Seconds from the dropdown until the welcome message goes out without the profile
+    'profile_budget': float(os.getenv('TICKET_PROFILE_BUDGET', '3')),
+    # Further seconds a late profile may take to be added to the welcome message
+    'profile_late_budget': float(os.getenv('TICKET_PROFILE_LATE_BUDGET', '30')),
     'categories': {
         'general': {
             'name': 'General Support Ticket',
@@ -75,6 +78,9 @@ TICKET_CONFIG = {
     }
 }
 
+# {channel id: ticket id} of every ticket channel, messages in these are captured for transcripts
+TICKET_CHANNELS = {}
+
 class TicketTypeSelect(ui.Select):
     def __init__(self):
         options = []
@@ -94,756 +100,598 @@ class TicketTypeSelect(ui.Select):
         )
     
     async def callback(self, interaction: discord.Interaction):
+        # Started before the defer so the profile queries overlap every Discord round trip
+        profile_task = start_profile_lookup(interaction.user.id)
         await interaction.response.defer(ephemeral=True)
-        await create_ticket(interaction, self.values[0])
+        await create_ticket(interaction, self.values[0], profile_task)
 
 class TicketView(ui.View):
     def __init__(self):
         super().__init__(timeout=None)
         self.add_item(TicketTypeSelect())
 
-class TicketActionsView(ui.View):
-    def __init__(self, ticket_id):
-        super().__init__(timeout=None)
-        self.ticket_id = ticket_id
-
-    @ui.button(label="Claim Ticket", style=discord.ButtonStyle.blurple, custom_id="claim_ticket")
-    async def claim_ticket(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer()
-        
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT channel_id, user_id, category FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
-            await interaction.followup.send("Could not find ticket information.", ephemeral=True)
-            return
-        
-        channel_id, ticket_user_id, ticket_category = result
+async def claim_ticket(interaction, ticket_id):
+    await interaction.response.defer()
+    
+    ticket = await run_in_db_thread(repository.get, ticket_id)
+    
+    if not ticket:
+        await interaction.followup.send("Could not find ticket information.", ephemeral=True)
+        return
+    
+    channel_id, ticket_user_id, ticket_category = ticket.channel_id, ticket.user_id, ticket.category
+    
+    if not is_allowed(interaction.user, ticket_category, 'claim'):
+        await interaction.followup.send("You don't have permission to claim this ticket.", ephemeral=True)
+        return
+    
+    channel = interaction.guild.get_channel(channel_id)
+    
+    if channel:
+        embed = discord.Embed(
+            title="Ticket Claimed",
+            description=f"{interaction.user.mention} has claimed this ticket and will be assisting you.",
+            color=discord.Color.green()
+        )
+        await channel.send(embed=embed)
         
-        # Check permissions based on ticket category
-        has_permission = False
+        try:
+            current_name = channel.name
+            if not "claimed" in current_name:
+                await channel.edit(name=f"{current_name}-claimed")
+        except:
+            pass
         
-        if ticket_category == 'staff':
-            # For staff report tickets, only specific roles can claim
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
+        await interaction.followup.send("You have successfully claimed this ticket.", ephemeral=True)
+
+async def add_user(interaction, ticket_id):
+    # Check if user has permission based on ticket category
+    ticket = await run_in_db_thread(repository.get, ticket_id)
+    
+    if not ticket:
+        await interaction.response.send_message("Could not find ticket information.", ephemeral=True)
+        return
+    
+    channel_id, ticket_category = ticket.channel_id, ticket.category
+    
+    if not is_allowed(interaction.user, ticket_category, 'add_user'):
+        await interaction.response.send_message("You don't have permission to add users to this ticket.", ephemeral=True)
+        return
+    
+    # Create a modal for user input
+    class AddUserModal(ui.Modal, title="Add User to Ticket"):
+        # Get either a user ID or user mention
+        user_input = ui.TextInput(
+            label="User ID or @mention",
+            placeholder="Enter user ID or @mention (e.g., 123456789012345678 or @username)",
+            min_length=2,
+            max_length=100
+        )
         
-        elif ticket_category == 'gang':
-            # For gang reports, only gang staff, senior admin, or management can claim
-            gang_staff_role = discord.utils.get(interaction.guild.roles, id=GANG_REPORT_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
+        async def on_submit(self, modal_interaction: discord.Interaction):
+            # Get the channel
+            channel = modal_interaction.guild.get_channel(channel_id)
+            if not channel:
+                await modal_interaction.response.send_message("Could not find the ticket channel.", ephemeral=True)
+                return
             
-            if (gang_staff_role and gang_staff_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        elif ticket_category == 'ban_appeal':
-            # For ban appeals, only ban appeal staff, senior admin, or management can claim
-            ban_appeal_role = discord.utils.get(interaction.guild.roles, id=BAN_APPEAL_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
+            # Extract user ID from input (handle both raw ID and mention formats)
+            user_input_str = self.user_input.value.strip()
+            user_id = None
             
-            if (ban_appeal_role and ban_appeal_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        else:
-            # For regular tickets, any staff can claim
-            staff_role = discord.utils.get(interaction.guild.roles, id=STAFF_ROLE_ID)
-            if staff_role and staff_role in interaction.user.roles:
-                has_permission = True
-        
-        if not has_permission:
-            await interaction.followup.send("You don't have permission to claim this ticket.", ephemeral=True)
-            return
-        
-        channel = interaction.guild.get_channel(channel_id)
-        
-        if channel:
-            embed = discord.Embed(
-                title="Ticket Claimed",
-                description=f"{interaction.user.mention} has claimed this ticket and will be assisting you.",
-                color=discord.Color.green()
-            )
-            await channel.send(embed=embed)
+            # Check if it's a mention (<@123456789>)
+            if user_input_str.startswith('<@') and user_input_str.endswith('>'):
+                user_id = user_input_str[2:-1]
+                # Handle nickname mentions <@!123456789>
+                if user_id.startswith('!'):
+                    user_id = user_id[1:]
+            else:
+                # Assume it's a raw ID
+                user_id = user_input_str
             
+            # Try to convert to int to validate
             try:
-                current_name = channel.name
-                if not "claimed" in current_name:
-                    await channel.edit(name=f"{current_name}-claimed")
-            except:
-                pass
+                user_id = int(user_id)
+            except ValueError:
+                await modal_interaction.response.send_message("Invalid user ID format. Please provide a valid user ID or mention.", ephemeral=True)
+                return
             
-            await interaction.followup.send("You have successfully claimed this ticket.", ephemeral=True)
-    
-    @ui.button(label="Add User", style=discord.ButtonStyle.grey, custom_id="add_user")
-    async def add_user(self, interaction: discord.Interaction, button: ui.Button):
-        # Check if user has permission based on ticket category
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT channel_id, category FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
-            await interaction.response.send_message("Could not find ticket information.", ephemeral=True)
-            return
-        
-        channel_id, ticket_category = result
-        
-        # Check permissions based on ticket category
-        has_permission = False
-        
-        if ticket_category == 'staff':
-            # For staff report tickets, only specific roles can add users
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        elif ticket_category == 'gang':
-            # For gang reports, only gang staff, senior admin, or management can add users
-            gang_staff_role = discord.utils.get(interaction.guild.roles, id=GANG_REPORT_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (gang_staff_role and gang_staff_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        elif ticket_category == 'ban_appeal':
-            # For ban appeals, only ban appeal staff, senior admin, or management can add users
-            ban_appeal_role = discord.utils.get(interaction.guild.roles, id=BAN_APPEAL_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (ban_appeal_role and ban_appeal_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        else:
-            # For regular tickets, any staff can add users
-            staff_role = discord.utils.get(interaction.guild.roles, id=STAFF_ROLE_ID)
-            if staff_role and staff_role in interaction.user.roles:
-                has_permission = True
-        
-        if not has_permission:
-            await interaction.response.send_message("You don't have permission to add users to this ticket.", ephemeral=True)
-            return
-        
-        # Create a modal for user input
-        class AddUserModal(ui.Modal, title="Add User to Ticket"):
-            # Get either a user ID or user mention
-            user_input = ui.TextInput(
-                label="User ID or @mention",
-                placeholder="Enter user ID or @mention (e.g., 123456789012345678 or @username)",
-                min_length=2,
-                max_length=100
-            )
-            
-            async def on_submit(self, modal_interaction: discord.Interaction):
-                # Get the channel
-                channel = modal_interaction.guild.get_channel(channel_id)
-                if not channel:
-                    await modal_interaction.response.send_message("Could not find the ticket channel.", ephemeral=True)
+            # Try to get the user
+            try:
+                user = await modal_interaction.client.fetch_user(user_id)
+                if not user:
+                    await modal_interaction.response.send_message("Could not find a user with that ID.", ephemeral=True)
                     return
+                    
+                # Get the member object
+                member = modal_interaction.guild.get_member(user.id)
+                if not member:
+                    try:
+                        member = await modal_interaction.guild.fetch_member(user.id)
+                    except discord.NotFound:
+                        await modal_interaction.response.send_message("That user is not a member of this server.", ephemeral=True)
+                        return
                 
-                # Extract user ID from input (handle both raw ID and mention formats)
-                user_input_str = self.user_input.value.strip()
-                user_id = None
+                # Add user to the ticket channel
+                await apply_overwrites(
+                    channel, {member: {'read_messages': True, 'send_messages': True}},
+                    reason=f"Added to ticket {ticket_id} by {modal_interaction.user}"
+                )
                 
-                # Check if it's a mention (<@123456789>)
-                if user_input_str.startswith('<@') and user_input_str.endswith('>'):
-                    user_id = user_input_str[2:-1]
-                    # Handle nickname mentions <@!123456789>
-                    if user_id.startswith('!'):
-                        user_id = user_id[1:]
-                else:
-                    # Assume it's a raw ID
-                    user_id = user_input_str
+                # Send confirmation messages
+                await modal_interaction.response.send_message(f"Added {user.mention} to the ticket.", ephemeral=True)
                 
-                # Try to convert to int to validate
-                try:
-                    user_id = int(user_id)
-                except ValueError:
-                    await modal_interaction.response.send_message("Invalid user ID format. Please provide a valid user ID or mention.", ephemeral=True)
-                    return
+                embed = discord.Embed(
+                    title="User Added",
+                    description=f"{modal_interaction.user.mention} has added {user.mention} to this ticket.",
+                    color=discord.Color.blue(),
+                    timestamp=datetime.datetime.now()
+                )
+                await channel.send(embed=embed)
                 
-                # Try to get the user
-                try:
-                    user = await bot.fetch_user(user_id)
-                    if not user:
-                        await modal_interaction.response.send_message("Could not find a user with that ID.", ephemeral=True)
-                        return
-                        
-                    # Get the member object
-                    member = modal_interaction.guild.get_member(user.id)
-                    if not member:
-                        try:
-                            member = await modal_interaction.guild.fetch_member(user.id)
-                        except discord.NotFound:
-                            await modal_interaction.response.send_message("That user is not a member of this server.", ephemeral=True)
-                            return
-                    
-                    # Add user to the ticket channel
-                    await channel.set_permissions(member, read_messages=True, send_messages=True)
-                    
-                    # Send confirmation messages
-                    await modal_interaction.response.send_message(f"Added {user.mention} to the ticket.", ephemeral=True)
-                    
-                    embed = discord.Embed(
-                        title="User Added",
-                        description=f"{modal_interaction.user.mention} has added {user.mention} to this ticket.",
-                        color=discord.Color.blue(),
-                        timestamp=datetime.datetime.now()
-                    )
-                    await channel.send(embed=embed)
-                    
-                except Exception as e:
-                    logger.error(f"Error adding user to ticket: {e}")
-                    await modal_interaction.response.send_message(f"Error adding user: {str(e)}", ephemeral=True)
-        
-        # Show the modal
-        await interaction.response.send_modal(AddUserModal())
-    
-    @ui.button(label="Rename Ticket", style=discord.ButtonStyle.green, custom_id="rename_ticket")
-    async def rename_ticket(self, interaction: discord.Interaction, button: ui.Button):
-        staff_role = discord.utils.get(interaction.guild.roles, id=STAFF_ROLE_ID)
-        if not staff_role in interaction.user.roles:
-            await interaction.response.send_message("You don't have permission to rename this ticket.", ephemeral=True)
-            return
+            except Exception as e:
+                logger.error(f"Error adding user to ticket: {e}")
+                await modal_interaction.response.send_message(f"Error adding user: {str(e)}", ephemeral=True)
+    
+    # Show the modal
+    await interaction.response.send_modal(AddUserModal())
+
+async def rename_ticket(interaction, ticket_id):
+    # Renaming is allowed to the same roles in every category
+    if not is_allowed(interaction.user, None, 'rename'):
+        await interaction.response.send_message("You don't have permission to rename this ticket.", ephemeral=True)
+        return
+    
+    class RenameModal(ui.Modal, title="Rename Ticket"):
+        new_name = ui.TextInput(label="New Name", placeholder="Enter new ticket name...", min_length=1, max_length=100)
         
-        class RenameModal(ui.Modal, title="Rename Ticket"):
-            new_name = ui.TextInput(label="New Name", placeholder="Enter new ticket name...", min_length=1, max_length=100)
+        async def on_submit(self, modal_interaction: discord.Interaction):
+            ticket = await run_in_db_thread(repository.get, ticket_id)
             
-            async def on_submit(self, modal_interaction: discord.Interaction):
-                conn = get_sqlite_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT channel_id FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-                result = cursor.fetchone()
-                conn.close()
+            if ticket:
+                channel = modal_interaction.guild.get_channel(ticket.channel_id)
                 
-                if result:
-                    channel_id = result[0]
-                    channel = modal_interaction.guild.get_channel(channel_id)
-                    
-                    if channel:
-                        try:
-                            await channel.edit(name=self.new_name.value)
-                            await modal_interaction.response.send_message(f"Ticket has been renamed to: {self.new_name.value}", ephemeral=True)
-                        except Exception as e:
-                            await modal_interaction.response.send_message(f"Error renaming ticket: {str(e)}", ephemeral=True)
-                    else:
-                        await modal_interaction.response.send_message("Could not find the ticket channel.", ephemeral=True)
+                if channel:
+                    try:
+                        await channel.edit(name=self.new_name.value)
+                        await modal_interaction.response.send_message(f"Ticket has been renamed to: {self.new_name.value}", ephemeral=True)
+                    except Exception as e:
+                        await modal_interaction.response.send_message(f"Error renaming ticket: {str(e)}", ephemeral=True)
                 else:
-                    await modal_interaction.response.send_message("Could not find ticket in database.", ephemeral=True)
-        
-        modal = RenameModal()
-        modal.ticket_id = self.ticket_id
-        
-        await interaction.response.send_modal(modal)
-    
-    @ui.button(label="Close Ticket", style=discord.ButtonStyle.red, custom_id="close_ticket")
-    async def close_ticket(self, interaction: discord.Interaction, button: ui.Button):
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, category FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            await interaction.response.send_message("Could not find ticket information.", ephemeral=True)
-            return
-        
-        ticket_user_id, ticket_category = result
-        
-        is_creator = ticket_user_id == interaction.user.id
+                    await modal_interaction.response.send_message("Could not find the ticket channel.", ephemeral=True)
+            else:
+                await modal_interaction.response.send_message("Could not find ticket in database.", ephemeral=True)
+    
+    await interaction.response.send_modal(RenameModal())
+
+async def queue_transcript_deliveries(bot, guild, archived, embed, user_embed):
+    """Hand the logs channel upload and the creator DM to the background delivery queue"""
+    jobs = [('dm', guild.id, archived.user_id, archived.ticket_id, archived.sha256, archived.filename, user_embed.to_dict())]
+    if TICKET_CONFIG['logs_channel_id']:
+        jobs.insert(0, (
+            'channel', guild.id, TICKET_CONFIG['logs_channel_id'], archived.ticket_id,
+            archived.sha256, archived.filename, embed.to_dict()
+        ))
+    await run_in_db_thread(enqueue_deliveries, jobs)
+
+    cog = bot.get_cog('Tickets')
+    if cog:
+        cog.deliveries.wake()
+
+async def close_ticket(interaction, ticket_id):
+    ticket = await run_in_db_thread(repository.get, ticket_id)
+    
+    if not ticket:
+        await interaction.response.send_message("Could not find ticket information.", ephemeral=True)
+        return
+    
+    is_creator = ticket.user_id == interaction.user.id
+    
+    if not is_allowed(interaction.user, ticket.category, 'close', creator_id=ticket.user_id):
+        await interaction.response.send_message("You don't have permission to close this ticket.", ephemeral=True)
+        return
         
-        has_permission = False
+    await interaction.response.defer()
+    
+    if is_creator:
+        notice = f"🔒 This ticket has been closed by the ticket creator {interaction.user.mention}."
+    else:
+        notice = f"🔒 This ticket has been closed by staff member {interaction.user.mention}."
+    await finish_close(interaction.client, interaction.guild, ticket, interaction.user, notice, is_creator)
+
+async def auto_close_ticket(bot, ticket_id, idle):
+    """Close a ticket nobody wrote in for too long, called by the inactivity scheduler"""
+    ticket = await run_in_db_thread(repository.get, ticket_id)
+    if ticket is None or ticket.status != 'open':
+        return
+    channel = bot.get_channel(ticket.channel_id)
+    if channel is None:
+        return
+
+    notice = f"🔒 This ticket has been closed automatically after {format_hours(idle)} without activity."
+    await finish_close(bot, channel.guild, ticket, channel.guild.me, notice)
+    logger.info(f"Closed ticket {ticket_id} after {format_hours(idle)} without activity")
+
+async def finish_close(bot, guild, ticket, closed_by, notice, is_creator=False):
+    """
+    Close a ticket: store and deliver its transcript and make the channel read only
+
+    Shared by the Close button and the inactivity auto-close.
+
+    Args:
+        closed_by: Member who closed the ticket, the bot's own member for auto-closes
+        notice: Message announcing the close in the channel
+        is_creator: Whether the creator closed it, they may then delete it themselves
+    """
+    ticket_id = ticket.ticket_id
+    closed_at = await run_in_db_thread(repository.mark_closed, ticket_id)
+    
+    cog = bot.get_cog('Tickets')
+    if cog:
+        # Deletes the channel once the category's retention period has passed
+        cog.retention.schedule(ticket_id, ticket.category, closed_at)
+        cog.inactivity.forget(ticket_id)
+    channel = guild.get_channel(ticket.channel_id)
+    
+    if channel:
+        await channel.send(notice)
         
-        if ticket_category == 'staff':
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles) or \
-               is_creator:
-                has_permission = True
-        elif ticket_category == 'gang':
-            gang_staff_role = discord.utils.get(interaction.guild.roles, id=GANG_REPORT_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
+        try:
+            transcript = await build_transcript(channel, ticket_id, bot)
             
-            if (gang_staff_role and gang_staff_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles) or \
-               is_creator:
-                has_permission = True
-        elif ticket_category == 'ban_appeal':
-            ban_appeal_role = discord.utils.get(interaction.guild.roles, id=BAN_APPEAL_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
+            if transcript:
+                # Encoded and compressed once, the same bytes go to every delivery
+                archived = await run_in_db_thread(
+                    archive_transcript, ticket_id, ticket.user_id, ticket.category, channel.name, closed_by.id, transcript
+                )
+                embed = discord.Embed(
+                    title=f"Ticket Transcript: #{ticket_id}",
+                    description=f"Ticket closed by: {closed_by.mention}\nChannel: {channel.name}",
+                    color=discord.Color.blue(),
+                    timestamp=datetime.datetime.now()
+                )
+                user_embed = discord.Embed(
+                    title=f"Ticket Transcript: #{ticket_id}",
+                    description=f"Your ticket in {guild.name} has been closed.\nHere is a transcript for your records.",
+                    color=discord.Color.blue(),
+                    timestamp=datetime.datetime.now()
+                )
+                await queue_transcript_deliveries(bot, guild, archived, embed, user_embed)
+        except Exception as e:
+            logger.error(f"Error generating transcript: {e}")
             
-            if (ban_appeal_role and ban_appeal_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles) or \
-               is_creator:
-                has_permission = True
+        # Everyone in the ticket keeps read access but can't send, in one edit instead of one call per member
+        read_only = {
+            target: {'read_messages': True, 'send_messages': False}
+            for target in channel.overwrites
+            if isinstance(target, discord.Member) and not target.guild_permissions.manage_channels
+        }
+        try:
+            await apply_overwrites(channel, read_only, reason=f"Ticket {ticket_id} closed")
+        except discord.HTTPException as e:
+            logger.error(f"Error locking closed ticket {ticket_id}: {e}")
+                
+        view = DeleteTicketView(ticket_id)
+        if is_creator:
+            await channel.send("This ticket is now closed. You can delete it when ready.", view=view)
         else:
-            staff_role = discord.utils.get(interaction.guild.roles, id=STAFF_ROLE_ID)
-            if (staff_role and staff_role in interaction.user.roles) or is_creator:
-                has_permission = True
-        
-        if not has_permission:
-            await interaction.response.send_message("You don't have permission to close this ticket.", ephemeral=True)
-            return
-            
-        await interaction.response.defer()
-        
-        cursor.execute("UPDATE tickets SET status = 'closed' WHERE ticket_id = ?", (self.ticket_id,))
-        cursor.execute("SELECT channel_id FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-        result = cursor.fetchone()
-        conn.commit()
-        conn.close()
-        
-        if result:
-            channel_id = result[0]
-            channel = interaction.guild.get_channel(channel_id)
-            
-            if channel:
-                if is_creator:
-                    await channel.send(f"🔒 This ticket has been closed by the ticket creator {interaction.user.mention}.")
-                else:
-                    await channel.send(f"🔒 This ticket has been closed by staff member {interaction.user.mention}.")
+            await channel.send("This ticket is now closed. Staff can delete it when ready.", view=view)
+
+async def delete_ticket(interaction, ticket_id):
+    ticket = await run_in_db_thread(repository.get, ticket_id)
+    
+    if not ticket:
+        await interaction.response.send_message("Could not find ticket information.", ephemeral=True)
+        return
+    
+    user_id, status, ticket_category = ticket.user_id, ticket.status, ticket.category
+    
+    # Check if user is the creator
+    is_creator = user_id == interaction.user.id
+    
+    # Check if ticket is closed
+    ticket_closed = status == 'closed'
+    
+    if not is_allowed(interaction.user, ticket_category, 'delete', creator_id=user_id, status=status):
+        await interaction.response.send_message("You don't have permission to delete this ticket.", ephemeral=True)
+        return
+    
+    await interaction.response.defer()
+    
+    channel_id = ticket.channel_id
+    channel = interaction.guild.get_channel(channel_id)
+    
+    if channel:
+        if not ticket_closed:
+            try:
+                transcript = await build_transcript(channel, ticket_id, interaction.client)
                 
-                try:
-                    transcript = await chat_exporter.export(channel, bot=bot)
-                    
-                    if transcript:
-                        transcript_file = discord.File(
-                            io.BytesIO(transcript.encode()),
-                            filename=f"transcript-{self.ticket_id}.html"
-                        )
-                        
-                        try:
-                            logs_channel = interaction.guild.get_channel(TICKET_CONFIG['logs_channel_id'])
-                            if logs_channel:
-                                embed = discord.Embed(
-                                    title=f"Ticket Transcript: #{self.ticket_id}",
-                                    description=f"Ticket closed by: {interaction.user.mention}\nChannel: {channel.name}",
-                                    color=discord.Color.blue(),
-                                    timestamp=datetime.datetime.now()
-                                )
-                                await logs_channel.send(embed=embed, file=transcript_file)
-                        except Exception as e:
-                            logger.error(f"Error sending transcript to logs channel: {e}")
-                             
-                        try:
-                            conn = get_sqlite_connection()
-                            cursor = conn.cursor()
-                            cursor.execute("SELECT user_id FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-                            creator_result = cursor.fetchone()
-                            conn.close()
-                            
-                            if creator_result:
-                                creator_id = creator_result[0]
-                                creator_user = await bot.fetch_user(creator_id)
-                                
-                                if creator_user:
-                                    user_transcript_file = discord.File(
-                                        io.BytesIO(transcript.encode()),
-                                        filename=f"transcript-{self.ticket_id}.html"
-                                    )
-                                    
-                                    user_embed = discord.Embed(
-                                        title=f"Ticket Transcript: #{self.ticket_id}",
-                                        description=f"Your ticket in {interaction.guild.name} has been closed.\nHere is a transcript for your records.",
-                                        color=discord.Color.blue(),
-                                        timestamp=datetime.datetime.now()
-                                    )
-                                    
-                                    await creator_user.send(embed=user_embed, file=user_transcript_file)
-                        except Exception as e:
-                            logger.error(f"Error sending transcript to ticket creator: {e}")
-                except Exception as e:
-                    logger.error(f"Error generating transcript: {e}")
-                    
-                for permission in channel.overwrites:
-                    if isinstance(permission, discord.Member) and not permission.guild_permissions.manage_channels:
-                        await channel.set_permissions(permission, send_messages=False, read_messages=True)
-                        
-                view = DeleteTicketView(self.ticket_id)
-                if is_creator:
-                    await channel.send("This ticket is now closed. You can delete it when ready.", view=view)
-                else:
-                    await channel.send("This ticket is now closed. Staff can delete it when ready.", view=view)
+                if transcript:
+                    # Encoded and compressed once, the same bytes go to every delivery
+                    archived = await run_in_db_thread(
+                        archive_transcript, ticket_id, user_id, ticket_category, channel.name, interaction.user.id, transcript
+                    )
+                    embed = discord.Embed(
+                        title=f"Ticket Transcript: #{ticket_id}",
+                        description=f"Ticket deleted by: {interaction.user.mention}\nChannel: {channel.name}",
+                        color=discord.Color.red(),
+                        timestamp=datetime.datetime.now()
+                    )
+                    user_embed = discord.Embed(
+                        title=f"Ticket Transcript: #{ticket_id}",
+                        description=f"Your ticket in {interaction.guild.name} has been deleted.\nHere is a transcript for your records.",
+                        color=discord.Color.red(),
+                        timestamp=datetime.datetime.now()
+                    )
+                    await queue_transcript_deliveries(interaction.client, interaction.guild, archived, embed, user_embed)
+            except Exception as e:
+                logger.error(f"Error generating transcript before deletion: {e}")
+    
+    await run_in_db_thread(repository.delete, ticket_id)
+    
+    cog = interaction.client.get_cog('Tickets')
+    if cog:
+        cog.retention.unschedule(ticket_id)
+        cog.inactivity.forget(ticket_id)
+    
+    if channel:
+        if is_creator:
+            deletion_reason = f"Ticket {ticket_id} deleted by creator {interaction.user.display_name}"
+        else:
+            deletion_reason = f"Ticket {ticket_id} deleted by staff {interaction.user.display_name}"
+            
+        await channel.delete(reason=deletion_reason)
 
-class DeleteTicketView(ui.View):
-    def __init__(self, ticket_id):
-        super().__init__(timeout=None)
+    TICKET_CHANNELS.pop(channel_id, None)
+    await run_in_db_thread(delete_messages, ticket_id)
+
+TICKET_ACTIONS = {
+    'claim': claim_ticket,
+    'add_user': add_user,
+    'rename': rename_ticket,
+    'close': close_ticket,
+    'delete': delete_ticket
+}
+
+# Buttons on ticket messages carry the ticket id in their custom_id ("ticket:close:AB12CD"),
+# so one registered DynamicItem routes every ticket's buttons without a view per ticket
+TICKET_BUTTONS = {
+    'claim': ("Claim Ticket", discord.ButtonStyle.blurple),
+    'add_user': ("Add User", discord.ButtonStyle.grey),
+    'rename': ("Rename Ticket", discord.ButtonStyle.green),
+    'close': ("Close Ticket", discord.ButtonStyle.red),
+    'delete': ("Delete Ticket", discord.ButtonStyle.danger)
+}
+
+class TicketButton(ui.DynamicItem[ui.Button], template=r'ticket:(?P<action>claim|add_user|rename|close|delete):(?P<ticket_id>[A-Z0-9]+)'):
+    def __init__(self, action, ticket_id):
+        label, style = TICKET_BUTTONS[action]
+        super().__init__(ui.Button(label=label, style=style, custom_id=f"ticket:{action}:{ticket_id}"))
+        self.action = action
         self.ticket_id = ticket_id
 
-    @ui.button(label="Delete Ticket", style=discord.ButtonStyle.danger, custom_id="delete_ticket")
-    async def delete_ticket(self, interaction: discord.Interaction, button: ui.Button):
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, status, category FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-        result = cursor.fetchone()
-        
-        if not result:
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['action'], match['ticket_id'])
+
+    async def callback(self, interaction: discord.Interaction):
+        await TICKET_ACTIONS[self.action](interaction, self.ticket_id)
+
+# custom_ids of the buttons on tickets opened before the ticket id was part of them
+LEGACY_TICKET_BUTTONS = {
+    'claim_ticket': 'claim',
+    'add_user': 'add_user',
+    'rename_ticket': 'rename',
+    'close_ticket': 'close',
+    'delete_ticket': 'delete'
+}
+
+class LegacyTicketButton(ui.DynamicItem[ui.Button], template=r'(?P<action>claim_ticket|add_user|rename_ticket|close_ticket|delete_ticket)'):
+    """Old fixed custom_id buttons, the ticket is looked up by the channel the button is in"""
+
+    def __init__(self, action, ticket_id=None):
+        label, style = TICKET_BUTTONS[LEGACY_TICKET_BUTTONS[action]]
+        super().__init__(ui.Button(label=label, style=style, custom_id=action))
+        self.action = LEGACY_TICKET_BUTTONS[action]
+        self.ticket_id = ticket_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        ticket = await run_in_db_thread(repository.get_by_channel, interaction.channel_id)
+        return cls(match['action'], ticket.ticket_id if ticket else None)
+
+    async def callback(self, interaction: discord.Interaction):
+        if self.ticket_id is None:
             await interaction.response.send_message("Could not find ticket information.", ephemeral=True)
             return
-        
-        user_id, status, ticket_category = result
-        
-        # Check if user is the creator
-        is_creator = user_id == interaction.user.id
-        
-        # Check if ticket is closed
-        ticket_closed = status == 'closed'
-        
-        # Check permissions based on ticket category
-        has_permission = False
-        
-        if ticket_category == 'staff':
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        elif ticket_category == 'gang':
-            gang_staff_role = discord.utils.get(interaction.guild.roles, id=GANG_REPORT_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (gang_staff_role and gang_staff_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        elif ticket_category == 'ban_appeal':
-            ban_appeal_role = discord.utils.get(interaction.guild.roles, id=BAN_APPEAL_ROLE_ID)
-            senior_admin_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-            management_role = discord.utils.get(interaction.guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-            
-            if (ban_appeal_role and ban_appeal_role in interaction.user.roles) or \
-               (senior_admin_role and senior_admin_role in interaction.user.roles) or \
-               (management_role and management_role in interaction.user.roles):
-                has_permission = True
-        
-        else:
-            staff_role = discord.utils.get(interaction.guild.roles, id=STAFF_ROLE_ID)
-            if staff_role and staff_role in interaction.user.roles:
-                has_permission = True
-            elif is_creator and ticket_closed:
-                has_permission = True
-        
-        if not has_permission:
-            await interaction.response.send_message("You don't have permission to delete this ticket.", ephemeral=True)
-            return
-        
-        await interaction.response.defer()
-        
-        cursor.execute("SELECT channel_id, user_id FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-        result = cursor.fetchone()
-        
-        if result:
-            channel_id, user_id = result
-            channel = interaction.guild.get_channel(channel_id)
-            
-            if channel:
-                if not ticket_closed:
-                    try:
-                        transcript = await chat_exporter.export(channel, bot=bot)
-                        
-                        if transcript:
-                            transcript_file = discord.File(
-                                io.BytesIO(transcript.encode()),
-                                filename=f"transcript-{self.ticket_id}.html"
-                            )
-                            
-                            try:
-                                logs_channel = interaction.guild.get_channel(TICKET_CONFIG['logs_channel_id'])
-                                if logs_channel:
-                                    embed = discord.Embed(
-                                        title=f"Ticket Transcript: #{self.ticket_id}",
-                                        description=f"Ticket deleted by: {interaction.user.mention}\nChannel: {channel.name}",
-                                        color=discord.Color.red(),
-                                        timestamp=datetime.datetime.now()
-                                    )
-                                    await logs_channel.send(embed=embed, file=transcript_file)
-                            except Exception as e:
-                                logger.error(f"Error sending transcript to logs channel: {e}")
-                                
-                            try:
-                                ticket_user = await bot.fetch_user(user_id)
-                                
-                                if ticket_user:
-                                    user_transcript_file = discord.File(
-                                        io.BytesIO(transcript.encode()),
-                                        filename=f"transcript-{self.ticket_id}.html"
-                                    )
-                                    
-                                    user_embed = discord.Embed(
-                                        title=f"Ticket Transcript: #{self.ticket_id}",
-                                        description=f"Your ticket in {interaction.guild.name} has been deleted.\nHere is a transcript for your records.",
-                                        color=discord.Color.red(),
-                                        timestamp=datetime.datetime.now()
-                                    )
-                                    
-                                    await ticket_user.send(embed=user_embed, file=user_transcript_file)
-                            except Exception as e:
-                                logger.error(f"Error sending transcript to ticket creator: {e}")
-                    except Exception as e:
-                        logger.error(f"Error generating transcript before deletion: {e}")
-            
-            cursor.execute("DELETE FROM tickets WHERE ticket_id = ?", (self.ticket_id,))
-            conn.commit()
-            
-            if channel:
-                if is_creator:
-                    deletion_reason = f"Ticket {self.ticket_id} deleted by creator {interaction.user.display_name}"
-                else:
-                    deletion_reason = f"Ticket {self.ticket_id} deleted by staff {interaction.user.display_name}"
-                    
-                await channel.delete(reason=deletion_reason)
-        
-        conn.close()
+        await TICKET_ACTIONS[self.action](interaction, self.ticket_id)
+
+class TicketActionsView(ui.View):
+    def __init__(self, ticket_id):
+        super().__init__(timeout=None)
+        for action in ('claim', 'add_user', 'rename', 'close'):
+            self.add_item(TicketButton(action, ticket_id))
+
+class DeleteTicketView(ui.View):
+    def __init__(self, ticket_id):
+        super().__init__(timeout=None)
+        self.add_item(TicketButton('delete', ticket_id))
 
 def generate_ticket_id():
     chars = string.ascii_uppercase + string.digits
     return ''.join(random.choice(chars) for _ in range(6))
 
-async def create_ticket(interaction, ticket_type):
+def build_welcome_embed(category_data, ticket_id, user, profile=None):
+    """First message of a ticket, with the creator's account and characters when their profile was found"""
+    embed = discord.Embed(
+        title=f"{category_data['name']} - Ticket #{ticket_id}",
+        description=f"Thank you for creating a ticket, {user.mention}.\nA staff member will assist you shortly.",
+        color=discord.Color.blue(),
+        timestamp=datetime.datetime.now()
+    )
+    
+    if not profile:
+        embed.add_field(name="Type", value=category_data['name'], inline=True)
+        embed.add_field(name="Created By", value=user.mention, inline=True)
+        embed.set_footer(text=f"Ticket ID: {ticket_id}")
+        return embed
+    
+    embed.set_footer(text=f"Ticket ID: {ticket_id} - Today at {datetime.datetime.now().strftime('%H:%M')}")
+    
+    user_info = f"Username: {profile.username}\n"
+    user_info += f"Account ID: {profile.user_id}\n"
+    user_info += f"{profile.license2}\n"
+    user_info += f"Discord: {profile.discord}\n"
+    user_info += f"FiveM: {profile.fivem}"
+    
+    embed.add_field(name="User Info", value=f"```{user_info}```", inline=False)
+    
+    if profile.characters:
+        characters_overview = ""
+        for char in profile.characters:
+            try:
+                charinfo = json.loads(char.charinfo or '{}')
+                first_name = charinfo.get('firstname', 'Unknown')
+                last_name = charinfo.get('lastname', 'Unknown')
+                characters_overview += f"ID: {char.citizenid} | {first_name} {last_name}\n"
+            except json.JSONDecodeError:
+                characters_overview += f"ID: {char.citizenid} | Name: {char.name or 'Unknown'}\n"
+        
+        embed.add_field(
+            name="All Characters", 
+            value=f"```{characters_overview}```", 
+            inline=False
+        )
+    else:
+        embed.add_field(name="Characters", value="```No characters found for this user.```", inline=False)
+    
+    embed.add_field(
+        name="Detailed Info",
+        value="Use `/character @user` or `/character [citizenid]` to view detailed character information.",
+        inline=False
+    )
+    return embed
+
+def start_profile_lookup(user_id):
+    """Start fetching the creator's profile so the MySQL queries run while Discord creates the channel"""
+    task = asyncio.create_task(get_player_profile(str(user_id), include=('characters',)))
+    # Retrieve the exception of lookups nobody ends up waiting for (duplicate ticket, over budget)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+async def wait_for_profile(task, deadline):
+    """The profile if the lookup finishes before the deadline (time.monotonic()), otherwise None"""
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching profile for ticket embed: {e}")
+        return None
+
+async def fill_in_profile(message, task, category_data, ticket_id, user):
+    """Swap in the full welcome embed once a profile that missed the time budget arrives"""
+    profile = await wait_for_profile(task, time.monotonic() + TICKET_CONFIG['profile_late_budget'])
+    if profile:
+        try:
+            await message.edit(embed=build_welcome_embed(category_data, ticket_id, user, profile))
+        except discord.HTTPException as e:
+            logger.error(f"Error adding profile to ticket {ticket_id}: {e}")
+    elif not task.done():
+        task.cancel()
+
+async def create_ticket(interaction, ticket_type, profile_task=None):
     guild = interaction.guild
     user = interaction.user
+    started = time.monotonic()
     
     category_data = TICKET_CONFIG['categories'].get(ticket_type)
     if not category_data:
         await interaction.followup.send("Invalid ticket type selected.", ephemeral=True)
         return
     
+    # The profile doesn't depend on the channel, fetch it alongside the Discord calls
+    if profile_task is None:
+        profile_task = start_profile_lookup(user.id)
+    
     ticket_id = generate_ticket_id()
     
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT channel_id FROM tickets 
-    WHERE user_id = ? AND category = ? AND status = 'open'
-    """, (user.id, ticket_type))
-    existing_ticket = cursor.fetchone()
-    conn.close()
+    existing_ticket = await run_in_db_thread(repository.find_open, user.id, ticket_type)
     
     if existing_ticket:
-        channel = guild.get_channel(existing_ticket[0])
+        channel = guild.get_channel(existing_ticket.channel_id)
         if channel:
+            profile_task.cancel()
             await interaction.followup.send(
                 f"You already have an open ticket in this category. Please use {channel.mention}",
                 ephemeral=True
             )
             return
     
-    category = guild.get_channel(category_data['category_id'])
-    if not category:
+    primary_category = guild.get_channel(category_data['category_id'])
+    if not primary_category:
+        profile_task.cancel()
         await interaction.followup.send(
             "Could not find the ticket category. Please contact an administrator.",
             ephemeral=True
         )
         return
     
+    # Categories hold at most 50 channels, spill over into the next one with room
+    try:
+        reservation = await allocator.reserve(guild, primary_category, ticket_type)
+    except (CapacityError, discord.HTTPException) as e:
+        profile_task.cancel()
+        logger.error(f"No room for a {ticket_type} ticket: {e}")
+        await interaction.followup.send(
+            "All ticket categories are full right now. Please contact an administrator.",
+            ephemeral=True
+        )
+        return
+    
     channel_name = f"{ticket_type}-{user.name}-{ticket_id}".lower()
     channel_name = ''.join(e for e in channel_name if e.isalnum() or e == '-')[:100]
     
-    # Default overwrites for most ticket types ( this overwrites category permissions ) 
-    overwrites = {
-        guild.default_role: discord.PermissionOverwrite(read_messages=False),
-        user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-        guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True)
-    }
-    
-    # Apply permissions based on ticket type lol i lowkey forgot to add this shit 
-    if ticket_type == 'staff':
-        # For staff report tickets, only specific admin roles can see them
-        senior_admin_role = discord.utils.get(guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-        management_role = discord.utils.get(guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-        
-        if senior_admin_role:
-            overwrites[senior_admin_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        if management_role:
-            overwrites[management_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    
-    elif ticket_type == 'gang':
-        # For gang reports, only gang staff can see them
-        gang_staff_role = discord.utils.get(guild.roles, id=GANG_REPORT_ROLE_ID)
-        
-        if gang_staff_role:
-            overwrites[gang_staff_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        # Also add the management roles to ensure they can see all tickets 
-        senior_admin_role = discord.utils.get(guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-        management_role = discord.utils.get(guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-        
-        if senior_admin_role:
-            overwrites[senior_admin_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        if management_role:
-            overwrites[management_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    
-    elif ticket_type == 'ban_appeal':
-        # For ban appeals, only specific role can see them
-        ban_appeal_role = discord.utils.get(guild.roles, id=BAN_APPEAL_ROLE_ID)
-        
-        if ban_appeal_role:
-            overwrites[ban_appeal_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        # change these in the env file or you can hard code them here if you want to, not needed however
-        senior_admin_role = discord.utils.get(guild.roles, id=STAFF_REPORT_ROLE_ID_1)
-        management_role = discord.utils.get(guild.roles, id=STAFF_REPORT_ROLE_ID_2)
-        
-        if senior_admin_role:
-            overwrites[senior_admin_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        if management_role:
-            overwrites[management_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    
-    else:
-        # For general tickets and tebex support, regular staff can see them
-        staff_role = discord.utils.get(guild.roles, id=STAFF_ROLE_ID)
-        if staff_role:
-            overwrites[staff_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+    # Hidden from everyone except the creator and the roles that handle this category ( this overwrites category permissions )
+    overwrites = build_overwrites(guild, ticket_type, user)
     
     try:
-        channel = await category.create_text_channel(name=channel_name, overwrites=overwrites)
+        try:
+            channel = await reservation.category.create_text_channel(name=channel_name, overwrites=overwrites)
+        except Exception:
+            allocator.release(reservation)
+            raise
+        allocator.created(reservation, channel)
+        
+        await run_in_db_thread(repository.create, ticket_id, user.id, channel.id, ticket_type)
+
+        # Record the channel from its first message on, so the transcript never needs the history
+        await run_in_db_thread(start_capture, ticket_id)
+        TICKET_CHANNELS[channel.id] = ticket_id
+        cog = interaction.client.get_cog('Tickets')
+        if cog:
+            cog.inactivity.track(ticket_id, channel.id, ticket_type, time.time())
         
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-        INSERT INTO tickets (ticket_id, user_id, channel_id, category, created_at, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (ticket_id, user.id, channel.id, ticket_type, datetime.datetime.now(), 'open'))
-        conn.commit()
-        conn.close()
+        # Usually done by now, a slow database only delays the profile part of the embed
+        profile = await wait_for_profile(profile_task, started + TICKET_CONFIG['profile_budget'])
         
         try:
-            conn = get_mysql_connection()
-            cursor = conn.cursor(dictionary=True)
-
-            discord_id = str(user.id)
-            formatted_discord_id = f"discord:{discord_id}"
-            
-            user_query = "SELECT userId, username, license, license2, fivem, discord FROM users WHERE discord = %s"
-            cursor.execute(user_query, (formatted_discord_id,))
-            user_result = cursor.fetchone()
-
-            if user_result:
-                user_id = user_result['userId']
-                license = user_result['license']
-                license2 = user_result.get('license2', '')
-                
-                char_query = """
-                SELECT id, citizenid, cid, name, charinfo
-                FROM players 
-                WHERE license = %s OR license = %s OR userId = %s
-                """
-                cursor.execute(char_query, (license, license2, user_id))
-                character_results = cursor.fetchall()
-                
-                embed = discord.Embed(
-                    title=f"{category_data['name']} - Ticket #{ticket_id}",
-                    description=f"Thank you for creating a ticket, {user.mention}.\nA staff member will assist you shortly.",
-                    color=discord.Color.blue(),
-                    timestamp=datetime.datetime.now()
-                )
-                
-                embed.set_footer(text=f"Ticket ID: {ticket_id} - Today at {datetime.datetime.now().strftime('%H:%M')}")
-                
-                user_info = f"Username: {user_result.get('username', 'N/A')}\n"
-                user_info += f"Account ID: {user_result.get('userId', 'N/A')}\n"
-                user_info += f"{user_result.get('license2', 'N/A')}\n"
-                user_info += f"Discord: {user_result.get('discord', 'N/A')}\n"
-                user_info += f"FiveM: {user_result.get('fivem', 'N/A')}"
-                
-                embed.add_field(name="User Info", value=f"```{user_info}```", inline=False)
-                
-                if character_results:
-                    characters_overview = ""
-                    for char in character_results:
-                        try:
-                            charinfo = json.loads(char.get('charinfo', '{}'))
-                            first_name = charinfo.get('firstname', 'Unknown')
-                            last_name = charinfo.get('lastname', 'Unknown')
-                            characters_overview += f"ID: {char.get('citizenid')} | {first_name} {last_name}\n"
-                        except json.JSONDecodeError:
-                            characters_overview += f"ID: {char.get('citizenid')} | Name: {char.get('name', 'Unknown')}\n"
-                    
-                    embed.add_field(
-                        name="All Characters", 
-                        value=f"```{characters_overview}```", 
-                        inline=False
-                    )
-                else:
-                    embed.add_field(name="Characters", value="```No characters found for this user.```", inline=False)
-                
-                embed.add_field(
-                    name="Detailed Info",
-                    value="Use `/character @user` or `/character [citizenid]` to view detailed character information.",
-                    inline=False
-                )
-                
-                view = TicketActionsView(ticket_id)
-                await channel.send(embed=embed, view=view)
-                
-            else:
-                embed = discord.Embed(
-                    title=f"{category_data['name']} - Ticket #{ticket_id}",
-                    description=f"Thank you for creating a ticket, {user.mention}.\nA staff member will assist you shortly.",
-                    color=discord.Color.blue(),
-                    timestamp=datetime.datetime.now()
-                )
-                embed.add_field(name="Type", value=category_data['name'], inline=True)
-                embed.add_field(name="Created By", value=user.mention, inline=True)
-                embed.set_footer(text=f"Ticket ID: {ticket_id}")
-                
-                view = TicketActionsView(ticket_id)
-                await channel.send(embed=embed, view=view)
-                
-            cursor.close()
-            conn.close()
-            
+            embed = build_welcome_embed(category_data, ticket_id, user, profile)
         except Exception as e:
             logger.error(f"Error creating combined embed in ticket {ticket_id}: {e}")
             import traceback
             error_details = traceback.format_exc()
             logger.error(f"Full error details for ticket {ticket_id}:\n{error_details}")
-            
-            embed = discord.Embed(
-                title=f"{category_data['name']} - Ticket #{ticket_id}",
-                description=f"Thank you for creating a ticket, {user.mention}.\nA staff member will assist you shortly.",
-                color=discord.Color.blue(),
-                timestamp=datetime.datetime.now()
-            )
-            embed.add_field(name="Type", value=category_data['name'], inline=True)
-            embed.add_field(name="Created By", value=user.mention, inline=True)
-            embed.set_footer(text=f"Ticket ID: {ticket_id}")
-            
-            view = TicketActionsView(ticket_id)
-            await channel.send(embed=embed, view=view)
+            embed = build_welcome_embed(category_data, ticket_id, user)
+        
+        view = TicketActionsView(ticket_id)
+        welcome, _ = await asyncio.gather(
+            channel.send(embed=embed, view=view),
+            interaction.followup.send(f"Your ticket has been created: {channel.mention}", ephemeral=True)
+        )
+        
+        if profile is None and not profile_task.done():
+            asyncio.create_task(fill_in_profile(welcome, profile_task, category_data, ticket_id, user))
         
         # Add special notice based on ticket type
         if ticket_type == 'staff':
@@ -854,104 +702,213 @@ async def create_ticket(interaction, ticket_type):
             )
             await channel.send(embed=special_notice)
         
-        await interaction.followup.send(
-            f"Your ticket has been created: {channel.mention}",
-            ephemeral=True
-        )
+        logger.info(f"Opened ticket {ticket_id} in {time.monotonic() - started:.2f}s")
         
     except Exception as e:
+        profile_task.cancel()
         logger.error(f"Error creating ticket: {e}")
         await interaction.followup.send(
             f"An error occurred while creating your ticket: {str(e)}",
             ephemeral=True
         )
 
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def setuptickets(ctx):
-    channel_id = TICKET_CONFIG['channel_id']
-    channel = bot.get_channel(channel_id)
-    
-    if not channel:
+class Tickets(commands.Cog):
+    """Ticket dropdown, ticket channels and their action buttons"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.deliveries = DeliveryQueue(bot)
+        self.retention = RetentionScheduler(bot, TICKET_CHANNELS)
+        self.inactivity = InactivityScheduler(bot, functools.partial(auto_close_ticket, bot))
+
+    async def cog_load(self):
+        await run_in_db_thread(repository.migrate)
+        TICKET_CHANNELS.update(await run_in_db_thread(repository.channels))
+
+        # Persistent views only need registering once, not on every reconnect
+        self.bot.add_view(TicketView())
+        logger.info("Registered ticket view for dropdown menu")
+
+        # Routes the buttons of every ticket, however many are open
+        self.bot.add_dynamic_items(TicketButton, LegacyTicketButton)
+
+        # Picks up deliveries left over from before a restart
+        self.deliveries.start()
+        self.retention.start()
+        self.inactivity.start()
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(TicketButton, LegacyTicketButton)
+        self.deliveries.stop()
+        self.retention.stop()
+        self.inactivity.stop()
+        await run_in_db_thread(repository.close)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        ticket_id = TICKET_CHANNELS.get(message.channel.id)
+        if ticket_id is None:
+            return
+        # Bot messages, the inactivity warning included, don't keep a ticket open
+        if not message.author.bot:
+            self.inactivity.touch(ticket_id)
+        try:
+            await run_in_db_thread(record_message, message_row(ticket_id, message))
+        except Exception as e:
+            logger.error(f"Error capturing message {message.id} in ticket {ticket_id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        allocator.channel_created(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        allocator.channel_deleted(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        allocator.channel_moved(before, after)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        if payload.channel_id not in TICKET_CHANNELS:
+            return
+        try:
+            await run_in_db_thread(record_edit, payload.message_id, payload.data)
+        except Exception as e:
+            logger.error(f"Error capturing edit of message {payload.message_id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if payload.channel_id in TICKET_CHANNELS:
+            await run_in_db_thread(record_deletes, [payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        if payload.channel_id in TICKET_CHANNELS:
+            await run_in_db_thread(record_deletes, list(payload.message_ids))
+
+    @app_commands.command(name="transcript", description="Fetch the transcript of a closed ticket, or list a user's past tickets")
+    @app_commands.describe(ticket_id="Ticket ID, e.g. AB12CD", user="List this user's most recent transcripts instead")
+    async def transcript(self, interaction: discord.Interaction, ticket_id: str = None, user: discord.User = None):
+        if not ticket_id and not user:
+            await interaction.response.send_message("Give a ticket ID or a user.", ephemeral=True)
+            return
+
+        if ticket_id:
+            archived = await run_in_db_thread(load_transcript, ticket_id.strip().upper())
+            # Only the roles that handle the ticket's category may read it
+            if not archived or not is_allowed(interaction.user, archived.category, 'transcript'):
+                await interaction.response.send_message(f"No archived transcript found for ticket {ticket_id}.", ephemeral=True)
+                return
+
+            embed = discord.Embed(
+                title=f"Ticket Transcript: #{archived.ticket_id}",
+                description=f"Opened by: <@{archived.user_id}>\nClosed by: <@{archived.closed_by}>\nChannel: {archived.channel_name}",
+                color=discord.Color.blue(),
+                timestamp=datetime.datetime.fromtimestamp(archived.closed_at, tz=datetime.timezone.utc)
+            )
+            file = discord.File(io.BytesIO(archived.data), filename=archived.filename)
+            await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
+            return
+
+        rows = await run_in_db_thread(search_transcripts, user.id, None, 25)
+        rows = [row for row in rows if is_allowed(interaction.user, row.category, 'transcript')]
+        if not rows:
+            await interaction.response.send_message(f"No archived transcripts found for {user.mention}.", ephemeral=True)
+            return
+
+        lines = []
+        for row in rows:
+            category_name = TICKET_CONFIG['categories'].get(row.category, {}).get('name', row.category)
+            lines.append(f"`{row.ticket_id}` {category_name} - closed <t:{int(row.closed_at)}:R>")
+        embed = discord.Embed(title=f"Transcripts for {user}", description="\n".join(lines), color=discord.Color.blue())
+        embed.set_footer(text="Use /transcript ticket_id:<id> to fetch one")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="deliveries", description="Transcript uploads and DMs waiting to be sent")
+    async def deliveries_status(self, interaction: discord.Interaction):
+        if discord.utils.get(interaction.user.roles, id=STAFF_ROLE_ID) is None:
+            await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+            return
+
+        stats = await self.deliveries.stats()
+        embed = discord.Embed(title="Transcript Deliveries", color=discord.Color.blue())
+        embed.add_field(name="Pending", value=str(stats['pending']))
+        embed.add_field(name="Failed", value=str(stats['dead']))
+        embed.add_field(name="Since Startup", value=f"{stats['delivered']} sent, {stats['retried']} retried")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def setuptickets(self, ctx):
+        channel_id = TICKET_CONFIG['channel_id']
+        channel = self.bot.get_channel(channel_id)
+        
+        if not channel:
+            if ctx:
+                await ctx.send(f"Could not find channel with ID {channel_id}")
+            else:
+                logger.error(f"Could not find channel with ID {channel_id}")
+            return
+        
+        embed = discord.Embed(
+            title="Support Ticket System",
+            description="Please select a category below to open a support ticket.",
+            color=discord.Color.blue()
+        )
+        
+        view = TicketView()
+        await channel.send(embed=embed, view=view)
+        
         if ctx:
-            await ctx.send(f"Could not find channel with ID {channel_id}")
+            await ctx.send("Ticket system has been set up!")
         else:
-            logger.error(f"Could not find channel with ID {channel_id}")
-        return
-    
-    embed = discord.Embed(
-        title="Support Ticket System",
-        description="Please select a category below to open a support ticket.",
-        color=discord.Color.blue()
-    )
-    
-    view = TicketView()
-    await channel.send(embed=embed, view=view)
-    
-    if ctx:
-        await ctx.send("Ticket system has been set up!")
-    else:
-        logger.info("Ticket system has been set up!")
+            logger.info("Ticket system has been set up!")
 
-@bot.event
-async def on_ready():
-    logger.info(f'Ticket Bot is online as {bot.user}')
-    setup_tickets_database()
-    
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f'Synced {len(synced)} command(s)')
-    except Exception as e:
-        logger.error(f'Error syncing commands: {e}')
-    
-    bot.add_view(TicketView())
-    logger.info("Registered ticket view for dropdown menu")
-    
-    try:
-        channel_id = TICKET_CONFIG['channel_id']
-        channel = bot.get_channel(channel_id)
-        if channel:
-            logger.info(f"Found ticket channel: {channel.name}")
-            ticket_message_found = False
-            async for message in channel.history(limit=10):
-                if message.author.id == bot.user.id and message.embeds:
-                    embed = message.embeds[0]
-                    if embed.title and "Support Ticket System" in embed.title:
-                        await message.edit(view=TicketView())
-                        logger.info(f"Registered ticket view with existing message ID: {message.id}")
-                        ticket_message_found = True
-                        break
-            
-            # If no ticket message was found, create one automatically
-            if not ticket_message_found:
-                logger.info("No existing ticket message found. Creating new ticket setup...")
-                embed = discord.Embed(
-                    title="Support Ticket System",
-                    description="Please select a category below to open a support ticket.",
-                    color=discord.Color.blue()
-                )
+    @commands.Cog.listener()
+    async def on_ready(self):
+        logger.info(f'Ticket system is online as {self.bot.user}')
+        
+        try:
+            channel_id = TICKET_CONFIG['channel_id']
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                logger.info(f"Found ticket channel: {channel.name}")
+                ticket_message_found = False
+                async for message in channel.history(limit=10):
+                    if message.author.id == self.bot.user.id and message.embeds:
+                        embed = message.embeds[0]
+                        if embed.title and "Support Ticket System" in embed.title:
+                            await message.edit(view=TicketView())
+                            logger.info(f"Registered ticket view with existing message ID: {message.id}")
+                            ticket_message_found = True
+                            break
                 
-                view = TicketView()
-                await channel.send(embed=embed, view=view)
-                logger.info("Ticket system setup created automatically")
-    except Exception as e:
-        logger.error(f"Error setting up ticket system: {e}")
-    
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT ticket_id FROM tickets WHERE status = 'open'")
-    open_tickets = cursor.fetchall()
-    
-    for ticket_id in open_tickets:
-        bot.add_view(TicketActionsView(ticket_id[0]))
-    
-    conn.close()
-    
-    logger.info("Ticket system fully initialized and ready")
+                # If no ticket message was found, create one automatically
+                if not ticket_message_found:
+                    logger.info("No existing ticket message found. Creating new ticket setup...")
+                    embed = discord.Embed(
+                        title="Support Ticket System",
+                        description="Please select a category below to open a support ticket.",
+                        color=discord.Color.blue()
+                    )
+                    
+                    view = TicketView()
+                    await channel.send(embed=embed, view=view)
+                    logger.info("Ticket system setup created automatically")
+        except Exception as e:
+            logger.error(f"Error setting up ticket system: {e}")
+        
+        logger.info("Ticket system fully initialized and ready")
+
+async def setup(bot):
+    await bot.add_cog(Tickets(bot))
 
 def run():
+    """Run the ticket system on its own, without the Finder"""
     logger.info("Starting Ticket Bot...")
-    bot.run(TOKEN)
+    run_bot(['modules.tickets.bot'])
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,219 @@
+"""
+Which category a new ticket channel goes in.
+
+Discord allows 50 channels per category and 500 per server.
+CategoryAllocator keeps the channel count of every category in memory,
+kept current from the channel create/delete/update events, and hands out
+the first category of a ticket type with room:
+
+1. the configured category
+2. the overflow categories from <TYPE>_OVERFLOW_CATEGORY_IDS, in order
+3. overflow categories it created itself, named "<category name> 2", "<category name> 3", ...
+
+New overflow categories copy the permissions of the configured one. A
+warning is logged once the server gets within TICKET_GUILD_CHANNEL_WARN
+channels of the limit.
+"""
+
+import os
+import re
+import asyncio
+import logging
+import collections
+from dataclasses import dataclass
+
+logger = logging.getLogger("tickets")
+
+CATEGORY_CHANNEL_LIMIT = 50
+GUILD_CHANNEL_LIMIT = 500
+
+capacity_config = {
+    'auto_overflow': os.getenv('TICKET_AUTO_OVERFLOW', 'true').lower() == 'true',
+    # Warn when the server has this many channels or more
+    'guild_warn_at': int(os.getenv('TICKET_GUILD_CHANNEL_WARN', '450'))
+}
+
+
+class CapacityError(Exception):
+    """No category of a ticket type has room and no new one can be made"""
+
+
+@dataclass(slots=True)
+class Reservation:
+    """A slot held in a category for one ticket channel, completed by created() or release()"""
+    category: object
+    done: bool = False
+
+
+def overflow_category_ids(ticket_type):
+    """Overflow categories configured for a ticket type, e.g. GENERAL_OVERFLOW_CATEGORY_IDS=123,456"""
+    value = os.getenv(f'{ticket_type.upper()}_OVERFLOW_CATEGORY_IDS', '')
+    return [int(category_id) for category_id in value.replace(' ', '').split(',') if category_id]
+
+
+class CategoryAllocator:
+    """
+    Channel counts per category for the guilds this process serves
+
+    A guild is counted from its cache the first time a ticket is opened in
+    it, then kept current from events. Categories handed out but whose
+    channel isn't created yet are held as reservations, so tickets opened
+    at the same time don't all squeeze into the last free slot.
+    """
+
+    def __init__(self, config=capacity_config):
+        self.config = config
+        self._counts = {}  # category id -> channels in it
+        self._totals = {}  # guild id -> channels in the guild, categories included
+        self._reserved = collections.Counter()  # category id -> channels being created
+        self._locks = collections.defaultdict(asyncio.Lock)  # guild id -> lock around picking and creating categories
+        self._warned = set()
+        # Channel ids the create event counted while the category had reservations, created() skips them.
+        # Dropped once the category has none left, the channels of later reservations can't be among them
+        self._seen = collections.defaultdict(set)  # category id -> channel ids
+        self._expected = set()  # ids of ticket channels created() counted, their create event is skipped
+
+    def track(self, guild):
+        """(Re)count a guild's channels from the cache"""
+        self._totals[guild.id] = len(guild.channels)
+        for category in guild.categories:
+            self._counts[category.id] = len(category.channels)
+
+    def used(self, category_id):
+        return self._counts.get(category_id, 0) + self._reserved[category_id]
+
+    def channel_created(self, channel):
+        if channel.id in self._expected:
+            self._expected.discard(channel.id)
+            return
+        if channel.guild.id not in self._totals:
+            return
+        self._totals[channel.guild.id] += 1
+        if channel.category_id:
+            self._counts[channel.category_id] = self._counts.get(channel.category_id, 0) + 1
+            if channel.category_id in self._reserved:
+                # Possibly the channel of a reservation, created() must not count it again
+                self._seen[channel.category_id].add(channel.id)
+        self._check_guild_limit(channel.guild)
+
+    def channel_deleted(self, channel):
+        if channel.guild.id not in self._totals:
+            return
+        self._totals[channel.guild.id] -= 1
+        if channel.category_id in self._counts:
+            self._counts[channel.category_id] -= 1
+        self._counts.pop(channel.id, None)
+        self._expected.discard(channel.id)
+        if channel.category_id in self._seen:
+            self._seen[channel.category_id].discard(channel.id)
+
+    def channel_moved(self, before, after):
+        if after.guild.id not in self._totals or before.category_id == after.category_id:
+            return
+        if before.category_id in self._counts:
+            self._counts[before.category_id] -= 1
+        if after.category_id:
+            self._counts[after.category_id] = self._counts.get(after.category_id, 0) + 1
+
+    def _check_guild_limit(self, guild):
+        total = self._totals[guild.id]
+        if total >= self.config['guild_warn_at']:
+            if guild.id not in self._warned:
+                self._warned.add(guild.id)
+                logger.warning(f"{guild.name} has {total} of {GUILD_CHANNEL_LIMIT} channels, close or delete old tickets")
+        else:
+            self._warned.discard(guild.id)
+
+    def categories_for(self, guild, primary, ticket_type):
+        """Every category tickets of this type may go in, in the order they are filled"""
+        categories = [primary]
+        for category_id in overflow_category_ids(ticket_type):
+            category = guild.get_channel(category_id)
+            if category is not None and category not in categories:
+                categories.append(category)
+
+        categories.extend(category for number, category in self.numbered_overflow(guild, primary) if category not in categories)
+        return categories
+
+    def numbered_overflow(self, guild, primary):
+        """[(number, category)] of the "<name> 2", "<name> 3", ... overflow categories, in order"""
+        pattern = re.compile(rf"{re.escape(primary.name)} (\d+)")
+        numbered = [(int(match[1]), category) for category in guild.categories if (match := pattern.fullmatch(category.name))]
+        return sorted(numbered, key=lambda pair: pair[0])
+
+    async def reserve(self, guild, primary, ticket_type):
+        """
+        Pick a category with room for one more ticket channel and hold the slot
+
+        Complete the returned reservation with created() once the channel was
+        created, or with release() if creating it failed.
+
+        Raises:
+            CapacityError: Every category is full and no overflow category can be created
+        """
+        async with self._locks[guild.id]:
+            if guild.id not in self._totals:
+                self.track(guild)
+            self._check_guild_limit(guild)
+
+            categories = self.categories_for(guild, primary, ticket_type)
+            for category in categories:
+                if self.used(category.id) < CATEGORY_CHANNEL_LIMIT:
+                    self._reserved[category.id] += 1
+                    return Reservation(category)
+
+            # A new category takes a channel slot as well as the ticket
+            if not self.config['auto_overflow'] or self._totals[guild.id] + sum(self._reserved.values()) + 2 > GUILD_CHANNEL_LIMIT:
+                raise CapacityError(f"All {len(categories)} categories for {ticket_type} tickets are full")
+
+            numbered = self.numbered_overflow(guild, primary)
+            category = await guild.create_category(
+                f"{primary.name} {numbered[-1][0] + 1 if numbered else 2}",
+                overwrites=primary.overwrites,
+                position=categories[-1].position + 1,
+                reason=f"{ticket_type} ticket categories are full"
+            )
+            logger.warning(f"Created overflow category {category.name} for {ticket_type} tickets")
+            self._counts.setdefault(category.id, 0)
+            self._reserved[category.id] += 1
+            return Reservation(category)
+
+    def created(self, reservation, channel):
+        """Complete a reservation with the channel create_text_channel returned, counting it right away"""
+        if not self._finish(reservation, channel.id):
+            return
+        category = reservation.category
+        # The create event can arrive after the next ticket is allocated, count the channel now
+        self._expected.add(channel.id)
+        self._counts[category.id] = self._counts.get(category.id, 0) + 1
+        self._totals[category.guild.id] += 1
+        self._check_guild_limit(category.guild)
+
+    def release(self, reservation):
+        """Give back the slot of a reservation whose channel couldn't be created"""
+        self._finish(reservation)
+
+    def _finish(self, reservation, channel_id=None):
+        """
+        Drop the reservation's slot
+
+        Returns:
+            bool: True if the channel still has to be counted, False if the
+                  create event already counted it or the reservation was done
+        """
+        if reservation.done:
+            return False
+        reservation.done = True
+
+        category_id = reservation.category.id
+        seen = self._seen[category_id]
+        already_counted = channel_id in seen
+        seen.discard(channel_id)
+        self._reserved[category_id] -= 1
+        if self._reserved[category_id] <= 0:
+            del self._reserved[category_id]
+            del self._seen[category_id]
+        return channel_id is not None and not already_counted
+
+
+allocator = CategoryAllocator()
@@ -0,0 +1,134 @@
+"""
+Local copy of every message sent in a ticket channel.
+
+The tickets cog records messages, edits, deletions and attachment details as
+they happen, so a transcript can be rendered from SQLite when the ticket
+closes instead of re-reading the whole channel over REST. ticket_capture
+remembers when recording started for each ticket, tickets opened before
+that still go through chat_exporter.
+"""
+
+import json
+import time
+import datetime
+
+from modules.tickets.repository import repository
+
+
+def start_capture(ticket_id):
+    """Mark a ticket as recorded from its first message on"""
+    with repository.connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO ticket_capture (ticket_id, started_at) VALUES (?, ?)", (ticket_id, time.time()))
+
+
+def is_captured(ticket_id):
+    with repository.connection() as conn:
+        return conn.execute("SELECT 1 FROM ticket_capture WHERE ticket_id = ?", (ticket_id,)).fetchone() is not None
+
+
+def serialize_attachments(attachments):
+    return json.dumps([
+        {
+            'filename': attachment.filename,
+            'url': attachment.url,
+            'size': attachment.size,
+            'content_type': attachment.content_type
+        }
+        for attachment in attachments
+    ])
+
+
+def message_row(ticket_id, message):
+    """Values for a ticket_messages insert from a discord.Message"""
+    return (
+        message.id,
+        ticket_id,
+        message.channel.id,
+        message.author.id,
+        message.author.display_name,
+        message.author.display_avatar.url,
+        int(message.author.bot),
+        message.content,
+        json.dumps([embed.to_dict() for embed in message.embeds]),
+        serialize_attachments(message.attachments),
+        message.created_at.timestamp(),
+        message.edited_at.timestamp() if message.edited_at else None
+    )
+
+
+def record_message(row):
+    """Store a message, replacing the stored copy if it was recorded before"""
+    with repository.connection() as conn:
+        conn.execute('''
+        INSERT OR REPLACE INTO ticket_messages
+            (message_id, ticket_id, channel_id, author_id, author_name, author_avatar, author_bot,
+             content, embeds, attachments, created_at, edited_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', row)
+
+
+def record_edit(message_id, data):
+    """
+    Apply a raw MESSAGE_UPDATE payload to the stored copy
+
+    Only the fields present in the payload changed, embed-only updates
+    (link previews) leave content untouched.
+    """
+    updates = []
+    params = []
+    if 'content' in data:
+        updates.append("content = ?")
+        params.append(data['content'])
+    if 'embeds' in data:
+        updates.append("embeds = ?")
+        params.append(json.dumps(data['embeds']))
+    if 'attachments' in data:
+        updates.append("attachments = ?")
+        params.append(json.dumps([
+            {
+                'filename': attachment.get('filename'),
+                'url': attachment.get('url'),
+                'size': attachment.get('size'),
+                'content_type': attachment.get('content_type')
+            }
+            for attachment in data['attachments']
+        ]))
+    if data.get('edited_timestamp'):
+        updates.append("edited_at = ?")
+        params.append(datetime.datetime.fromisoformat(data['edited_timestamp']).timestamp())
+    if not updates:
+        return 0
+
+    with repository.connection() as conn:
+        cursor = conn.execute(f"UPDATE ticket_messages SET {', '.join(updates)} WHERE message_id = ?", params + [message_id])
+        return cursor.rowcount
+
+
+def record_deletes(message_ids):
+    """Keep deleted messages in the transcript, flagged as deleted"""
+    with repository.connection() as conn:
+        conn.executemany("UPDATE ticket_messages SET deleted = 1 WHERE message_id = ?", [(message_id,) for message_id in message_ids])
+
+
+def fetch_messages(ticket_id):
+    """Stored messages of a ticket as dicts, oldest first"""
+    with repository.connection() as conn:
+        cursor = conn.execute('''
+        SELECT message_id, author_id, author_name, author_avatar, author_bot, content, embeds,
+               attachments, created_at, edited_at, deleted
+        FROM ticket_messages WHERE ticket_id = ? ORDER BY message_id
+        ''', (ticket_id,))
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    for row in rows:
+        row['embeds'] = json.loads(row['embeds'] or '[]')
+        row['attachments'] = json.loads(row['attachments'] or '[]')
+    return rows
+
+
+def delete_messages(ticket_id):
+    """Drop the stored copy once the ticket is gone"""
+    with repository.connection() as conn:
+        conn.execute("DELETE FROM ticket_messages WHERE ticket_id = ?", (ticket_id,))
+        conn.execute("DELETE FROM ticket_capture WHERE ticket_id = ?", (ticket_id,))
@@ -0,0 +1,202 @@
+"""
+Background delivery of ticket transcripts.
+
+Closing or deleting a ticket queues one job per delivery (the logs channel
+upload and the DM to the creator) in delivery_jobs. DeliveryQueue sends them
+in the background and retries failures with exponential backoff. Jobs that
+can never succeed (DMs closed, channel gone) or run out of attempts are kept
+as 'dead' with their last error. Jobs only reference the archived transcript
+by hash, so they survive a restart.
+"""
+
+import io
+import os
+import json
+import time
+import asyncio
+import logging
+import discord
+
+from modules.utils.db import run_in_db_thread
+from modules.tickets.repository import repository
+from modules.tickets.archive import read_archive
+
+logger = logging.getLogger("tickets")
+
+delivery_config = {
+    'max_attempts': int(os.getenv('DELIVERY_MAX_ATTEMPTS', '8')),
+    'max_backoff': float(os.getenv('DELIVERY_MAX_BACKOFF', '600')),
+    'poll_interval': float(os.getenv('DELIVERY_POLL_INTERVAL', '30'))
+}
+
+# Jobs sent per pass, the rest wait for the next one
+DELIVERY_BATCH_SIZE = 20
+
+JOB_COLUMNS = "id, kind, guild_id, target_id, ticket_id, sha256, filename, embed, attempts"
+
+
+def enqueue_deliveries(jobs):
+    """
+    Queue deliveries of an archived transcript
+
+    Args:
+        jobs: (kind, guild id, target id, ticket id, sha256, filename, embed dict) tuples,
+              kind is 'channel' (target is a channel id) or 'dm' (target is a user id)
+    """
+    now = time.time()
+    with repository.connection() as conn:
+        conn.executemany('''
+        INSERT INTO delivery_jobs (kind, guild_id, target_id, ticket_id, sha256, filename, embed, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(kind, guild_id, target_id, ticket_id, sha256, filename, json.dumps(embed), now, now)
+              for kind, guild_id, target_id, ticket_id, sha256, filename, embed in jobs])
+
+
+def due_jobs(guild_ids, limit=DELIVERY_BATCH_SIZE):
+    """
+    Pending jobs of the given guilds whose backoff has passed
+
+    Returns:
+        tuple: (list of job dicts, seconds until the next pending job is due or None)
+    """
+    guilds = json.dumps(list(guild_ids))
+    now = time.time()
+    with repository.connection() as conn:
+        cursor = conn.execute(f'''
+        SELECT {JOB_COLUMNS} FROM delivery_jobs
+        WHERE status = 'pending' AND next_attempt_at <= ? AND guild_id IN (SELECT value FROM json_each(?))
+        ORDER BY next_attempt_at LIMIT ?
+        ''', (now, guilds, limit))
+        columns = [column[0] for column in cursor.description]
+        jobs = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        next_at = conn.execute('''
+        SELECT MIN(next_attempt_at) FROM delivery_jobs
+        WHERE status = 'pending' AND next_attempt_at > ? AND guild_id IN (SELECT value FROM json_each(?))
+        ''', (now, guilds)).fetchone()[0]
+
+    for job in jobs:
+        job['embed'] = json.loads(job['embed'])
+    return jobs, (next_at - now if next_at is not None else None)
+
+
+def finish_job(job_id):
+    """Delivered jobs are dropped, the transcript itself stays in the archive"""
+    with repository.connection() as conn:
+        conn.execute("DELETE FROM delivery_jobs WHERE id = ?", (job_id,))
+
+
+def fail_job(job_id, attempts, error, retry_in=None):
+    """Record a failed attempt, retried after retry_in seconds or dead-lettered if it's None"""
+    with repository.connection() as conn:
+        if retry_in is None:
+            conn.execute(
+                "UPDATE delivery_jobs SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, job_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE delivery_jobs SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (attempts, error, time.time() + retry_in, job_id)
+            )
+
+
+def delivery_counts():
+    """{status: number of jobs}"""
+    with repository.connection() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM delivery_jobs GROUP BY status").fetchall())
+
+
+class DeliveryQueue:
+    """
+    Sends the queued deliveries of the guilds this process serves
+
+    Each guild is only ever handled by one shard process, so filtering on
+    guild id keeps two processes from sending the same job.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.config = delivery_config
+        self._wake = asyncio.Event()
+        self._task = None
+        self._stats = {'delivered': 0, 'retried': 0, 'dead': 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def wake(self):
+        """Check for due jobs now, after queueing new ones"""
+        self._wake.set()
+
+    async def stats(self):
+        counts = await run_in_db_thread(delivery_counts)
+        return dict(self._stats, pending=counts.get('pending', 0), dead=counts.get('dead', 0))
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                jobs, next_in = await run_in_db_thread(due_jobs, [guild.id for guild in self.bot.guilds])
+            except Exception as e:
+                logger.error(f"Error reading delivery jobs: {e}")
+                jobs, next_in = [], None
+
+            for job in jobs:
+                try:
+                    await self._deliver(job)
+                except Exception as e:
+                    # Only the bookkeeping can land here, the job is picked up again on the next pass
+                    logger.error(f"Error updating delivery job {job['id']}: {e}")
+            if jobs:
+                # Look again: more may be due, and the retries just scheduled change when to wake
+                continue
+
+            timeout = self.config['poll_interval'] if next_in is None else min(next_in, self.config['poll_interval'])
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0.1))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _send(self, job):
+        data = await run_in_db_thread(read_archive, job['sha256'])
+        file = discord.File(io.BytesIO(data), filename=job['filename'])
+        embed = discord.Embed.from_dict(job['embed'])
+
+        if job['kind'] == 'dm':
+            target = self.bot.get_user(job['target_id']) or await self.bot.fetch_user(job['target_id'])
+        else:
+            target = self.bot.get_channel(job['target_id']) or await self.bot.fetch_channel(job['target_id'])
+        await target.send(embed=embed, file=file)
+
+    async def _deliver(self, job):
+        attempts = job['attempts'] + 1
+        try:
+            await self._send(job)
+        except (discord.Forbidden, discord.NotFound, FileNotFoundError) as e:
+            # DMs closed, user or channel gone, or the archived file was removed: retrying won't help
+            self._stats['dead'] += 1
+            logger.warning(f"Dropping {job['kind']} delivery of ticket {job['ticket_id']} transcript to {job['target_id']}: {e}")
+            await run_in_db_thread(fail_job, job['id'], attempts, str(e))
+            return
+        except Exception as e:
+            if attempts >= self.config['max_attempts']:
+                self._stats['dead'] += 1
+                logger.error(f"Giving up on {job['kind']} delivery of ticket {job['ticket_id']} transcript after {attempts} attempts: {e}")
+                await run_in_db_thread(fail_job, job['id'], attempts, str(e))
+            else:
+                self._stats['retried'] += 1
+                retry_in = min(2 ** attempts, self.config['max_backoff'])
+                logger.warning(f"Retrying {job['kind']} delivery of ticket {job['ticket_id']} transcript in {retry_in:.0f}s: {e}")
+                await run_in_db_thread(fail_job, job['id'], attempts, str(e), retry_in)
+            return
+
+        self._stats['delivered'] += 1
+        await run_in_db_thread(finish_job, job['id'])
@@ -0,0 +1,220 @@
+"""
+Automatic closing of inactive tickets.
+
+InactivityScheduler warns in the channel after <TYPE>_INACTIVITY_WARN_HOURS
+without a message from a person and closes the ticket after
+<TYPE>_INACTIVITY_CLOSE_HOURS, through the same close path as the Close
+button.
+
+on_message only overwrites the ticket's last activity time in a dict. The
+heap holds (deadline, ticket id) entries that may be out of date: when one
+comes up, the deadline is recomputed from the last activity and the entry
+pushed back if the ticket was active since, so the scheduler only wakes
+when a deadline is due.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+
+from modules.utils.db import run_in_db_thread
+from modules.tickets.repository import repository
+
+logger = logging.getLogger("tickets")
+
+# Seconds between auto-closes when several tickets are due at once
+AUTO_CLOSE_INTERVAL = 2
+
+# Seconds before an auto-close that failed is tried again
+CLOSE_RETRY_DELAY = 600
+
+# Start of the warning message, a captured bot message starting with it marks the ticket as warned
+WARNING_PREFIX = "⏰ This ticket has had no activity"
+
+
+def inactivity_policy(category):
+    """
+    Seconds without activity before warning and before closing a ticket of this category
+
+    From <TYPE>_INACTIVITY_WARN_HOURS / <TYPE>_INACTIVITY_CLOSE_HOURS, falling
+    back to TICKET_INACTIVITY_WARN_HOURS / TICKET_INACTIVITY_CLOSE_HOURS.
+
+    Returns:
+        tuple: (warn, close), each None when disabled (0 hours). No warning
+               is given when it wouldn't come before the close.
+    """
+    def hours(name, default):
+        value = float(os.getenv(f'{category.upper()}_{name}', os.getenv(f'TICKET_{name}', default)))
+        return value * 3600 if value > 0 else None
+
+    warn = hours('INACTIVITY_WARN_HOURS', '48')
+    close = hours('INACTIVITY_CLOSE_HOURS', '72')
+    if warn is not None and close is not None and warn >= close:
+        warn = None
+    return warn, close
+
+
+def open_ticket_activity():
+    """
+    Last activity of every open ticket, from the captured messages
+
+    Returns:
+        dict: {ticket id: (channel id, category, last message from a person,
+               last inactivity warning, capture start)}, times are None when
+               there is none
+    """
+    with repository.connection() as conn:
+        rows = conn.execute('''
+        SELECT t.ticket_id, t.channel_id, t.category,
+               MAX(CASE WHEN m.author_bot = 0 THEN m.created_at END),
+               MAX(CASE WHEN m.author_bot = 1 AND m.content LIKE ? THEN m.created_at END),
+               c.started_at
+        FROM tickets t
+        LEFT JOIN ticket_messages m ON m.ticket_id = t.ticket_id
+        LEFT JOIN ticket_capture c ON c.ticket_id = t.ticket_id
+        WHERE t.status = 'open'
+        GROUP BY t.ticket_id
+        ''', (f"{WARNING_PREFIX}%",)).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def format_hours(seconds):
+    return f"{seconds / 3600:g} hour{'s' if seconds != 3600 else ''}"
+
+
+class InactivityScheduler:
+    """
+    Inactivity deadlines of the open tickets this process can see
+
+    Args:
+        bot: The client
+        close_ticket: Coroutine function (ticket id, idle seconds) that closes a ticket
+    """
+
+    def __init__(self, bot, close_ticket):
+        self.bot = bot
+        self.close_ticket = close_ticket
+        self._heap = []
+        self._tickets = {}  # ticket id -> (channel id, category)
+        self._last = {}  # ticket id -> time of the last message from a person
+        self._warned = set()
+        self._retry_at = {}  # ticket id -> earliest next auto-close attempt, after a failed one
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def track(self, ticket_id, channel_id, category, last_active, warned=False):
+        warn, close = inactivity_policy(category)
+        if close is None:
+            return
+        self._tickets[ticket_id] = (channel_id, category)
+        self._last[ticket_id] = last_active
+        if warned:
+            self._warned.add(ticket_id)
+        heapq.heappush(self._heap, (self._deadline(ticket_id), ticket_id))
+        if self._heap[0][1] == ticket_id:
+            self._wake.set()
+
+    def touch(self, ticket_id):
+        """Record activity, called for every message from a person in a ticket channel"""
+        if ticket_id in self._last:
+            self._last[ticket_id] = time.time()
+            self._warned.discard(ticket_id)
+
+    def forget(self, ticket_id):
+        """Stop watching a ticket that was closed or deleted"""
+        self._tickets.pop(ticket_id, None)
+        self._last.pop(ticket_id, None)
+        self._warned.discard(ticket_id)
+        self._retry_at.pop(ticket_id, None)
+
+    def _deadline(self, ticket_id):
+        warn, close = inactivity_policy(self._tickets[ticket_id][1])
+        if warn is not None and ticket_id not in self._warned:
+            return self._last[ticket_id] + warn
+        return max(self._last[ticket_id] + close, self._retry_at.get(ticket_id, 0))
+
+    async def _load(self):
+        """
+        Watch every open ticket whose channel this process can see
+
+        A ticket is idle since the last captured message from a person, or
+        since capture started if there is none. A warning sent after that
+        message counts, so restarts don't warn again and reset the clock.
+        """
+        activity = await run_in_db_thread(open_ticket_activity)
+        for ticket_id, (channel_id, category, last_message, last_warning, capture_started) in activity.items():
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                continue
+            last_active = last_message or capture_started or channel.created_at.timestamp()
+            warned = last_warning is not None and last_warning >= last_active
+            self.track(ticket_id, channel_id, category, last_active, warned)
+        logger.info(f"Watching {len(self._tickets)} open ticket(s) for inactivity")
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        await self._load()
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due_at, ticket_id = heapq.heappop(self._heap)
+                if ticket_id not in self._tickets:
+                    continue
+
+                deadline = self._deadline(ticket_id)
+                if deadline > now:
+                    # Active since this entry was pushed
+                    heapq.heappush(self._heap, (deadline, ticket_id))
+                    continue
+
+                try:
+                    await self._expire(ticket_id)
+                except Exception as e:
+                    logger.error(f"Error handling inactive ticket {ticket_id}: {e}")
+                now = time.time()
+
+            timeout = max(self._heap[0][0] - time.time(), 0) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _expire(self, ticket_id):
+        """Warn or close a ticket whose deadline passed"""
+        channel_id, category = self._tickets[ticket_id]
+        warn, close = inactivity_policy(category)
+        idle = time.time() - self._last[ticket_id]
+
+        if warn is not None and ticket_id not in self._warned:
+            self._warned.add(ticket_id)
+            heapq.heappush(self._heap, (self._deadline(ticket_id), ticket_id))
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                await channel.send(
+                    f"{WARNING_PREFIX} for {format_hours(warn)}. "
+                    f"It will be closed automatically in {format_hours(close - warn)} unless someone replies."
+                )
+            return
+
+        try:
+            await self.close_ticket(ticket_id, idle)
+        except Exception as e:
+            # Stays watched, a reply in the meantime still pushes the close back
+            logger.error(f"Error auto-closing ticket {ticket_id}, retrying in {CLOSE_RETRY_DELAY}s: {e}")
+            self._retry_at[ticket_id] = time.time() + CLOSE_RETRY_DELAY
+            heapq.heappush(self._heap, (self._deadline(ticket_id), ticket_id))
+        else:
+            self.forget(ticket_id)
+        await asyncio.sleep(AUTO_CLOSE_INTERVAL)
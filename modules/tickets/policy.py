@@ -0,0 +1,164 @@
+"""
+Who may do what in a ticket.
+
+TICKET_POLICY says, per ticket category, which roles handle its tickets and
+what the ticket creator may do themselves. It is compiled once into
+{(category, action): Rule} with the role ids as frozensets, so a button
+click is one dict lookup and one set intersection. create_ticket builds the
+channel overwrites from the same table, so who can see a ticket and who can
+act on it never drift apart.
+"""
+
+import os
+from dataclasses import dataclass
+import discord
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STAFF_ROLE_ID = int(os.getenv('STAFF_ROLE_ID'))
+STAFF_REPORT_ROLE_ID_1 = int(os.getenv('STAFF_REPORT_ROLE_ID_1'))
+STAFF_REPORT_ROLE_ID_2 = int(os.getenv('STAFF_REPORT_ROLE_ID_2'))
+GANG_REPORT_ROLE_ID = int(os.getenv('GANG_REPORT_ROLE_ID'))
+BAN_APPEAL_ROLE_ID = int(os.getenv('BAN_APPEAL_ROLE_ID'))
+
+ROLE_IDS = {
+    'staff': STAFF_ROLE_ID,
+    'senior_admin': STAFF_REPORT_ROLE_ID_1,
+    'management': STAFF_REPORT_ROLE_ID_2,
+    'gang_staff': GANG_REPORT_ROLE_ID,
+    'ban_appeal_staff': BAN_APPEAL_ROLE_ID
+}
+
+ACTIONS = ('claim', 'add_user', 'rename', 'close', 'delete', 'transcript')
+
+# Matches statuses for creator rules that apply whatever state the ticket is in
+ANY_STATUS = None
+
+TICKET_POLICY = {
+    'general': {
+        'roles': ('staff',),
+        'creator': {'close': ANY_STATUS, 'delete': ('closed',)}
+    },
+    'tebex': {
+        'roles': ('staff',),
+        'creator': {'close': ANY_STATUS, 'delete': ('closed',)}
+    },
+    'ban_appeal': {
+        'roles': ('ban_appeal_staff', 'senior_admin', 'management'),
+        'creator': {'close': ANY_STATUS}
+    },
+    'gang': {
+        'roles': ('gang_staff', 'senior_admin', 'management'),
+        'creator': {'close': ANY_STATUS}
+    },
+    # Staff reports are only visible to management
+    'staff': {
+        'roles': ('senior_admin', 'management'),
+        'creator': {'close': ANY_STATUS}
+    }
+}
+
+# Actions whose roles don't depend on the ticket category
+ACTION_ROLES = {
+    'rename': ('staff',)
+}
+
+# Used for tickets whose category isn't in the table
+DEFAULT_CATEGORY = 'general'
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    role_ids: frozenset
+    creator: bool = False
+    creator_statuses: frozenset = None  # None means any status
+
+
+def compile_policy(policy=TICKET_POLICY, action_roles=ACTION_ROLES, role_ids=ROLE_IDS):
+    """Turn the policy table into {(category, action): Rule}"""
+    compiled = {}
+    for category, entry in policy.items():
+        for action in ACTIONS:
+            roles = action_roles.get(action, entry['roles'])
+            creator = action in entry.get('creator', {})
+            statuses = entry.get('creator', {}).get(action)
+            compiled[(category, action)] = Rule(
+                role_ids=frozenset(role_ids[role] for role in roles),
+                creator=creator,
+                creator_statuses=frozenset(statuses) if statuses is not None else None
+            )
+    return compiled
+
+
+COMPILED_POLICY = compile_policy()
+
+# Roles that can see each category's ticket channels
+VIEWER_ROLE_IDS = {
+    category: frozenset(ROLE_IDS[role] for role in entry['roles'])
+    for category, entry in TICKET_POLICY.items()
+}
+
+
+def get_rule(category, action):
+    return COMPILED_POLICY.get((category, action)) or COMPILED_POLICY[(DEFAULT_CATEGORY, action)]
+
+
+def is_allowed(member, category, action, creator_id=None, status=None):
+    """
+    Whether the member may perform the action on a ticket
+
+    Args:
+        member: The member who clicked
+        category: Ticket category, None for actions that don't depend on it
+        action: One of ACTIONS
+        creator_id: User id of the ticket creator, for creator rules
+        status: Current ticket status, for creator rules limited to some statuses
+    """
+    rule = get_rule(category, action)
+    if not rule.role_ids.isdisjoint(role.id for role in member.roles):
+        return True
+    if rule.creator and creator_id == member.id:
+        return rule.creator_statuses is None or status in rule.creator_statuses
+    return False
+
+
+def build_overwrites(guild, category, creator):
+    """Channel overwrites for a new ticket: hidden from everyone but the creator, the bot and the category's roles"""
+    overwrites = {
+        guild.default_role: discord.PermissionOverwrite(read_messages=False),
+        creator: discord.PermissionOverwrite(read_messages=True, send_messages=True),
+        guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True)
+    }
+    for role_id in VIEWER_ROLE_IDS.get(category, VIEWER_ROLE_IDS[DEFAULT_CATEGORY]):
+        role = guild.get_role(role_id)
+        if role:
+            overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+    return overwrites
+
+
+async def apply_overwrites(channel, changes, reason=None):
+    """
+    Merge overwrite changes into a channel's overwrites and apply them with one edit
+
+    Args:
+        channel: The ticket channel
+        changes: {role or member: {permission: True/False/None}}, permissions not mentioned are kept
+        reason: Audit log reason
+
+    Returns:
+        bool: Whether anything changed, no request is made otherwise
+    """
+    overwrites = dict(channel.overwrites)
+    changed = False
+    for target, values in changes.items():
+        current = overwrites.get(target, discord.PermissionOverwrite())
+        updated = discord.PermissionOverwrite(**dict(current))
+        updated.update(**values)
+        if updated != current or target not in overwrites:
+            overwrites[target] = updated
+            changed = True
+
+    if changed:
+        await channel.edit(overwrites=overwrites, reason=reason)
+    return changed
@@ -0,0 +1,197 @@
+"""
+Access to the tickets database.
+
+The repository is the SQLiteStore for data/tickets.db. Every ticket module
+(capture, archive, delivery) goes through its connection().
+
+MIGRATIONS are applied in order on startup and never edited once released,
+new changes go in a new entry. The first migrations only use IF NOT EXISTS,
+so databases created before versioning upgrade in place.
+"""
+
+import time
+import datetime
+from dataclasses import dataclass
+
+from modules.utils.db import DATA_DIR
+from modules.utils.store import SQLiteStore
+
+TICKETS_DB = DATA_DIR / 'tickets.db'
+
+MIGRATIONS = [
+    # 1: tickets table as created before versioning
+    '''
+    CREATE TABLE IF NOT EXISTS tickets (
+        ticket_id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        channel_id INTEGER,
+        category TEXT,
+        created_at TIMESTAMP,
+        status TEXT
+    );
+    ''',
+    # 2: create_ticket looks up open tickets per user and category, buttons and
+    #    message capture look tickets up by channel
+    '''
+    CREATE INDEX IF NOT EXISTS idx_tickets_user_category_status ON tickets (user_id, category, status);
+    CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status);
+    CREATE INDEX IF NOT EXISTS idx_tickets_channel ON tickets (channel_id);
+    ''',
+    # 3: message capture (capture.py)
+    '''
+    CREATE TABLE IF NOT EXISTS ticket_messages (
+        message_id INTEGER PRIMARY KEY,
+        ticket_id TEXT,
+        channel_id INTEGER,
+        author_id INTEGER,
+        author_name TEXT,
+        author_avatar TEXT,
+        author_bot INTEGER,
+        content TEXT,
+        embeds TEXT,
+        attachments TEXT,
+        created_at REAL,
+        edited_at REAL,
+        deleted INTEGER DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_ticket_messages_ticket ON ticket_messages (ticket_id, message_id);
+    CREATE TABLE IF NOT EXISTS ticket_capture (
+        ticket_id TEXT PRIMARY KEY,
+        started_at REAL
+    );
+    ''',
+    # 4: transcript archive index (archive.py)
+    '''
+    CREATE TABLE IF NOT EXISTS transcripts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT,
+        user_id INTEGER,
+        category TEXT,
+        channel_name TEXT,
+        closed_at REAL,
+        closed_by INTEGER,
+        sha256 TEXT,
+        size INTEGER,
+        compressed_size INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_transcripts_ticket ON transcripts (ticket_id);
+    CREATE INDEX IF NOT EXISTS idx_transcripts_user ON transcripts (user_id, closed_at);
+    CREATE INDEX IF NOT EXISTS idx_transcripts_category ON transcripts (category, closed_at);
+    CREATE INDEX IF NOT EXISTS idx_transcripts_closed ON transcripts (closed_at);
+    ''',
+    # 5: transcript delivery jobs (delivery.py)
+    '''
+    CREATE TABLE IF NOT EXISTS delivery_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        guild_id INTEGER,
+        target_id INTEGER,
+        ticket_id TEXT,
+        sha256 TEXT,
+        filename TEXT,
+        embed TEXT,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at REAL,
+        last_error TEXT,
+        created_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_delivery_jobs_due ON delivery_jobs (status, next_attempt_at);
+    ''',
+    # 6: close time for retention, tickets already closed count as closed now
+    '''
+    ALTER TABLE tickets ADD COLUMN closed_at REAL;
+    UPDATE tickets SET closed_at = CAST(strftime('%s', 'now') AS REAL) WHERE status = 'closed';
+    '''
+]
+
+
+@dataclass(slots=True)
+class Ticket:
+    ticket_id: str
+    user_id: int
+    channel_id: int
+    category: str
+    created_at: str
+    status: str
+    closed_at: float = None
+
+
+TICKET_COLUMNS = "ticket_id, user_id, channel_id, category, created_at, status, closed_at"
+
+
+class TicketRepository(SQLiteStore):
+    """
+    The process's connection to the tickets database and the ticket queries
+
+    Methods are blocking and meant for the DB thread pool
+    (await run_in_db_thread(repository.get, ticket_id)).
+    """
+
+    def __init__(self, path=TICKETS_DB):
+        super().__init__(path, MIGRATIONS, 'tickets')
+
+    def get(self, ticket_id):
+        """The ticket with this id, or None"""
+        with self.connection() as conn:
+            row = conn.execute(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+        return Ticket(*row) if row else None
+
+    def get_by_channel(self, channel_id):
+        """The ticket whose channel this is, or None"""
+        with self.connection() as conn:
+            row = conn.execute(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE channel_id = ?", (channel_id,)).fetchone()
+        return Ticket(*row) if row else None
+
+    def find_open(self, user_id, category):
+        """The user's open ticket in a category, or None"""
+        with self.connection() as conn:
+            row = conn.execute(
+                f"SELECT {TICKET_COLUMNS} FROM tickets WHERE user_id = ? AND category = ? AND status = 'open'",
+                (user_id, category)
+            ).fetchone()
+        return Ticket(*row) if row else None
+
+    def create(self, ticket_id, user_id, channel_id, category):
+        """Record a new open ticket"""
+        ticket = Ticket(ticket_id, user_id, channel_id, category, str(datetime.datetime.now()), 'open')
+        with self.connection() as conn:
+            conn.execute(
+                f"INSERT INTO tickets ({TICKET_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ticket.ticket_id, ticket.user_id, ticket.channel_id, ticket.category, ticket.created_at, ticket.status, None)
+            )
+        return ticket
+
+    def set_status(self, ticket_id, status):
+        with self.connection() as conn:
+            return conn.execute("UPDATE tickets SET status = ? WHERE ticket_id = ?", (status, ticket_id)).rowcount
+
+    def mark_closed(self, ticket_id):
+        """
+        Mark a ticket closed
+
+        Returns:
+            float: The close time, retention counts from it
+        """
+        closed_at = time.time()
+        with self.connection() as conn:
+            conn.execute("UPDATE tickets SET status = 'closed', closed_at = ? WHERE ticket_id = ?", (closed_at, ticket_id))
+        return closed_at
+
+    def by_status(self, status):
+        """Every ticket with this status ('open', 'closed' or 'archived')"""
+        with self.connection() as conn:
+            rows = conn.execute(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE status = ?", (status,)).fetchall()
+        return [Ticket(*row) for row in rows]
+
+    def delete(self, ticket_id):
+        with self.connection() as conn:
+            return conn.execute("DELETE FROM tickets WHERE ticket_id = ?", (ticket_id,)).rowcount
+
+    def channels(self):
+        """{channel id: ticket id} for every ticket that still has a channel"""
+        with self.connection() as conn:
+            return dict(conn.execute("SELECT channel_id, ticket_id FROM tickets WHERE status != 'archived'").fetchall())
+
+
+repository = TicketRepository()
@@ -0,0 +1,159 @@
+"""
+Automatic archival of closed tickets.
+
+RetentionScheduler archives a closed ticket once its category's retention
+period has passed since it was closed: it makes sure the transcript is in
+the local archive, deletes the channel, drops the captured messages and
+marks the row 'archived'. The row stays, so /transcript still finds the
+ticket.
+
+Due times sit in a heap keyed by close time + retention, loaded from the
+database on startup and pushed to when a ticket closes, so the scheduler
+sleeps until the next one is due. At most TICKET_ARCHIVE_BATCH channels are
+deleted per pass, TICKET_ARCHIVE_INTERVAL seconds apart.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import discord
+
+from modules.utils.db import run_in_db_thread
+from modules.tickets.repository import repository
+from modules.tickets.capture import delete_messages
+from modules.tickets.transcript import build_transcript
+from modules.tickets.archive import archive_transcript, has_transcript
+
+logger = logging.getLogger("tickets")
+
+retention_config = {
+    'batch': int(os.getenv('TICKET_ARCHIVE_BATCH', '10')),
+    'interval': float(os.getenv('TICKET_ARCHIVE_INTERVAL', '2'))
+}
+
+# Seconds before a ticket whose archival failed is tried again
+ARCHIVE_RETRY_DELAY = 600
+
+
+def retention_seconds(category):
+    """
+    How long a closed ticket of this category keeps its channel
+
+    From <TYPE>_RETENTION_HOURS, falling back to TICKET_RETENTION_HOURS.
+
+    Returns:
+        float: Seconds, or None to never archive automatically (0 hours)
+    """
+    hours = float(os.getenv(f'{category.upper()}_RETENTION_HOURS', os.getenv('TICKET_RETENTION_HOURS', '72')))
+    return hours * 3600 if hours > 0 else None
+
+
+class RetentionScheduler:
+    """
+    Timer heap of closed tickets waiting to be archived
+
+    Entries are (due at, ticket id). Unscheduling only forgets the ticket in
+    _due, stale heap entries are skipped when they come up.
+    """
+
+    def __init__(self, bot, ticket_channels, config=retention_config):
+        self.bot = bot
+        self.ticket_channels = ticket_channels  # TICKET_CHANNELS, archived channels are dropped from it
+        self.config = config
+        self._heap = []
+        self._due = {}  # ticket id -> due at, the current entry of each ticket
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def schedule(self, ticket_id, category, closed_at):
+        retention = retention_seconds(category)
+        if retention is None:
+            return
+        due_at = closed_at + retention
+        self._due[ticket_id] = due_at
+        heapq.heappush(self._heap, (due_at, ticket_id))
+        # Only matters if it's due before whatever the scheduler is sleeping for
+        if self._heap[0][1] == ticket_id:
+            self._wake.set()
+
+    def unschedule(self, ticket_id):
+        self._due.pop(ticket_id, None)
+
+    async def _load(self):
+        """Schedule every closed ticket whose channel this process can see"""
+        tickets = await run_in_db_thread(repository.by_status, 'closed')
+        for ticket in tickets:
+            # Other shard processes' guilds, or channels deleted by hand
+            if self.bot.get_channel(ticket.channel_id) is not None:
+                self.schedule(ticket.ticket_id, ticket.category, ticket.closed_at or time.time())
+        logger.info(f"Scheduled {len(self._due)} of {len(tickets)} closed ticket(s) for archival")
+
+    def _pop_due(self):
+        """Up to a batch of ticket ids that are due now"""
+        now = time.time()
+        ready = []
+        while self._heap and self._heap[0][0] <= now and len(ready) < self.config['batch']:
+            due_at, ticket_id = heapq.heappop(self._heap)
+            if self._due.get(ticket_id) == due_at:
+                del self._due[ticket_id]
+                ready.append(ticket_id)
+        return ready
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        await self._load()
+        while True:
+            for ticket_id in self._pop_due():
+                try:
+                    await self.archive(ticket_id)
+                except Exception as e:
+                    logger.error(f"Error archiving ticket {ticket_id}, retrying in {ARCHIVE_RETRY_DELAY}s: {e}")
+                    due_at = time.time() + ARCHIVE_RETRY_DELAY
+                    self._due[ticket_id] = due_at
+                    heapq.heappush(self._heap, (due_at, ticket_id))
+                # Channel deletes share a rate limit with everything else the bot does in the guild
+                await asyncio.sleep(self.config['interval'])
+
+            timeout = max(self._heap[0][0] - time.time(), 0) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def archive(self, ticket_id):
+        """Store the transcript if it isn't yet, delete the channel and mark the ticket archived"""
+        ticket = await run_in_db_thread(repository.get, ticket_id)
+        if ticket is None or ticket.status != 'closed':
+            # Deleted by hand since it was scheduled
+            return
+
+        channel = self.bot.get_channel(ticket.channel_id)
+        if channel is not None:
+            if not await run_in_db_thread(has_transcript, ticket_id):
+                transcript = await build_transcript(channel, ticket_id, self.bot)
+                if not transcript:
+                    raise RuntimeError("transcript could not be built, keeping the channel")
+                await run_in_db_thread(
+                    archive_transcript, ticket_id, ticket.user_id, ticket.category, channel.name, self.bot.user.id, transcript
+                )
+            try:
+                await channel.delete(reason=f"Ticket {ticket_id} archived after its retention period")
+            except discord.NotFound:
+                pass
+
+        await run_in_db_thread(repository.set_status, ticket_id, 'archived')
+        await run_in_db_thread(delete_messages, ticket_id)
+        self.ticket_channels.pop(ticket.channel_id, None)
+        logger.info(f"Archived ticket {ticket_id}")
@@ -0,0 +1,131 @@
+"""
+Ticket transcripts.
+
+build_transcript() renders the messages captured in SQLite (see capture.py)
+into a standalone HTML page without touching the Discord API. Tickets opened
+before capture was enabled fall back to chat_exporter, which reads the
+channel history over REST.
+"""
+
+import html
+import datetime
+import logging
+import chat_exporter
+
+from modules.utils.db import run_in_db_thread
+from modules.tickets.capture import is_captured, fetch_messages
+
+logger = logging.getLogger("tickets")
+
+STYLE = """
+body { background: #313338; color: #dbdee1; font-family: "gg sans", "Helvetica Neue", Arial, sans-serif; margin: 0; }
+header { background: #2b2d31; padding: 16px 24px; border-bottom: 1px solid #1e1f22; }
+header h1 { font-size: 18px; margin: 0 0 4px; color: #f2f3f5; }
+header p { margin: 0; font-size: 13px; color: #949ba4; }
+.message { display: flex; padding: 6px 24px; }
+.message:hover { background: #2e3035; }
+.avatar { width: 40px; height: 40px; border-radius: 50%; margin-right: 16px; flex-shrink: 0; }
+.author { font-weight: 600; color: #f2f3f5; }
+.bot { background: #5865f2; color: #fff; font-size: 10px; padding: 1px 4px; border-radius: 3px; margin-left: 4px; }
+.time, .edited { color: #949ba4; font-size: 12px; margin-left: 6px; }
+.content { white-space: pre-wrap; word-wrap: break-word; margin-top: 2px; }
+.deleted .content { color: #f23f43; text-decoration: line-through; }
+.embed { border-left: 4px solid #1e1f22; background: #2b2d31; border-radius: 4px; padding: 8px 12px; margin-top: 4px; max-width: 520px; }
+.embed-title { font-weight: 600; color: #f2f3f5; }
+.embed-field-name { font-weight: 600; margin-top: 6px; }
+.embed pre, .content pre { background: #1e1f22; padding: 6px; border-radius: 4px; white-space: pre-wrap; }
+.attachment { margin-top: 4px; }
+.attachment img { max-width: 400px; max-height: 300px; border-radius: 4px; display: block; }
+"""
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+
+
+def render_text(text):
+    """Escape message text, keeping ``` code blocks as <pre>"""
+    parts = html.escape(text or '').split('```')
+    rendered = []
+    for index, part in enumerate(parts):
+        if index % 2 and index < len(parts) - 1:
+            rendered.append(f"<pre>{part.strip()}</pre>")
+        else:
+            rendered.append(part if index % 2 == 0 else '```' + part)
+    return ''.join(rendered)
+
+
+def render_embed(embed):
+    color = embed.get('color')
+    style = f' style="border-left-color: #{color:06x}"' if color else ''
+    parts = [f'<div class="embed"{style}>']
+    if embed.get('title'):
+        parts.append(f'<div class="embed-title">{html.escape(embed["title"])}</div>')
+    if embed.get('description'):
+        parts.append(f'<div>{render_text(embed["description"])}</div>')
+    for field in embed.get('fields', []):
+        parts.append(f'<div class="embed-field-name">{html.escape(field.get("name", ""))}</div>')
+        parts.append(f'<div>{render_text(field.get("value", ""))}</div>')
+    if embed.get('footer', {}).get('text'):
+        parts.append(f'<div class="time">{html.escape(embed["footer"]["text"])}</div>')
+    parts.append('</div>')
+    return ''.join(parts)
+
+
+def render_attachment(attachment):
+    url = html.escape(attachment.get('url') or '', quote=True)
+    name = html.escape(attachment.get('filename') or 'attachment')
+    if (attachment.get('content_type') or '').startswith('image/'):
+        return f'<div class="attachment"><a href="{url}"><img src="{url}" alt="{name}"></a></div>'
+    size = attachment.get('size') or 0
+    return f'<div class="attachment">📎 <a href="{url}">{name}</a> ({size / 1024:.0f} KB)</div>'
+
+
+def render_transcript(ticket_id, channel_name, messages):
+    """Standalone HTML page for a ticket's captured messages"""
+    body = []
+    for message in messages:
+        classes = 'message deleted' if message['deleted'] else 'message'
+        avatar = html.escape(message['author_avatar'] or '', quote=True)
+        header = f'<span class="author">{html.escape(message["author_name"] or str(message["author_id"]))}</span>'
+        if message['author_bot']:
+            header += '<span class="bot">BOT</span>'
+        header += f'<span class="time">{format_time(message["created_at"])}</span>'
+        if message['edited_at']:
+            header += f'<span class="edited">(edited {format_time(message["edited_at"])})</span>'
+        if message['deleted']:
+            header += '<span class="edited">(deleted)</span>'
+
+        content = f'<div class="content">{render_text(message["content"])}</div>' if message['content'] else ''
+        embeds = ''.join(render_embed(embed) for embed in message['embeds'])
+        attachments = ''.join(render_attachment(attachment) for attachment in message['attachments'])
+        body.append(
+            f'<div class="{classes}"><img class="avatar" src="{avatar}" alt="">'
+            f'<div><div>{header}</div>{content}{embeds}{attachments}</div></div>'
+        )
+
+    title = html.escape(f"Ticket #{ticket_id} - #{channel_name}")
+    generated = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title><style>{STYLE}</style></head>'
+        f'<body><header><h1>{title}</h1><p>{len(messages)} message(s), generated {generated}</p></header>'
+        f'{"".join(body)}</body></html>'
+    )
+
+
+async def build_transcript(channel, ticket_id, bot):
+    """
+    HTML transcript of a ticket channel
+
+    Rendered from the captured messages when the ticket was recorded from the
+    start, otherwise exported from the channel history with chat_exporter.
+
+    Returns:
+        str: The HTML, or None if the export failed
+    """
+    if await run_in_db_thread(is_captured, ticket_id):
+        messages = await run_in_db_thread(fetch_messages, ticket_id)
+        return render_transcript(ticket_id, channel.name, messages)
+
+    logger.info(f"Ticket {ticket_id} was opened before message capture, exporting its history")
+    return await chat_exporter.export(channel, bot=bot)
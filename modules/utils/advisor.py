@@ -0,0 +1,162 @@
+"""
+Index advisor for the qbox tables the bots read from.
+
+EXPLAINs every MySQL query the finder and tickets modules issue and checks
+that the columns they filter on are indexed. Used at finder startup and by
+modules/utils/scripts/check_indexes.py to gate deploys.
+"""
+
+import time
+import logging
+import mysql.connector
+
+from modules.utils.db import (
+    db_config, build_profile_query,
+    VEHICLE_INVENTORY_QUERY, CHARACTER_BY_CITIZENID_QUERY
+)
+
+logger = logging.getLogger("db")
+
+# Columns the lookups filter or join on, each needs to be the first column of some index
+EXPECTED_INDEXES = {
+    'users': ['discord'],
+    'players': ['license', 'userId', 'citizenid'],
+    'player_vehicles': ['plate', 'citizenid']
+}
+
+# Above this many estimated rows a lookup is reported even if it uses an index
+ROWS_WARNING = 1000
+
+
+def advised_queries():
+    """Every query the bots issue, with harmless sample parameters for EXPLAIN"""
+    queries = [
+        ("vehicle inventory by plate", VEHICLE_INVENTORY_QUERY, ('ADVISOR',)),
+        ("character by citizenid", CHARACTER_BY_CITIZENID_QUERY, ('ADVISOR',))
+    ]
+
+    for include in (('characters',), ('characters', 'vehicles')):
+        profile_query, discord_params = build_profile_query(include)
+        queries.append((f"profile ({', '.join(include)})", profile_query, ('discord:0',) * discord_params))
+
+    return queries
+
+
+def leading_index_columns(cursor, table):
+    """Columns that are the first column of at least one index on the table"""
+    cursor.execute(f"SHOW INDEX FROM `{table}`")
+    return {row['Column_name'].lower() for row in cursor.fetchall() if int(row['Seq_in_index']) == 1}
+
+
+def suggest_index(table, column):
+    return f"ALTER TABLE `{table}` ADD INDEX `idx_{table}_{column.lower()}` (`{column}`);"
+
+
+def run_advisor(conn=None):
+    """
+    Check indexes and EXPLAIN every query
+
+    Args:
+        conn: Optional open MySQL connection, a short lived one is opened otherwise
+
+    Returns:
+        dict: 'missing' [(table, column)], 'queries' [per query findings],
+              'ddl' [suggested statements], 'elapsed' seconds
+    """
+    started = time.monotonic()
+    own_conn = conn is None
+    if own_conn:
+        conn = mysql.connector.connect(**db_config, connection_timeout=5)
+
+    report = {'missing': [], 'queries': [], 'ddl': [], 'errors': []}
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for table, columns in EXPECTED_INDEXES.items():
+            try:
+                indexed = leading_index_columns(cursor, table)
+            except mysql.connector.Error as e:
+                report['errors'].append(f"{table}: {e}")
+                continue
+            for column in columns:
+                if column.lower() not in indexed:
+                    report['missing'].append((table, column))
+                    report['ddl'].append(suggest_index(table, column))
+
+        for name, query, params in advised_queries():
+            finding = {'name': name, 'full_scans': [], 'rows': 0, 'plan': []}
+            try:
+                cursor.execute(f"EXPLAIN {query}", params)
+                plan = cursor.fetchall()
+            except mysql.connector.Error as e:
+                report['errors'].append(f"{name}: {e}")
+                continue
+
+            for step in plan:
+                table = step.get('table') or ''
+                access = (step.get('type') or '').upper()
+                rows = int(step.get('rows') or 0)
+                finding['rows'] += rows
+                finding['plan'].append(f"{table}: type={access or '-'} key={step.get('key') or '-'} rows={rows}")
+                # <derivedN>/<unionN> are the bot's own small temporary results, not table scans
+                if access == 'ALL' and not table.startswith('<'):
+                    finding['full_scans'].append(table)
+
+            report['queries'].append(finding)
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+    report['elapsed'] = time.monotonic() - started
+    return report
+
+
+def report_has_problems(report):
+    return bool(report['missing'] or report['errors'] or any(
+        finding['full_scans'] or finding['rows'] > ROWS_WARNING for finding in report['queries']
+    ))
+
+
+def format_report(report, verbose=False):
+    """Human readable lines for the CLI and the startup log"""
+    lines = []
+    for table, column in report['missing']:
+        lines.append(f"MISSING INDEX  {table}.{column}")
+
+    for finding in report['queries']:
+        if finding['full_scans']:
+            lines.append(f"FULL SCAN      {finding['name']}: {', '.join(finding['full_scans'])} (~{finding['rows']} rows)")
+        elif finding['rows'] > ROWS_WARNING:
+            lines.append(f"MANY ROWS      {finding['name']}: ~{finding['rows']} rows examined")
+        elif verbose:
+            lines.append(f"OK             {finding['name']}: ~{finding['rows']} rows")
+        if verbose:
+            lines.extend(f"                 {step}" for step in finding['plan'])
+
+    for error in report['errors']:
+        lines.append(f"ERROR          {error}")
+
+    if report['ddl']:
+        lines.append("")
+        lines.append("Suggested DDL:")
+        lines.extend(report['ddl'])
+
+    lines.append("")
+    lines.append(f"Checked {len(report['queries'])} queries in {report['elapsed'] * 1000:.0f}ms")
+    return lines
+
+
+def log_startup_check():
+    """Run the advisor and log anything it finds, never raises"""
+    try:
+        report = run_advisor()
+    except Exception as e:
+        logger.error(f"Index check failed: {e}")
+        return
+
+    if report_has_problems(report):
+        for line in format_report(report):
+            if line:
+                logger.warning(f"Index check: {line}")
+    else:
+        logger.info(f"Index check passed ({len(report['queries'])} queries in {report['elapsed'] * 1000:.0f}ms)")
@@ -0,0 +1,87 @@
+import time
+import threading
+import collections
+
+# Returned by TTLCache.get() when nothing usable is cached, since None is a valid cached value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with a time to live per entry and LRU eviction.
+
+    Keys are tuples whose first element is the entity kind ('profile'), hit
+    and miss counters are kept per kind. Entries can carry tags (the
+    player's discord id) so everything cached about one player can be
+    dropped in one call.
+
+    Thread safe: the client's event loop reads and fills it, invalidations
+    published by other shard processes are applied from a DB worker thread.
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max(max_size, 1)
+        self._entries = collections.OrderedDict()  # key -> (value, expires_at, tags)
+        self._tags = collections.defaultdict(set)  # tag -> keys
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self.evictions = 0
+
+    def _remove(self, key):
+        value, expires_at, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        """Return the cached value, or MISSING if there is none or it expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self._stats[key[0]]['misses'] += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self._stats[key[0]]['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, ttl, tags=()):
+        """Cache a value for ttl seconds, evicting the least recently used entries if full"""
+        if ttl <= 0:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tag(self, tag):
+        """Drop every entry carrying the tag. Returns how many were dropped"""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self):
+        """Hit/miss counters per entity kind plus current size"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'evictions': self.evictions,
+                'kinds': {kind: dict(counts) for kind, counts in self._stats.items()}
+            }
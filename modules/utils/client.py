@@ -0,0 +1,162 @@
+"""
+The single Discord client every module runs on.
+
+Finder and tickets are discord.py extensions (each module has a setup()
+that adds its cog), so they share one gateway session, one event loop and
+one member cache. main.py loads both, each module's run() loads only itself.
+
+SHARD_MODE picks how the client connects:
+    single     one plain gateway session (default)
+    auto       one process, discord.py runs and balances every shard
+    processes  main.py starts SHARD_PROCESSES processes, each running an
+               auto sharded client for its own group of shard ids
+"""
+
+import os
+import asyncio
+import logging
+import discord
+from discord.ext import commands
+from dotenv import load_dotenv
+
+from modules.utils.db import run_in_db_thread
+from modules.utils import invalidations
+from modules.utils.command_sync import sync_command_tree
+
+load_dotenv()
+
+logger = logging.getLogger("main")
+
+EXTENSIONS = ['modules.finder.bot', 'modules.tickets.bot']
+
+SHARD_CONFIG = {
+    'mode': os.getenv('SHARD_MODE', 'single').lower(),
+    'count': int(os.getenv('SHARD_COUNT', '0')) or None,  # None lets Discord recommend one
+    'processes': int(os.getenv('SHARD_PROCESSES', '1')),
+    'invalidation_poll': float(os.getenv('SHARD_INVALIDATION_POLL', '5'))
+}
+
+
+def get_intents():
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.reactions = True
+    intents.members = True
+    return intents
+
+
+class BotMixin:
+    """Setup shared by the plain and the sharded client"""
+
+    def _init_bot(self, extensions):
+        self.initial_extensions = list(extensions)
+        self.commands_synced = False
+
+    async def setup_hook(self):
+        for extension in self.initial_extensions:
+            await self.load_extension(extension)
+            logger.info(f"Loaded extension {extension}")
+
+        if SHARD_CONFIG['mode'] == 'processes':
+            # Other processes keep their own player cache, pick up the invalidations they publish
+            await run_in_db_thread(invalidations.store.migrate)
+            self.loop.create_task(self.poll_cache_invalidations())
+
+    async def poll_cache_invalidations(self):
+        await self.wait_until_ready()
+        while not self.is_closed():
+            try:
+                applied = await run_in_db_thread(invalidations.apply_published_invalidations)
+                if applied:
+                    logger.info(f"Applied {applied} cache invalidation(s) from other shard processes")
+            except Exception as e:
+                logger.error(f"Error polling cache invalidations: {e}")
+            await asyncio.sleep(SHARD_CONFIG['invalidation_poll'])
+
+    def shard_summary(self):
+        """{shard id: (latency, guild count)} for the shards this process runs"""
+        guild_counts = {}
+        for guild in self.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+
+        shards = getattr(self, 'shards', None)
+        if not shards:
+            return {0: (self.latency, len(self.guilds))}
+        return {shard_id: (shard.latency, guild_counts.get(shard_id, 0)) for shard_id, shard in shards.items()}
+
+    async def on_shard_ready(self, shard_id):
+        guilds = [guild for guild in self.guilds if guild.shard_id == shard_id]
+        logger.info(f"Shard {shard_id} ready with {len(guilds)} guild(s): "
+                    f"{', '.join(f'{guild.name} ({guild.id})' for guild in guilds)}")
+
+    async def on_guild_join(self, guild):
+        logger.info(f"Joined guild {guild.name} ({guild.id}) on shard {guild.shard_id}")
+
+    async def on_ready(self):
+        logger.info(f'Bot is online as {self.user} ({len(self.guilds)} guilds)')
+
+        # on_ready fires again after every reconnect, the command tree only needs checking once
+        if self.commands_synced:
+            return
+        shard_ids = getattr(self, 'shard_ids', None)
+        if shard_ids is not None and 0 not in shard_ids:
+            # In processes mode the process running shard 0 syncs for everyone
+            self.commands_synced = True
+            return
+        try:
+            await sync_command_tree(self)
+            self.commands_synced = True
+        except Exception as e:
+            logger.error(f'Error syncing commands: {e}')
+
+
+class BanditBot(BotMixin, commands.Bot):
+    """commands.Bot that loads the given extensions and syncs the command tree when it changed"""
+
+    def __init__(self, extensions):
+        super().__init__(command_prefix="!", intents=get_intents())
+        self._init_bot(extensions)
+
+
+class ShardedBanditBot(BotMixin, commands.AutoShardedBot):
+    """Auto sharded variant, optionally limited to a group of shard ids"""
+
+    def __init__(self, extensions, shard_ids=None, shard_count=None):
+        super().__init__(command_prefix="!", intents=get_intents(), shard_ids=shard_ids, shard_count=shard_count)
+        self._init_bot(extensions)
+
+
+def create_bot(extensions=EXTENSIONS, shard_ids=None, shard_count=None):
+    if SHARD_CONFIG['mode'] == 'single' and shard_ids is None:
+        return BanditBot(extensions)
+    return ShardedBanditBot(extensions, shard_ids=shard_ids, shard_count=shard_count or SHARD_CONFIG['count'])
+
+
+def run_bot(extensions=EXTENSIONS, shard_ids=None, shard_count=None):
+    """Start one client running the given extensions, blocks until it shuts down"""
+    bot = create_bot(extensions, shard_ids=shard_ids, shard_count=shard_count)
+    bot.run(os.getenv('DISCORD_TOKEN'), log_handler=None)
+
+
+async def fetch_recommended_shard_count(token):
+    """Ask Discord how many shards this bot should run"""
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shard_count, _, _ = await http.get_bot_gateway()
+        return shard_count
+    finally:
+        await http.close()
+
+
+def split_shards(shard_count, processes):
+    """Spread shard ids 0..shard_count-1 over the processes in contiguous groups"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
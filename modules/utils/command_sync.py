@@ -0,0 +1,144 @@
+"""
+Slash command syncing that only talks to Discord when the commands changed.
+
+tree.sync() is heavily rate limited, so the payload of every scope (global and
+each guild with guild only commands) is hashed and the hash of the last
+successful sync is kept in data/command_sync.json. On startup only scopes
+whose hash differs are synced, guilds a few at a time.
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import discord
+
+from modules.utils.db import DATA_DIR
+
+logger = logging.getLogger("main")
+
+SYNC_STATE_FILE = DATA_DIR / "command_sync.json"
+
+# Guild syncs running at once, discord.py waits out any 429 on top of this
+GUILD_SYNC_CONCURRENCY = int(os.getenv('GUILD_SYNC_CONCURRENCY', '3'))
+
+
+def tree_hash(tree, guild=None):
+    """Stable hash of the payload tree.sync(guild=guild) would send"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+# Hash of a scope with no commands, guilds that never had any are skipped
+EMPTY_HASH = hashlib.sha256(b'[]').hexdigest()
+
+
+def load_sync_state():
+    try:
+        with open(SYNC_STATE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable {SYNC_STATE_FILE.name}: {e}")
+        return {}
+
+
+def save_sync_state(state):
+    # Written to a temp file first so a crash never leaves half a file behind
+    tmp = SYNC_STATE_FILE.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, SYNC_STATE_FILE)
+
+
+async def sync_command_tree(bot, guild_ids=None, force=False):
+    """
+    Sync the global commands and every guild's commands that changed since the last sync
+
+    Args:
+        bot: Logged in client, its application id keys the stored hashes
+        guild_ids: Guilds to consider besides the ones synced before, defaults to bot.guilds
+        force: Sync every scope even if its hash is unchanged
+
+    Returns:
+        dict: 'global' commands synced or None if skipped, 'guilds' {guild id: commands synced},
+              'skipped' number of guilds already up to date, 'failed' {guild id: error}
+    """
+    tree = bot.tree
+    state = load_sync_state()
+    application_id = str(bot.application_id)
+    if state.get('application_id') != application_id:
+        # Different bot token, nothing we stored applies to it
+        state = {'application_id': application_id, 'global': None, 'guilds': {}}
+    state.setdefault('guilds', {})
+
+    result = {'global': None, 'guilds': {}, 'skipped': 0, 'failed': {}}
+
+    global_hash = tree_hash(tree)
+    if force or state.get('global') != global_hash:
+        synced = await tree.sync()
+        state['global'] = global_hash
+        result['global'] = len(synced)
+        logger.info(f"Synced {len(synced)} global command(s)")
+    else:
+        logger.info("Global commands unchanged, skipping sync")
+
+    if guild_ids is None:
+        guild_ids = [guild.id for guild in bot.guilds]
+    # Guilds synced before are always checked so removed guild commands get cleared
+    candidates = {str(guild_id) for guild_id in guild_ids} | set(state['guilds'])
+
+    pending = []
+    for guild_id in candidates:
+        guild_hash = tree_hash(tree, guild=discord.Object(id=int(guild_id)))
+        stored = state['guilds'].get(guild_id, EMPTY_HASH)
+        if (force and guild_hash != EMPTY_HASH) or guild_hash != stored:
+            pending.append((guild_id, guild_hash))
+        else:
+            result['skipped'] += 1
+
+    semaphore = asyncio.Semaphore(max(GUILD_SYNC_CONCURRENCY, 1))
+
+    async def sync_guild(guild_id, guild_hash):
+        async with semaphore:
+            try:
+                synced = await tree.sync(guild=discord.Object(id=int(guild_id)))
+            except discord.HTTPException as e:
+                # Usually Forbidden, the bot was invited without the applications.commands scope
+                result['failed'][guild_id] = str(e)
+                logger.error(f"Error syncing commands to guild {guild_id}: {e}")
+                return
+            if guild_hash == EMPTY_HASH:
+                state['guilds'].pop(guild_id, None)
+            else:
+                state['guilds'][guild_id] = guild_hash
+            result['guilds'][guild_id] = len(synced)
+
+    await asyncio.gather(*(sync_guild(guild_id, guild_hash) for guild_id, guild_hash in pending))
+    if result['guilds']:
+        logger.info(f"Synced commands to {len(result['guilds'])} guild(s), {result['skipped']} unchanged")
+
+    save_sync_state(state)
+    return result
+
+
+async def sync_from_cli(extensions, force=False):
+    """
+    Load the extensions on a client that only logs in over HTTP and sync its tree
+
+    No gateway connection is made, so cogs' on_ready handlers never run.
+    Used by the sync scripts in modules/utils/scripts.
+    """
+    from modules.utils.client import BanditBot
+
+    bot = BanditBot(extensions)
+    async with bot:
+        await bot.login(os.getenv('DISCORD_TOKEN'))
+        guild_ids = [guild.id async for guild in bot.fetch_guilds(limit=None)]
+        return await sync_command_tree(bot, guild_ids=guild_ids, force=force)
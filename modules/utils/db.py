@@ -1,11 +1,21 @@
 import os
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+import collections
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future
 import mysql.connector
-import sqlite3
 from dotenv import load_dotenv
 from pathlib import Path
+from modules.utils.cache import TTLCache, MISSING
 
 load_dotenv()
 
+logger = logging.getLogger("db")
+
 # Path to data directory
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
@@ -19,121 +29,676 @@ db_config = {
     'port': int(os.getenv('DB_PORT', '3307'))
 }
 
+# Connection pool sizing, see MySQLPool below
+pool_config = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    'idle_timeout': float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+    'health_check_after': float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+    'acquire_timeout': float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+}
+
+# Thread pool that runs every blocking query, see DBExecutor below
+executor_config = {
+    'max_workers': int(os.getenv('DB_EXECUTOR_WORKERS', '8')),
+    'default_timeout': float(os.getenv('DB_QUERY_TIMEOUT', '10')),
+    'slow_wait': float(os.getenv('DB_SLOW_WAIT_WARNING', '1'))
+}
+
+# Player profile cache, TTLs are in seconds
+cache_config = {
+    'max_size': int(os.getenv('PLAYER_CACHE_SIZE', '2048')),
+    'profile_ttl': float(os.getenv('PLAYER_CACHE_TTL', '120')),
+    'vehicles_ttl': float(os.getenv('VEHICLE_CACHE_TTL', '30')),
+    'negative_ttl': float(os.getenv('NEGATIVE_CACHE_TTL', '15'))
+}
+
+player_cache = TTLCache(max_size=cache_config['max_size'])
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical lookups into one query.
+
+    The first caller for a key (the leader) starts the lookup, everyone who
+    asks for the same key while it is still running waits for that same
+    result instead of sending their own query. Lookups only start from the
+    client's event loop, the lock keeps stats() safe to read from any thread.
+
+    The lookup runs as its own task, so a leader whose interaction gets
+    cancelled does not take the result away from the followers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'leaders': 0, 'collapsed': 0}
+
+    def _finish(self, key, future, task):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    async def do(self, key, func):
+        """Run func() unless an identical call for key is already in flight, and return its result"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._stats['leaders'] += 1
+            else:
+                self._stats['collapsed'] += 1
+
+        if leader:
+            task = asyncio.ensure_future(func())
+            task.add_done_callback(lambda task: self._finish(key, future, task))
+
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self):
+        """How many lookups ran and how many were collapsed into an in-flight one"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+lookups = SingleFlight()
+
 def get_mysql_connection():
-    """Get a connection to the MySQL database"""
-    return mysql.connector.connect(**db_config)
-
-def get_sqlite_connection():
-    """Get a connection to the SQLite tickets database"""
-    return sqlite3.connect(DATA_DIR / 'tickets.db')
-
-def setup_tickets_database():
-    """Create the SQLite tickets database if it doesn't exist"""
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS tickets (
-        ticket_id TEXT PRIMARY KEY,
-        user_id INTEGER,
-        channel_id INTEGER,
-        category TEXT,
-        created_at TIMESTAMP,
-        status TEXT
+    """Open a new, unpooled connection to the MySQL database"""
+    conn = mysql.connector.connect(**db_config)
+    # Pooled connections are reused, so never leave a read snapshot open between checkouts
+    conn.autocommit = True
+    return conn
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became free within the acquire timeout"""
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a database call took longer than its timeout"""
+
+
+class DBExecutor:
+    """
+    Dedicated, bounded thread pool for blocking database calls.
+
+    Handlers await run() instead of calling mysql-connector or sqlite3
+    directly, so a slow query only ties up a worker thread and never the
+    event loop (and with it the gateway heartbeat). Every call gets a
+    timeout; when it expires or the awaiting task is cancelled, a call that
+    is still queued is dropped and a call that already started is handed to
+    its on_cancel hook so the query itself can be interrupted.
+
+    Queue depth and queue wait times are tracked so saturation shows up in
+    stats() and in the logs.
+    """
+
+    def __init__(self, max_workers=8, default_timeout=10, slow_wait=1):
+        self.max_workers = max(max_workers, 1)
+        self.default_timeout = default_timeout
+        self.slow_wait = slow_wait
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            'completed': 0,
+            'failed': 0,
+            'timeouts': 0,
+            'cancelled': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'total_run': 0.0
+        }
+
+    def _job(self, func, args, submitted):
+        started = time.monotonic()
+        waited = started - submitted
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._stats['total_wait'] += waited
+            self._stats['max_wait'] = max(self._stats['max_wait'], waited)
+        if waited > self.slow_wait:
+            logger.warning(f"DB call waited {waited:.2f}s for a worker ({self._queued} still queued)")
+
+        ok = False
+        try:
+            result = func(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._stats['completed' if ok else 'failed'] += 1
+                self._stats['total_run'] += time.monotonic() - started
+
+    def _dequeue_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    async def run(self, func, *args, timeout=None, on_cancel=None):
+        """
+        Run func(*args) on a worker thread and wait for the result
+
+        Args:
+            func (callable): Blocking function to run
+            timeout (float, optional): Seconds before giving up, defaults to DB_QUERY_TIMEOUT
+            on_cancel (callable, optional): Called with the worker future when a call that
+                already started times out or is cancelled, used to interrupt the query
+
+        Raises:
+            QueryTimeoutError: if the call did not finish in time
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._lock:
+            self._queued += 1
+        future = self._executor.submit(self._job, func, args, time.monotonic())
+        future.add_done_callback(self._dequeue_cancelled)
+
+        result = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Nobody awaits the result any more, retrieve it so errors are not reported as unhandled
+            result.add_done_callback(lambda f: f.cancelled() or f.exception())
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            with self._lock:
+                self._stats['timeouts' if timed_out else 'cancelled'] += 1
+            if not future.cancel() and on_cancel:
+                on_cancel(future)
+            if timed_out:
+                raise QueryTimeoutError(f"Database call timed out after {timeout}s") from None
+            raise
+
+    def stats(self):
+        """Snapshot of queue depth, wait times and totals"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = self._queued
+            stats['running'] = self._running
+        finished = stats['completed'] + stats['failed']
+        started = finished + stats['running']
+        stats['workers'] = self.max_workers
+        stats['avg_wait'] = stats['total_wait'] / started if started else 0.0
+        stats['avg_run'] = stats['total_run'] / finished if finished else 0.0
+        return stats
+
+
+db_executor = DBExecutor(**executor_config)
+
+async def run_in_db_thread(func, *args, timeout=None):
+    """Run any blocking database function on the DB thread pool"""
+    return await db_executor.run(func, *args, timeout=timeout)
+
+
+class PooledConnection:
+    """
+    A MySQL connection checked out of the pool, see MySQLPool.connection()
+
+    Queries run on the DB thread pool. If one times out it is killed
+    server side and the connection is dropped instead of going back to the
+    pool, since the worker thread may still be using it.
+    """
+
+    def __init__(self, conn):
+        self.raw = conn
+        self.abandoned = None
+        self.killing = None
+
+    def _execute(self, query, params, fetch):
+        cursor = self.raw.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            if fetch == 'one':
+                return cursor.fetchone()
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _kill_running_query(self):
+        try:
+            killer = get_mysql_connection()
+            try:
+                killer.cmd_query(f"KILL QUERY {int(self.raw.connection_id)}")
+            finally:
+                killer.close()
+        except Exception as e:
+            logger.error(f"Could not kill timed out query: {e}")
+
+    def _abandon(self, future):
+        self.abandoned = future
+        # Through the DB thread pool like everything else, so a stuck server shows up in /dbstats
+        self.killing = asyncio.ensure_future(db_executor.run(self._kill_running_query))
+        self.killing.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def fetchone(self, query, params=(), timeout=None):
+        """Run a query and return the first row as a dict (or None)"""
+        return await db_executor.run(self._execute, query, params, 'one', timeout=timeout, on_cancel=self._abandon)
+
+    async def fetchall(self, query, params=(), timeout=None):
+        """Run a query and return every row as a list of dicts"""
+        return await db_executor.run(self._execute, query, params, 'all', timeout=timeout, on_cancel=self._abandon)
+
+
+class MySQLPool:
+    """
+    Bounded pool of MySQL connections shared by the finder and tickets extensions.
+
+    Connections are opened lazily up to max_size and handed out most recently
+    used first, so the oldest idle ones age out and get closed once they have
+    been unused for idle_timeout seconds (the pool never shrinks below
+    min_size). A connection that sat idle for longer than health_check_after
+    seconds is pinged before it is handed out and replaced if it is dead.
+
+    The pool is thread safe: connection() waits for a free slot on the
+    client's event loop, then connects or pings on a DB worker thread, and
+    checks connections back in from the event loop. With
+    SHARD_MODE=processes every process has its own pool.
+    """
+
+    def __init__(self, config, min_size=1, max_size=10, idle_timeout=300,
+                 health_check_after=30, acquire_timeout=10):
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = collections.deque()  # (connection, last_used)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        # One per connection, connection() waits for one on the event loop before checking out
+        self._slots = asyncio.Semaphore(self.max_size)
+        self.waiting = 0
+
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0, 'reaped': 0, 'timeouts': 0}
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_for):
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def reap_idle(self):
+        """Close connections that have been idle for too long. Returns how many were closed"""
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0][1] > self.idle_timeout):
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                stale.append(conn)
+            self.stats['reaped'] += len(stale)
+        for conn in stale:
+            self._discard(conn)
+        return len(stale)
+
+    def checkout(self, timeout=None):
+        """
+        Take a connection out of the pool, blocking until one is free
+
+        Raises:
+            PoolTimeoutError: if the pool stayed exhausted for the whole timeout
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self.reap_idle()
+
+        while True:
+            conn = None
+            last_used = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("MySQL pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeoutError(f"No MySQL connection available after {timeout}s")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = get_mysql_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                self.stats['created'] += 1
+                return conn
+
+            if self._is_healthy(conn, time.monotonic() - last_used):
+                self.stats['reused'] += 1
+                return conn
+
+            logger.warning("Dropping dead pooled MySQL connection")
+            self._discard(conn)
+            with self._cond:
+                self._size -= 1
+                self.stats['discarded'] += 1
+
+    def checkin(self, conn, broken=False):
+        """Return a connection to the pool, closing it instead if it is broken"""
+        with self._cond:
+            if broken or self._closed:
+                self._size -= 1
+                self.stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    def _checkin_abandoned(self, future):
+        # The caller timed out or was cancelled while a worker thread was still checking out for it
+        if not future.cancelled() and future.exception() is None:
+            self.checkin(future.result())
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """
+        Async context manager that checks a connection out and always returns it
+
+        Usage:
+            async with mysql_pool.connection() as db:
+                row = await db.fetchone("SELECT ...", (value,))
+        """
+        loop = asyncio.get_running_loop()
+
+        # Wait for a free connection on the event loop, a worker thread blocked in checkout()
+        # would be missing for the queries of the tasks holding the connections
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise PoolTimeoutError(f"No MySQL connection available after {self.acquire_timeout}s") from None
+        finally:
+            self.waiting -= 1
+
+        def release_slot(future=None):
+            loop.call_soon_threadsafe(self._slots.release)
+
+        handed_off = False
+
+        def abandon_checkout(future):
+            # The caller gave up while a worker was connecting for it, the connection goes back once it's there
+            nonlocal handed_off
+            handed_off = True
+            future.add_done_callback(self._checkin_abandoned)
+            future.add_done_callback(release_slot)
+
+        # With a slot held checkout() never waits, the worker only connects or pings
+        try:
+            conn = await db_executor.run(self.checkout, on_cancel=abandon_checkout)
+        except BaseException:
+            if not handed_off:
+                self._slots.release()
+            raise
+
+        db = PooledConnection(conn)
+        broken = False
+        try:
+            yield db
+        except (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError):
+            broken = True
+            raise
+        finally:
+            if db.abandoned is not None:
+                # A timed out query may still be running, drop the connection once it is done
+                db.abandoned.add_done_callback(lambda future: self.checkin(conn, broken=True))
+                db.abandoned.add_done_callback(release_slot)
+            else:
+                self.checkin(conn, broken=broken)
+                self._slots.release()
+
+    def size(self):
+        """Return (open connections, idle connections)"""
+        with self._cond:
+            return self._size, len(self._idle)
+
+    def close(self):
+        """Close every idle connection and refuse new checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+mysql_pool = MySQLPool(db_config, **pool_config)
+
+def mysql_connection():
+    """Shortcut for mysql_pool.connection()"""
+    return mysql_pool.connection()
+
+def get_db_stats():
+    """Queue depth, wait times and pool usage for the /dbstats command"""
+    open_connections, idle_connections = mysql_pool.size()
+    return {
+        'executor': db_executor.stats(),
+        'pool': dict(mysql_pool.stats, open=open_connections, idle=idle_connections, max=mysql_pool.max_size, waiting=mysql_pool.waiting),
+        'cache': player_cache.stats(),
+        'singleflight': lookups.stats()
+    }
+
+# Queries issued directly by the finder commands, kept here so the index advisor can EXPLAIN them
+VEHICLE_INVENTORY_QUERY = "SELECT trunk, glovebox FROM player_vehicles WHERE plate = %s"
+CHARACTER_BY_CITIZENID_QUERY = "SELECT * FROM players WHERE citizenid = %s"
+
+
+@dataclass(slots=True)
+class Character:
+    """One row of the players table, as used by the lookup embeds"""
+    id: int
+    citizenid: str
+    cid: int
+    name: str
+    charinfo: str
+
+
+@dataclass(slots=True)
+class Vehicle:
+    """One row of the player_vehicles table, as used by /vehicles"""
+    plate: str
+    vehicle: str
+    garage: str
+    state: int
+    citizenid: str
+
+
+@dataclass(slots=True)
+class PlayerProfile:
+    """A users row plus the characters (and optionally vehicles) linked to it"""
+    user_id: int
+    username: str
+    license: str
+    license2: str
+    fivem: str
+    discord: str
+    characters: list = field(default_factory=list)
+    vehicles: list = field(default_factory=list)
+
+
+PROFILE_INCLUDES = ('characters', 'vehicles')
+
+# One branch per way a character can belong to a users row. license2 is skipped when it is
+# empty or the same as license (a missing license never equals it), fold_profile_rows dedupes
+# characters matched by several branches
+PROFILE_CHARACTER_BRANCHES = (
+    "JOIN players p ON p.license = o.license WHERE o.discord = %s",
+    "JOIN players p ON p.license = o.license2 WHERE o.discord = %s AND o.license2 <> '' "
+    "AND o.license2 <> COALESCE(o.license, '')",
+    "JOIN players p ON p.userId = o.userId WHERE o.discord = %s"
+)
+
+def build_profile_query(include=('characters',)):
+    """
+    Build the users/players/player_vehicles query for get_player_profile
+
+    Characters are found through a UNION ALL of single column joins rather
+    than one join on license OR license2 OR userId, so each branch can use
+    the index on players.license or players.userId.
+
+    Returns:
+        tuple: (query, number of times the discord id parameter is used)
+    """
+    columns = ["u.userId, u.username, u.license, u.license2, u.fivem, u.discord"]
+    joins = []
+    discord_params = 1
+
+    if 'characters' in include or 'vehicles' in include:
+        branches = "\n        UNION ALL\n        ".join(
+            f"SELECT o.userId AS owner, p.id AS char_id, p.citizenid, p.cid, p.name AS char_name, p.charinfo "
+            f"FROM users o {branch}"
+            for branch in PROFILE_CHARACTER_BRANCHES
+        )
+        columns.append("c.char_id, c.citizenid, c.cid, c.char_name, c.charinfo")
+        joins.append(f"""LEFT JOIN (
+        {branches}
+    ) c ON c.owner = u.userId""")
+        discord_params += len(PROFILE_CHARACTER_BRANCHES)
+
+    if 'vehicles' in include:
+        columns.append("v.plate, v.vehicle, v.garage, v.state")
+        joins.append("LEFT JOIN player_vehicles v ON v.citizenid = c.citizenid")
+
+    query = f"""
+    SELECT {", ".join(columns)}
+    FROM users u
+    {" ".join(joins)}
+    WHERE u.discord = %s
+    """
+    return query, discord_params
+
+def fold_profile_rows(rows, include=('characters',)):
+    """Turn the flat joined rows into a single PlayerProfile (or None if there are no rows)"""
+    if not rows:
+        return None
+
+    first = rows[0]
+    profile = PlayerProfile(
+        user_id=first['userId'],
+        username=first['username'],
+        license=first['license'],
+        license2=first['license2'],
+        fivem=first['fivem'],
+        discord=first['discord']
     )
-    ''')
-    conn.commit()
-    conn.close()
-    print("Tickets database initialized successfully")
 
+    seen_characters = set()
+    seen_plates = set()
+    for row in rows:
+        if row.get('char_id') is None:
+            continue
+
+        if 'characters' in include and row['char_id'] not in seen_characters:
+            seen_characters.add(row['char_id'])
+            profile.characters.append(Character(
+                id=row['char_id'],
+                citizenid=row['citizenid'],
+                cid=row['cid'],
+                name=row['char_name'],
+                charinfo=row['charinfo']
+            ))
 
-def get_player_from_discord(discord_id):
+        if 'vehicles' in include and row.get('plate') is not None and row['plate'] not in seen_plates:
+            seen_plates.add(row['plate'])
+            profile.vehicles.append(Vehicle(
+                plate=row['plate'],
+                vehicle=row['vehicle'],
+                garage=row['garage'],
+                state=row['state'],
+                citizenid=row['citizenid']
+            ))
+
+    return profile
+
+async def get_player_profile(discord_id, include=('characters',)):
     """
-    Get player information from Discord ID
-    
+    Get a player's account, characters and optionally vehicles in one round trip
+
     Args:
         discord_id (str): Discord ID with or without 'discord:' prefix
-        
+        include (tuple): Any of 'characters' and 'vehicles'
+
     Returns:
-        dict: Player information or None if not found
+        PlayerProfile: The player's profile or None if not found
     """
     if not discord_id.startswith('discord:'):
         discord_id = f"discord:{discord_id}"
-    
-    conn = None
-    cursor = None
-    
-    try:
-        conn = get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Query the users table
-        user_query = "SELECT userId, username, license, license2, fivem, discord FROM users WHERE discord = %s"
-        cursor.execute(user_query, (discord_id,))
-        result = cursor.fetchone()
-        
-        return result
-    except Exception as e:
-        print(f"Database error: {e}")
-        return None
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
+    include = tuple(part for part in PROFILE_INCLUDES if part in include)
+
+    key = ('profile', discord_id, include)
+    cached = player_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    return await lookups.do(key, lambda: _load_profile(key, discord_id, include))
+
+
+async def _load_profile(key, discord_id, include):
+    query, discord_params = build_profile_query(include)
+    async with mysql_connection() as db:
+        rows = await db.fetchall(query, (discord_id,) * discord_params)
+
+    profile = fold_profile_rows(rows, include)
+
+    if profile is None:
+        ttl = cache_config['negative_ttl']
+    elif 'vehicles' in include:
+        ttl = cache_config['vehicles_ttl']
+    else:
+        ttl = cache_config['profile_ttl']
+    # Tagged with the discord id so /cache invalidate drops every include variant at once
+    player_cache.set(key, profile, ttl, tags=(discord_id,))
+    return profile
 
-def get_characters(license=None, license2=None, user_id=None):
+
+def invalidate_player(discord_id):
     """
-    Get character information for a player
-    
-    Args:
-        license (str, optional): Player license
-        license2 (str, optional): Player license2
-        user_id (int, optional): Player userId
-        
+    Drop everything cached about a player, including their characters and vehicles
+
     Returns:
-        list: Character information
+        int: Number of cache entries dropped
     """
-    if not license and not license2 and not user_id:
-        return []
-    
-    conn = None
-    cursor = None
-    
-    try:
-        conn = get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        params = []
-        conditions = []
-        
-        if license:
-            conditions.append("license = %s")
-            params.append(license)
-        
-        if license2:
-            conditions.append("license = %s")
-            params.append(license2)
-            
-        if user_id:
-            conditions.append("userId = %s")
-            params.append(user_id)
-            
-        query = f"""
-        SELECT id, citizenid, cid, name, charinfo
-        FROM players 
-        WHERE {" OR ".join(conditions)}
-        """
-        
-        cursor.execute(query, params)
-        result = cursor.fetchall()
-        
-        return result
-    except Exception as e:
-        print(f"Database error: {e}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close() 
\ No newline at end of file
+    if not discord_id.startswith('discord:'):
+        discord_id = f"discord:{discord_id}"
+
+    return player_cache.invalidate_tag(discord_id)
@@ -0,0 +1,66 @@
+"""
+Player cache invalidations passed between shard processes.
+
+In processes mode every process keeps its own player cache. /cache
+invalidate drops the entries locally and publishes the discord id to
+data/shared.db, the other processes poll it (BotMixin.poll_cache_invalidations)
+and drop theirs.
+"""
+
+import time
+
+from modules.utils.db import DATA_DIR, invalidate_player
+from modules.utils.store import SQLiteStore
+
+MIGRATIONS = [
+    # 1: invalidations published by /cache invalidate
+    '''
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        discord_id TEXT,
+        created_at REAL
+    );
+    '''
+]
+
+store = SQLiteStore(DATA_DIR / 'shared.db', MIGRATIONS, 'shared')
+
+# Highest cache_invalidations id this process has applied, None until the first poll
+_last_invalidation_id = None
+
+
+def publish_invalidation(discord_id):
+    """Tell the other shard processes to drop their cached data for a player"""
+    with store.connection() as conn:
+        conn.execute(
+            "INSERT INTO cache_invalidations (discord_id, created_at) VALUES (?, ?)",
+            (discord_id, time.time())
+        )
+        # Every process polls every few seconds, an hour old entry has long been seen
+        conn.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (time.time() - 3600,))
+
+
+def apply_published_invalidations():
+    """
+    Apply invalidations published by other processes since the last call
+
+    Returns:
+        int: Number of invalidations applied
+    """
+    global _last_invalidation_id
+    with store.connection() as conn:
+        if _last_invalidation_id is None:
+            # Nothing is cached yet on the first poll, only remember where to start from
+            row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()
+            _last_invalidation_id = row[0]
+            return 0
+
+        rows = conn.execute(
+            "SELECT id, discord_id FROM cache_invalidations WHERE id > ? ORDER BY id",
+            (_last_invalidation_id,)
+        ).fetchall()
+
+    for invalidation_id, discord_id in rows:
+        invalidate_player(discord_id)
+        _last_invalidation_id = invalidation_id
+    return len(rows)
@@ -0,0 +1,202 @@
+"""
+Benchmark the ticket-open path end to end.
+
+Runs create_ticket against stand-in Discord objects and a stand-in profile
+lookup, each answering after a fixed simulated latency, with the real SQLite
+repository on a scratch database. It compares the current pipeline with the
+previous one, where every step waited for the one before it:
+defer, duplicate check, channel creation, insert, profile, welcome message,
+then the ephemeral reply.
+
+Latency is measured from the dropdown submit to the "Your ticket has been
+created" reply, the point where the user can click through.
+
+Usage:
+    python modules/utils/scripts/bench_create_ticket.py [--runs 20] [--profile-ms 400] [--channel-ms 300]
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from types import SimpleNamespace
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent.parent))
+import modules.tickets.bot as tickets
+from modules.tickets.repository import repository
+from modules.utils.db import run_in_db_thread
+
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id, latency):
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+        self.latency = latency
+
+    async def send(self, **kwargs):
+        await asyncio.sleep(self.latency['message'])
+        return FakeMessage()
+
+
+class FakeCategory:
+    def __init__(self, guild, latency):
+        self.id = 1
+        self.name = "Tickets"
+        self.guild = guild
+        self.latency = latency
+        self.next_id = 1
+
+    @property
+    def channels(self):
+        # Always room, the benchmark isn't about overflow
+        return []
+
+    async def create_text_channel(self, name, overwrites):
+        await asyncio.sleep(self.latency['channel'])
+        self.next_id += 1
+        return FakeChannel(self.next_id, self.latency)
+
+
+class FakeGuild:
+    def __init__(self, latency):
+        self.id = 1
+        self.name = "Benchmark"
+        self.category = FakeCategory(self, latency)
+        self.categories = [self.category]
+        self.channels = [self.category]
+        self.default_role = object()
+        self.me = object()
+
+    def get_channel(self, channel_id):
+        return self.category
+
+    def get_role(self, role_id):
+        return None
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeInteraction:
+    def __init__(self, guild, user_id, latency):
+        self.guild = guild
+        self.user = FakeUser(user_id)
+        # No cog loaded, nothing to schedule
+        self.client = SimpleNamespace(get_cog=lambda name: None)
+        self.latency = latency
+        self.replied_at = None
+        self.response = SimpleNamespace(defer=self.defer)
+        self.followup = SimpleNamespace(send=self.send)
+
+    async def defer(self, **kwargs):
+        await asyncio.sleep(self.latency['message'])
+
+    async def send(self, *args, **kwargs):
+        await asyncio.sleep(self.latency['message'])
+        self.replied_at = time.monotonic()
+
+
+def fake_profile_lookup(latency):
+    async def get_player_profile(discord_id, include=('characters',)):
+        await asyncio.sleep(latency['profile'])
+        return SimpleNamespace(
+            username="bench", user_id=1, license2="license2:bench", discord=discord_id, fivem="fivem:1", characters=[]
+        )
+    return get_player_profile
+
+
+async def open_sequential(interaction, ticket_type):
+    """The previous create_ticket: each step waits for the one before it"""
+    await interaction.response.defer(ephemeral=True)
+    category_data = tickets.TICKET_CONFIG['categories'][ticket_type]
+    ticket_id = tickets.generate_ticket_id()
+    await run_in_db_thread(repository.find_open, interaction.user.id, ticket_type)
+    category = interaction.guild.get_channel(category_data['category_id'])
+    overwrites = tickets.build_overwrites(interaction.guild, ticket_type, interaction.user)
+    channel = await category.create_text_channel(name=ticket_id.lower(), overwrites=overwrites)
+    await run_in_db_thread(repository.create, ticket_id, interaction.user.id, channel.id, ticket_type)
+    await run_in_db_thread(tickets.start_capture, ticket_id)
+    profile = await tickets.get_player_profile(str(interaction.user.id), include=('characters',))
+    embed = tickets.build_welcome_embed(category_data, ticket_id, interaction.user, profile)
+    await channel.send(embed=embed, view=tickets.TicketActionsView(ticket_id))
+    await interaction.followup.send(f"Your ticket has been created: {channel.mention}", ephemeral=True)
+
+
+async def open_current(interaction, ticket_type):
+    """What TicketTypeSelect.callback does now"""
+    profile_task = tickets.start_profile_lookup(interaction.user.id)
+    await interaction.response.defer(ephemeral=True)
+    await tickets.create_ticket(interaction, ticket_type, profile_task)
+
+
+async def measure(opener, guild, runs, latency, first_user):
+    timings = []
+    for run in range(runs):
+        interaction = FakeInteraction(guild, first_user + run, latency)
+        # Forget the channels of earlier runs, the stand-in category never fills up
+        tickets.allocator.track(guild)
+        started = time.monotonic()
+        await opener(interaction, 'general')
+        timings.append((interaction.replied_at - started) * 1000)
+    return timings
+
+
+def summary(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f"{name:<12} median {statistics.median(timings):7.1f} ms   p95 {p95:7.1f} ms"
+
+
+async def run(args):
+    latency = {
+        'message': args.message_ms / 1000,
+        'channel': args.channel_ms / 1000,
+        'profile': args.profile_ms / 1000
+    }
+    tickets.get_player_profile = fake_profile_lookup(latency)
+    logging.getLogger("tickets").setLevel(logging.WARNING)
+    repository.migrate()
+    guild = FakeGuild(latency)
+
+    before = await measure(open_sequential, guild, args.runs, latency, 1_000_000)
+    after = await measure(open_current, guild, args.runs, latency, 2_000_000)
+
+    print(f"Simulated latency: message {args.message_ms} ms, channel {args.channel_ms} ms, profile {args.profile_ms} ms")
+    print(summary("sequential", before))
+    print(summary("current", after))
+    print(f"Saved {statistics.median(before) - statistics.median(after):.1f} ms per ticket at the median")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ticket-open latency")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--message-ms', type=float, default=120, help="defer, message send and followup latency")
+    parser.add_argument('--channel-ms', type=float, default=300, help="create_text_channel latency")
+    parser.add_argument('--profile-ms', type=float, default=400, help="MySQL profile lookup latency")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # Keep benchmark tickets out of the real database
+        repository.path = Path(scratch) / 'tickets.db'
+        try:
+            asyncio.run(run(args))
+        finally:
+            repository.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+Check that the qbox tables have the indexes the bots rely on.
+
+Runs EXPLAIN on every query the finder and tickets modules send to MySQL and
+prints full scans, missing indexes, estimated row counts and suggested DDL.
+Exits 0 when everything looks fine, 1 when something needs an index and 2 when
+the database could not be reached, so it can be used to gate deploys.
+
+Usage:
+    python modules/utils/scripts/check_indexes.py [--verbose]
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent.parent))
+from modules.utils.advisor import run_advisor, report_has_problems, format_report
+
+
+def main():
+    verbose = '--verbose' in sys.argv or '-v' in sys.argv
+
+    try:
+        report = run_advisor()
+    except Exception as e:
+        print(f"Could not run index check: {e}")
+        return 2
+
+    for line in format_report(report, verbose=verbose):
+        print(line)
+
+    return 1 if report_has_problems(report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,45 @@
-import os
+"""
+Sync the slash commands of every module, skipping anything already up to date.
+
+Compares the command tree against the hashes in data/command_sync.json and
+only syncs the global commands and guilds that changed, the same check the
+bot does on startup. Pass --force to sync everything regardless.
+
+Usage:
+    python modules/utils/scripts/sync_commands.py [--force]
+"""
+
 import sys
 import asyncio
-from dotenv import load_dotenv
-
-
-load_dotenv()
-TOKEN = os.getenv('DISCORD_TOKEN')
-
-
-finder_path = os.path.abspath('finder.py')
-print(f"Finder path: {finder_path}")
-
-
-sys.path.append(os.path.dirname(finder_path))
-
-try:
-
-    import finder
-    
-    async def sync_commands():
-        await finder.bot.wait_until_ready()
-        print(f'Bot is online as {finder.bot.user}')
-        
-        try:
-            synced = await finder.bot.tree.sync()
-            print(f'Synced {len(synced)} command(s)')
-            for command in synced:
-                print(f'- {command.name}')
-        except Exception as e:
-            print(f'Error syncing commands: {e}')
-        
-        print("Command sync complete. Bot will continue running...")
-    
-    finder.bot.loop.create_task(sync_commands())
-    
-
-    print("Starting bot...")
-    finder.bot.run(TOKEN)
-except Exception as e:
-    print(f"Error importing finder module: {e}")
-    import traceback
-    traceback.print_exc() 
\ No newline at end of file
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent.parent))
+from modules.utils.client import EXTENSIONS
+from modules.utils.command_sync import sync_from_cli
+
+
+def print_result(result):
+    if result['global'] is None:
+        print("Global commands unchanged")
+    else:
+        print(f"Synced {result['global']} global command(s)")
+    for guild_id, count in result['guilds'].items():
+        print(f"Synced {count} command(s) to guild {guild_id}")
+    for guild_id, error in result['failed'].items():
+        print(f"Error syncing guild {guild_id}: {error}")
+    print(f"{result['skipped']} guild(s) unchanged")
+
+
+def main(force=False):
+    try:
+        result = asyncio.run(sync_from_cli(EXTENSIONS, force=force))
+    except Exception as e:
+        print(f"Error syncing commands: {e}")
+        return 1
+
+    print_result(result)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(force='--force' in sys.argv))
@@ -0,0 +1,106 @@
+"""
+SQLite databases under data/ shared by the DB worker threads.
+
+Each SQLiteStore keeps one connection per process in WAL mode. Its schema
+is versioned with PRAGMA user_version: the store's migrations are applied
+in order on startup and never edited once released, new changes go in a
+new entry.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+import contextlib
+
+logger = logging.getLogger("db")
+
+# How long SQLite waits for a lock held by another shard process before giving up
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '15'))
+
+# Negative values are KiB, so 8 MB of page cache per process and database
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-8000'))
+
+
+class SQLiteStore:
+    """
+    The process's connection to one SQLite database and its migrations
+
+    Methods are blocking and meant for the DB thread pool
+    (await run_in_db_thread(store.migrate)). The connection is shared by
+    those threads, a lock keeps one statement block on it at a time.
+
+    Args:
+        path: Database file
+        migrations: SQL scripts, one per schema version
+        name: Used in the migration log lines
+    """
+
+    def __init__(self, path, migrations, name):
+        self.path = path
+        self.migrations = migrations
+        self.name = name
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # Safe with WAL: a power cut can lose the last commits but never corrupts the database
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        The shared connection, held for the block
+
+        Committed when the block ends, rolled back if it raises.
+        """
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                yield self._conn
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def migrate(self):
+        """
+        Apply the migrations this database hasn't seen yet
+
+        Returns:
+            int: The schema version after migrating
+        """
+        with self.connection() as conn:
+            conn.commit()
+            isolation_level = conn.isolation_level
+            conn.isolation_level = None
+            try:
+                # Shard processes start together, the write lock makes the others wait and then see the new version
+                conn.execute("BEGIN IMMEDIATE")
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for number, script in enumerate(self.migrations[version:], start=version + 1):
+                    # Statements are split on ';', migrations must not use it inside literals
+                    for statement in script.split(';'):
+                        if statement.strip():
+                            conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {number}")
+                    logger.info(f"Applied {self.name} database migration {number}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.isolation_level = isolation_level
+            return max(version, len(self.migrations))
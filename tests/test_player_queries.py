@@ -0,0 +1,173 @@
+"""
+Tests for the SQL built by the player lookups in modules/utils/db.py.
+
+Run with: python -m unittest discover tests
+"""
+
+import sys
+import sqlite3
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from modules.utils.db import build_profile_query, fold_profile_rows, PROFILE_CHARACTER_BRANCHES
+
+DISCORD = 'discord:1'
+LICENSE = 'license:aaa'
+OTHER_LICENSE = 'license2:bbb'
+USER_ID = 7
+
+# (license, license2, linked by userId, expected character ids, expected joined rows) for every
+# combination of users.license (missing, set), users.license2 (missing, equal to license, different,
+# empty) and characters linked through players.userId (no, yes). Character 1 has LICENSE, character 2
+# OTHER_LICENSE, and characters 1 and 3 carry the userId when linked, so 1 then comes back twice
+PROFILE_CASES = [
+    (None, None, False, [], 1),
+    (None, None, True, [1, 3], 2),
+    (None, LICENSE, False, [1], 1),
+    (None, LICENSE, True, [1, 3], 3),
+    (None, OTHER_LICENSE, False, [2], 1),
+    (None, OTHER_LICENSE, True, [2, 1, 3], 3),
+    (None, '', False, [], 1),
+    (None, '', True, [1, 3], 2),
+    (LICENSE, None, False, [1], 1),
+    (LICENSE, None, True, [1, 3], 3),
+    (LICENSE, LICENSE, False, [1], 1),
+    (LICENSE, LICENSE, True, [1, 3], 3),
+    (LICENSE, OTHER_LICENSE, False, [1, 2], 2),
+    (LICENSE, OTHER_LICENSE, True, [1, 2, 3], 4),
+    (LICENSE, '', False, [1], 1),
+    (LICENSE, '', True, [1, 3], 3),
+]
+
+
+def profile_database(license, license2, linked):
+    """In-memory users/players tables for one PROFILE_CASES combination"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.executescript('''
+    CREATE TABLE users (userId INTEGER PRIMARY KEY, username TEXT, license TEXT, license2 TEXT, fivem TEXT, discord TEXT);
+    CREATE TABLE players (id INTEGER PRIMARY KEY, citizenid TEXT, cid INTEGER, name TEXT, charinfo TEXT,
+                          license TEXT, userId INTEGER);
+    ''')
+    conn.execute(
+        "INSERT INTO users VALUES (?, 'player', ?, ?, 'fivem:1', ?)", (USER_ID, license, license2, DISCORD)
+    )
+    owner = USER_ID if linked else None
+    conn.executemany("INSERT INTO players VALUES (?, ?, 1, 'name', '{}', ?, ?)", [
+        (1, 'CID1', LICENSE, owner),
+        (2, 'CID2', OTHER_LICENSE, None),
+        (3, 'CID3', 'license:ccc', owner),
+        # Someone else's character, never part of the profile
+        (4, 'CID4', 'license:ddd', USER_ID + 1),
+    ])
+    return conn
+
+
+def run_profile_query(conn, include=('characters',)):
+    query, discord_params = build_profile_query(include)
+    # Same placeholders in MySQL and SQLite once %s becomes ?
+    rows = conn.execute(query.replace('%s', '?'), (DISCORD,) * discord_params).fetchall()
+    return [dict(row) for row in rows]
+
+
+class ProfileQueryCombinationsTest(unittest.TestCase):
+
+    def test_every_identifier_combination(self):
+        self.assertEqual(len(PROFILE_CASES), 16)
+        for license, license2, linked, character_ids, row_count in PROFILE_CASES:
+            with self.subTest(license=license, license2=license2, linked=linked):
+                rows = run_profile_query(profile_database(license, license2, linked))
+                # license2 equal to license or empty adds no duplicate rows
+                self.assertEqual(len(rows), row_count)
+                profile = fold_profile_rows(rows)
+                self.assertEqual(profile.user_id, USER_ID)
+                self.assertEqual(sorted(character.id for character in profile.characters), sorted(character_ids))
+
+    def test_unknown_discord_id_is_no_profile(self):
+        conn = profile_database(LICENSE, OTHER_LICENSE, True)
+        conn.execute("UPDATE users SET discord = 'discord:2'")
+        self.assertIsNone(fold_profile_rows(run_profile_query(conn)))
+
+    def test_vehicles_of_every_character(self):
+        conn = profile_database(LICENSE, OTHER_LICENSE, True)
+        conn.executescript('''
+        CREATE TABLE player_vehicles (plate TEXT, vehicle TEXT, garage TEXT, state INTEGER, citizenid TEXT);
+        INSERT INTO player_vehicles VALUES ('AAA', 'adder', 'pillbox', 1, 'CID1'), ('BBB', 'zentorno', 'pillbox', 0, 'CID2'),
+                                           ('CCC', 't20', 'pillbox', 1, 'CID4');
+        ''')
+        profile = fold_profile_rows(run_profile_query(conn, ('characters', 'vehicles')), ('characters', 'vehicles'))
+        self.assertEqual(sorted(vehicle.plate for vehicle in profile.vehicles), ['AAA', 'BBB'])
+        self.assertEqual(sorted(character.id for character in profile.characters), [1, 2, 3])
+
+
+class BuildProfileQueryTest(unittest.TestCase):
+
+    def test_discord_params_match_placeholders(self):
+        for include in ((), ('characters',), ('vehicles',), ('characters', 'vehicles')):
+            with self.subTest(include=include):
+                query, discord_params = build_profile_query(include)
+                self.assertEqual(query.count('%s'), discord_params)
+                self.assertNotIn(' OR ', query)
+
+    def test_one_branch_per_character_link(self):
+        query, discord_params = build_profile_query(('characters',))
+        self.assertEqual(discord_params, len(PROFILE_CHARACTER_BRANCHES) + 1)
+        self.assertEqual(query.count('UNION ALL'), len(PROFILE_CHARACTER_BRANCHES) - 1)
+        for branch in PROFILE_CHARACTER_BRANCHES:
+            self.assertIn(branch, query)
+
+    def test_without_characters_only_users_is_queried(self):
+        query, discord_params = build_profile_query(())
+        self.assertEqual(discord_params, 1)
+        self.assertNotIn('players', query)
+
+    def test_vehicles_pull_in_characters(self):
+        query, discord_params = build_profile_query(('vehicles',))
+        self.assertEqual(discord_params, len(PROFILE_CHARACTER_BRANCHES) + 1)
+        self.assertIn('LEFT JOIN player_vehicles v ON v.citizenid = c.citizenid', query)
+
+    def test_license2_branch_skips_empty_and_equal(self):
+        license2_branch = next(branch for branch in PROFILE_CHARACTER_BRANCHES if 'o.license2' in branch)
+        self.assertIn("o.license2 <> ''", license2_branch)
+        self.assertIn("o.license2 <> COALESCE(o.license, '')", license2_branch)
+
+    def test_every_branch_filters_on_discord(self):
+        for branch in PROFILE_CHARACTER_BRANCHES:
+            with self.subTest(branch=branch):
+                self.assertEqual(branch.count('%s'), 1)
+                self.assertIn('o.discord = %s', branch)
+
+
+def profile_row(char_id, plate=None):
+    return {
+        'userId': USER_ID, 'username': 'player', 'license': LICENSE, 'license2': OTHER_LICENSE,
+        'fivem': 'fivem:1', 'discord': 'discord:1', 'char_id': char_id, 'citizenid': f'CID{char_id}',
+        'cid': 1, 'char_name': 'name', 'charinfo': '{}', 'plate': plate, 'vehicle': 'adder', 'garage': 'pillbox', 'state': 1
+    }
+
+
+class FoldProfileRowsTest(unittest.TestCase):
+
+    def test_no_rows_is_no_profile(self):
+        self.assertIsNone(fold_profile_rows([]))
+
+    def test_character_matched_by_several_branches_is_kept_once(self):
+        rows = [profile_row(1), profile_row(1), profile_row(2), profile_row(1)]
+        profile = fold_profile_rows(rows)
+        self.assertEqual([character.id for character in profile.characters], [1, 2])
+
+    def test_user_without_characters(self):
+        profile = fold_profile_rows([profile_row(None)])
+        self.assertEqual(profile.user_id, USER_ID)
+        self.assertEqual(profile.characters, [])
+
+    def test_vehicles_are_deduped_by_plate(self):
+        rows = [profile_row(1, 'AAA'), profile_row(1, 'BBB'), profile_row(1, 'AAA'), profile_row(2, None)]
+        profile = fold_profile_rows(rows, ('characters', 'vehicles'))
+        self.assertEqual([vehicle.plate for vehicle in profile.vehicles], ['AAA', 'BBB'])
+        self.assertEqual([character.id for character in profile.characters], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()